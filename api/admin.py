@@ -1,13 +1,38 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.core.mail import send_mail
 from django.conf import settings
-from .models import CustomUser, Category, Product, Order, OrderItem, PrintOrder
-from .models import CustomUser, Category, Product, Order, OrderItem, PrintOrder, PrintOrderFile
+from django.db.models import F
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join, mark_safe
+from .models import (
+    CustomUser, Category, Product, Order, OrderItem, PrintOrder, PrintOrderFile, PrintJob, ArchivedOrder, ArchivedPrintOrder,
+    LowStockAlert, PaymentClaim, StatementLine, RosterEntry, PickupWindow, PickupSlot, Discount,
+)
+from .reporting import PRINTED_STATUSES, record_order_transition, record_print_transition, transition_orders, transition_print_orders
+from . import pickup, printqueue, roster
+from .changelists import LargeTableAdmin
+from .previews import preview_urls
+from .printjobs import schedule_print_jobs
+
+
+class RosterMatchFilter(admin.SimpleListFilter):
+    """Unverified accounts the roster lists by number or email only; staff confirm these by hand."""
+    title = 'roster'
+    parameter_name = 'roster'
+
+    def lookups(self, request, model_admin):
+        return [('partial', 'Partial match, needs checking')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'partial':
+            return queryset.filter(pk__in=roster.partial_matches().values('pk'))
+        return queryset
 
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'full_name', 'phone_number', 'is_verified', 'is_active', 'date_joined')
+    list_filter = UserAdmin.list_filter + ('is_verified', RosterMatchFilter)
     search_fields = ('username', 'email', 'full_name', 'phone_number')
     ordering = ('username',)
 
@@ -44,11 +69,15 @@ class OrderItemInline(admin.TabularInline):
     extra = 1
 
 
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'total_price', 'status', 'payment_status', 'created_at']
-    list_filter = ['status', 'payment_status', 'created_at']
+class OrderAdmin(LargeTableAdmin, admin.ModelAdmin):
+    list_display = ['id', 'user', 'total_price', 'discount', 'status', 'payment_status', 'pickup_slot', 'created_at']
+    list_filter = ['status', 'payment_status', 'pickup_slot__date', 'created_at']
     search_fields = ['user__username', 'status', 'payment_status']
     inlines = [OrderItemInline]
+    list_select_related = ['user', 'pickup_slot']
+    readonly_fields = ['pickup_slot']  # booked via checkout only: editing it here would skip the slot counters
+    # The preparation queue: orders due at the counter first, those without a slot after them
+    ordering = [F('pickup_slot__date').asc(nulls_last=True), F('pickup_slot__start_time').asc(nulls_last=True), 'created_at']
 
     actions = ['mark_as_confirmed','mark_as_ready', 'mark_as_delivered', 'mark_as_cancelled']
 
@@ -58,6 +87,18 @@ class OrderAdmin(admin.ModelAdmin):
             if original.status != obj.status:
                 self.send_status_email(obj)
         super().save_model(request, obj, form, change)
+        if change and original.status != obj.status:
+            if not record_order_transition(obj.pk, obj.created_at, original.status, obj.status):
+                self.warn_lost_slots(request, [obj.pk])
+
+    def warn_lost_slots(self, request, order_ids):
+        if order_ids:
+            self.message_user(
+                request,
+                f"The pickup slot of order(s) {', '.join(map(str, order_ids))} filled up while cancelled; "
+                "they no longer have a slot.",
+                messages.WARNING,
+            )
 
     def send_status_email(self, order):
         subject = f"Order #{order.id} Status Update"
@@ -67,55 +108,62 @@ class OrderAdmin(admin.ModelAdmin):
         send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipient_list)
 
     def mark_as_confirmed(self, request, queryset):
-        queryset.update(status='confirmed')
+        self.warn_lost_slots(request, transition_orders(queryset, 'confirmed'))
         for order in queryset:
             self.send_status_email(order)
     mark_as_confirmed.short_description = "Mark selected orders as confirmed"
 
     def mark_as_ready(self, request, queryset):
-        queryset.update(status='ready')
+        self.warn_lost_slots(request, transition_orders(queryset, 'ready'))
         for order in queryset:
             self.send_status_email(order)
     mark_as_ready.short_description = "Mark selected orders as ready"
 
     def mark_as_delivered(self, request, queryset):
-        queryset.update(status='delivered')
+        self.warn_lost_slots(request, transition_orders(queryset, 'delivered'))
         for order in queryset:
             self.send_status_email(order)
     mark_as_delivered.short_description = "Mark selected orders as delivered"
 
     def mark_as_cancelled(self, request, queryset):
-        queryset.update(status='cancelled')
+        self.warn_lost_slots(request, transition_orders(queryset, 'cancelled'))
         for order in queryset:
             self.send_status_email(order)
     mark_as_cancelled.short_description = "Mark selected orders as cancelled"
 
-from django.utils.html import format_html, mark_safe
-from django.contrib import admin
-from django.core.mail import send_mail
-from django.conf import settings
-from .models import PrintOrder, PrintOrderFile
 
 
 class PrintOrderFileInline(admin.TabularInline):
     model = PrintOrderFile
     extra = 0  # Shows existing files without extra empty forms
+    fields = ["file", "page_count", "preview"]
+    readonly_fields = ["page_count", "preview"]
+
+    def preview(self, obj):
+        """Page thumbnails linking to the full file, so it only has to be downloaded to print it."""
+        urls = preview_urls(obj.preview_hash, obj.preview_pages)
+        if not urls:
+            return "Rendering…" if obj.pk and obj.file and not obj.preview_hash else "No preview"
+        return format_html_join(
+            "", '<a href="{}" target="_blank"><img src="{}" alt="Page {}" style="max-height:160px;margin-right:4px"></a>',
+            ((obj.file.url, url, page) for page, url in enumerate(urls, start=1)),
+        )
 
-class PrintOrderAdmin(admin.ModelAdmin):
-    list_display = ["id", "user", "total_price", "status", "payment_status", "created_at", "files"]
+class PrintOrderAdmin(LargeTableAdmin, admin.ModelAdmin):
+    list_display = ["id", "user", "total_price", "status", "payment_status", "queue_position", "estimated_ready_at", "created_at", "files"]
     list_filter = ["status", "payment_status", "created_at"]
     search_fields = ["user__username", "status", "payment_status"]
     inlines = [PrintOrderFileInline]  # Show related files inside order details
 
-    actions = ["mark_as_confirmed", "mark_as_printed", "mark_as_delivered", "mark_as_cancelled"]
+    actions = ["mark_as_confirmed", "mark_as_printed", "mark_as_delivered", "mark_as_cancelled", "prepare_print_jobs"]
 
     fieldsets = (
         ("Order Information", {"fields": ("user", "total_price", "status", "payment_status","transaction_id", "created_at")}),
-        ("Print Preferences", {"fields": ("paper_size", "color_mode", "print_sides", "binding_option", "urgency", "additional_notes")}),
-        ("Uploaded Files", {"fields": ("file_list",)}),  # Custom field to display files
+        ("Print Preferences", {"fields": ("paper_size", "color_mode", "print_sides", "pages_per_sheet", "binding_option", "urgency", "additional_notes")}),
+        ("Uploaded Files", {"fields": ("file_list", "print_job_file")}),  # Custom field to display files
     )
 
-    readonly_fields = ("file_list", "created_at")  # Prevent modification of file list
+    readonly_fields = ("file_list", "print_job_file", "created_at")  # Prevent modification of file list
 
     def files(self, obj):
         """Displays associated files as clickable links in the order list view."""
@@ -133,12 +181,36 @@ class PrintOrderAdmin(admin.ModelAdmin):
 
     file_list.short_description = "Uploaded Files"
 
+    def print_job_file(self, obj):
+        """The print-ready PDF built when the order was confirmed."""
+        job = PrintJob.objects.filter(print_order=obj).first()
+        if job is None or not job.file:
+            return job.error if job is not None and job.error else "Prepared when the order is confirmed"
+        link = format_html(
+            '<a href="{}" target="_blank">{}</a> ({} sides on {} sheets, {})',
+            job.file.url, job.file.name.split("/")[-1], job.sides, job.sheets, timezone.localtime(job.prepared_at).strftime("%Y-%m-%d %H:%M"),
+        )
+        return format_html("{}<br>{}", link, job.error) if job.error else link
+
+    print_job_file.short_description = "Print job"
+
+    def prepare_print_jobs(self, request, queryset):
+        schedule_print_jobs(list(queryset.values_list("id", flat=True)), force=True)
+        self.message_user(request, "Print jobs are being prepared; reload the order in a moment.")
+    prepare_print_jobs.short_description = "Prepare print jobs again"
+
     def save_model(self, request, obj, form, change):
         if change:
             original = PrintOrder.objects.get(pk=obj.pk)
             if original.status != obj.status:
                 self.send_status_email(obj)
         super().save_model(request, obj, form, change)
+        if change and original.status != obj.status:
+            record_print_transition(obj.pk, original.status, obj.status)
+            if original.status in printqueue.WAITING_STATUSES and obj.status in PRINTED_STATUSES:
+                printqueue.record_printed([obj.pk])
+            if obj.status == "confirmed":
+                schedule_print_jobs([obj.pk])
 
     def send_status_email(self, order):
         file_links = "\n".join(
@@ -167,34 +239,99 @@ class PrintOrderAdmin(admin.ModelAdmin):
         recipient_list = [order.user.email]
         send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipient_list)
 
-def mark_as_confirmed(self, request, queryset):
-    queryset.update(status="confirmed")
-    for order in queryset:
-        self.send_status_email(order)
-mark_as_confirmed.short_description = "Mark selected orders as Confirmed"
+    def mark_as_confirmed(self, request, queryset):
+        transition_print_orders(queryset, "confirmed")
+        for order in queryset:
+            self.send_status_email(order)
+    mark_as_confirmed.short_description = "Mark selected orders as Confirmed"
+
+    def mark_as_printed(self, request, queryset):
+        transition_print_orders(queryset, "printed")
+        for order in queryset:
+            self.send_status_email(order)
+    mark_as_printed.short_description = "Mark selected orders as Printed"
+
+    def mark_as_delivered(self, request, queryset):
+        transition_print_orders(queryset, "delivered")
+        for order in queryset:
+            self.send_status_email(order)
+    mark_as_delivered.short_description = "Mark selected orders as Delivered"
+
+    def mark_as_cancelled(self, request, queryset):
+        transition_print_orders(queryset, "cancelled")
+        for order in queryset:
+            self.send_status_email(order)
+    mark_as_cancelled.short_description = "Mark selected orders as Cancelled"
+
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'total_price', 'status', 'payment_status', 'created_at', 'archived_at']
+    list_filter = ['status', 'payment_status']
+    search_fields = ['=id', '=transaction_id']
+    readonly_fields = [field.name for field in ArchivedOrder._meta.fields]
+
+
+class ArchivedPrintOrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'total_price', 'status', 'payment_status', 'created_at', 'archived_at']
+    list_filter = ['status', 'payment_status']
+    search_fields = ['=id', '=transaction_id']
+    readonly_fields = [field.name for field in ArchivedPrintOrder._meta.fields]
 
-def mark_as_printed(self, request, queryset):
-    queryset.update(status="printed")
-    for order in queryset:
-        self.send_status_email(order)
-mark_as_printed.short_description = "Mark selected orders as Printed"
 
-def mark_as_delivered(self, request, queryset):
-    queryset.update(status="delivered")
-    for order in queryset:
-        self.send_status_email(order)
-mark_as_delivered.short_description = "Mark selected orders as Delivered"
+class LowStockAlertAdmin(admin.ModelAdmin):
+    list_display = ['product', 'stock', 'current_stock', 'created_at', 'resolved_at']
+    list_filter = [('resolved_at', admin.EmptyFieldListFilter)]
+    list_select_related = ['product']
+    readonly_fields = ['product', 'stock', 'created_at']
+    actions = ['mark_resolved']
 
-def mark_as_cancelled(self, request, queryset):
-    queryset.update(status="cancelled")
-    for order in queryset:
-        self.send_status_email(order)
-mark_as_cancelled.short_description = "Mark selected orders as Cancelled"
+    def current_stock(self, obj):
+        return obj.product.available_quantity
 
+    def mark_resolved(self, request, queryset):
+        queryset.filter(resolved_at__isnull=True).update(resolved_at=timezone.now())
+    mark_resolved.short_description = "Mark selected alerts as resolved"
 
 
+class PaymentClaimAdmin(admin.ModelAdmin):
+    list_display = ['transaction_id', 'method', 'amount', 'order', 'print_order', 'created_at', 'verified_at']
+    list_filter = ['method', ('verified_at', admin.EmptyFieldListFilter)]
+    search_fields = ['=transaction_id']
+    raw_id_fields = ['order', 'print_order']
 
 
+class StatementLineAdmin(admin.ModelAdmin):
+    list_display = ['statement', 'line_no', 'transaction_id', 'amount', 'expected_amount', 'paid_at', 'status']
+    list_filter = ['status', 'statement']
+    search_fields = ['=transaction_id']
+    raw_id_fields = ['claim']
+
+
+class PickupWindowAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'start_time', 'end_time', 'capacity', 'weekdays', 'is_active']
+    list_editable = ['capacity', 'weekdays', 'is_active']
+
+
+class PickupSlotAdmin(admin.ModelAdmin):
+    list_display = ['date', 'start_time', 'end_time', 'capacity', 'booked']
+    list_filter = ['date']
+    readonly_fields = ['window', 'booked']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        pickup.invalidate(obj.date)
+
+
+class RosterEntryAdmin(admin.ModelAdmin):
+    list_display = ['registration_number', 'email', 'roster']
+    list_filter = ['roster']
+    search_fields = ['=registration_number', '=email']
+
+
+class DiscountAdmin(admin.ModelAdmin):
+    list_display = ['name', 'code', 'kind', 'value', 'min_quantity', 'first_order_only', 'starts_at', 'ends_at', 'is_active']
+    list_filter = ['is_active', 'kind', 'first_order_only']
+    search_fields = ['name', '=code']
+    filter_horizontal = ['products', 'categories']
 
 
 admin.site.register(PrintOrder, PrintOrderAdmin)
@@ -203,6 +340,12 @@ admin.site.register(OrderItem)
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(CustomUser, CustomUserAdmin)
-
-
-
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
+admin.site.register(ArchivedPrintOrder, ArchivedPrintOrderAdmin)
+admin.site.register(LowStockAlert, LowStockAlertAdmin)
+admin.site.register(PaymentClaim, PaymentClaimAdmin)
+admin.site.register(StatementLine, StatementLineAdmin)
+admin.site.register(RosterEntry, RosterEntryAdmin)
+admin.site.register(PickupWindow, PickupWindowAdmin)
+admin.site.register(PickupSlot, PickupSlotAdmin)
+admin.site.register(Discount, DiscountAdmin)
@@ -0,0 +1,141 @@
+"""
+Moves finished history out of the hot tables in small transactions.
+
+Every batch locks its rows, copies them into the archive tables and deletes the originals in
+the same transaction, so a run can be interrupted at any point and simply started again, and a
+row changed meanwhile (e.g. an order un-cancelled by staff) is either archived as it is after the
+change or left for the next run.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from .bootstrap import invalidate_users
+from .fast_serializers import money, timestamp
+from .models import (
+    ArchivedCart, ArchivedOrder, ArchivedPrintOrder, Cart, Order, OrderAddress, OrderItem, PrintOrder, PrintOrderFile,
+)
+
+
+FINISHED_STATUSES = ['delivered', 'cancelled']
+ADDRESS_FIELDS = ['first_name', 'last_name', 'registration_no', 'phone_number', 'email', 'note']
+ORDER_FIELDS = ['id', 'user_id', 'total_price', 'discount', 'created_at', 'status', 'payment_status', 'transaction_id']
+SLOT_FIELDS = ['id', 'date', 'start_time', 'end_time']
+PRINT_ORDER_FIELDS = [
+    'id', 'user_id', 'paper_size', 'color_mode', 'print_sides', 'binding_option', 'urgency', 'additional_notes',
+    'total_price', 'created_at', 'status', 'payment_status', 'transaction_id',
+]
+CART_FIELDS = ['id', 'user_id', 'product_id', 'quantity', 'total_price', 'created_at', 'updated_at']
+
+
+def archive_in_batches(queryset, archive_batch, batch_size):
+    """Call `archive_batch(ids)` on successive batches of primary keys until `queryset` is empty; yields batch sizes."""
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.select_for_update().order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            archive_batch(ids)
+        yield len(ids)
+
+
+def forget_cached(rows):
+    """Queryset deletes send no signals: drop the owners' cached bootstrap sections once the batch commits."""
+    user_ids = {row['user_id'] for row in rows}
+    transaction.on_commit(lambda: invalidate_users(user_ids))
+
+
+def archive_orders(cutoff, batch_size=1000):
+    queryset = Order.objects.filter(status__in=FINISHED_STATUSES, created_at__lt=cutoff)
+    return archive_in_batches(queryset, archive_order_batch, batch_size)
+
+
+def archive_order_batch(ids):
+    items = defaultdict(list)
+    for order_id, product_id, product_name, quantity, price in (
+        OrderItem.objects.filter(order_id__in=ids).order_by('id')
+        .values_list('order_id', 'product_id', 'product__name', 'quantity', 'price')
+    ):
+        items[order_id].append({'product_id': product_id, 'product': product_name, 'quantity': quantity, 'price': money(price)})
+    addresses = {
+        row['order_id']: {field: row[field] for field in ADDRESS_FIELDS}
+        for row in OrderAddress.objects.filter(order_id__in=ids).values('order_id', *ADDRESS_FIELDS)
+    }
+    slots = {
+        order_id: dict(zip(SLOT_FIELDS, slot))
+        for order_id, *slot in Order.objects.filter(id__in=ids, pickup_slot__isnull=False)
+        .values_list('id', *('pickup_slot__' + field for field in SLOT_FIELDS))
+    }
+    orders = list(Order.objects.filter(id__in=ids).values(*ORDER_FIELDS))
+    ArchivedOrder.objects.bulk_create(
+        [
+            ArchivedOrder(
+                **order, items=items.get(order['id'], []), order_address=addresses.get(order['id']),
+                pickup_slot=slot_data(slots.get(order['id'])),
+            )
+            for order in orders
+        ],
+        ignore_conflicts=True,
+    )
+    Order.objects.filter(id__in=ids).delete()  # cascades to items and address
+    forget_cached(orders)
+
+
+def archive_print_orders(cutoff, batch_size=1000):
+    queryset = PrintOrder.objects.filter(status__in=FINISHED_STATUSES, created_at__lt=cutoff)
+    return archive_in_batches(queryset, archive_print_order_batch, batch_size)
+
+
+def archive_print_order_batch(ids):
+    files = defaultdict(list)
+    for print_order_id, pk, name, page_count in (
+        PrintOrderFile.objects.filter(print_order_id__in=ids).order_by('id')
+        .values_list('print_order_id', 'id', 'file', 'page_count')
+    ):
+        files[print_order_id].append({'id': pk, 'file': name, 'page_count': page_count})
+    print_orders = list(PrintOrder.objects.filter(id__in=ids).values(*PRINT_ORDER_FIELDS))
+    ArchivedPrintOrder.objects.bulk_create(
+        [ArchivedPrintOrder(**row, files=files.get(row['id'], [])) for row in print_orders],
+        ignore_conflicts=True,
+    )
+    PrintOrder.objects.filter(id__in=ids).delete()  # the uploaded files stay on disk, referenced from the archive
+    forget_cached(print_orders)
+
+
+def archive_carts(cutoff, batch_size=5000):
+    queryset = Cart.objects.filter(is_checked_out=True, updated_at__lt=cutoff)
+    return archive_in_batches(queryset, archive_cart_batch, batch_size)
+
+
+def archive_cart_batch(ids):
+    ArchivedCart.objects.bulk_create(
+        [ArchivedCart(**row) for row in Cart.objects.filter(id__in=ids).values(*CART_FIELDS)],
+        ignore_conflicts=True,
+    )
+    Cart.objects.filter(id__in=ids).delete()
+
+
+def slot_data(slot):
+    """The slot as OrderSerializer shows it, or None."""
+    if slot is None:
+        return None
+    return {
+        'id': slot['id'], 'date': slot['date'].isoformat(),
+        'start_time': slot['start_time'].isoformat(), 'end_time': slot['end_time'].isoformat(),
+    }
+
+
+def archived_order_data(archived):
+    """Same shape as OrderSerializer output, so clients can't tell archived history apart."""
+    return {
+        'id': archived.id,
+        'user': archived.user_id,
+        'total_price': money(archived.total_price),
+        'status': archived.status,
+        'payment_status': archived.payment_status,
+        'transaction_id': archived.transaction_id,
+        'created_at': timestamp(archived.created_at),
+        'items': [{'product': item['product'], 'quantity': item['quantity'], 'price': item['price']} for item in archived.items],
+        'order_address': archived.order_address,
+        'pickup_slot': archived.pickup_slot,
+    }
@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+
+from .hashing import HashingBusy, amake_password, averify_password, make_password, verify_password
+
+
+def refuse_busy(request, exc):
+    """
+    Fail the login without trying other backends (the admin login form would otherwise show a
+    500). The HashingBusy is kept on the request so API views can still answer 503 + Retry-After.
+    """
+    if request is not None:
+        request.hashing_busy = exc
+    raise PermissionDenied(str(exc.detail)) from exc
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend with the password check done in the hashing pool (sync and async). When the
+    stored hash uses an older hasher or older parameters, the upgraded hash is saved. A full
+    pool fails the login through refuse_busy.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            user = None
+        try:
+            if user is None:
+                make_password(password)  # Same cost as a real check, so response time doesn't reveal unknown usernames
+                return None
+            valid, upgraded = verify_password(password, user.password)
+        except HashingBusy as exc:
+            refuse_busy(request, exc)
+        if upgraded:
+            user.password = upgraded
+            UserModel._default_manager.filter(pk=user.pk).update(password=upgraded)
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            user = None
+        try:
+            if user is None:
+                await amake_password(password)
+                return None
+            valid, upgraded = await averify_password(password, user.password)
+        except HashingBusy as exc:
+            refuse_busy(request, exc)
+        if upgraded:
+            user.password = upgraded
+            await UserModel._default_manager.filter(pk=user.pk).aupdate(password=upgraded)
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
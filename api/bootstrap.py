@@ -0,0 +1,100 @@
+"""
+Everything the app loads at startup, in one response (GET /api/bootstrap/).
+
+Each section has exactly the shape of its standalone endpoint, so the frontend can reuse its
+parsing. The user's cart, orders and print orders are cached per user until one of them
+changes: signals on Cart/Order/PrintOrder saves, cart removals, the admin's bulk status
+actions, archiving and cart expiry call invalidate_user(s). The cached cart also carries each
+product's price and stock, so product saves, checkouts, restocks and catalog imports drop the
+entries of the users with that product in their open cart (invalidate_carts_holding), and so
+does renaming its category (invalidate_carts_in_category). The entries live in the shared cache,
+so a change made in one worker is seen by all. The cart is discounted after it comes out of the
+cache, so it is priced exactly as CartView prices it. Categories are cached for everyone until a
+category changes. Products are not cached because stock moves with every checkout; the fast
+serializer is cheap enough for them.
+
+The sections are still separate queries run one after another; nothing plans them together.
+Each is a short indexed read, and a cached user skips three of them, so the saving is in the
+round trips and authentications, not the queries.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .discounts import price_cart_data
+from .fast_serializers import FastCartSerializer, FastOrderSerializer, FastPrintOrderSerializer, FastProductSerializer
+from .models import Cart, Category, Order, PrintOrder, Product
+from .serializers import CategorySerializer, UserSerializer
+
+
+SECTIONS = ('user', 'categories', 'products', 'cart', 'orders', 'print_orders')
+USER_SECTIONS = ('cart', 'orders', 'print_orders')
+CATEGORIES_KEY = 'bootstrap:categories'
+
+
+def user_key(user_id):
+    return f'bootstrap:user:{user_id}'
+
+
+def invalidate_user(user_id):
+    cache.delete(user_key(user_id))
+
+
+def invalidate_users(user_ids):
+    cache.delete_many([user_key(user_id) for user_id in set(user_ids)])
+
+
+def invalidate_carts_holding(product_ids):
+    """Drop the cached sections of users whose open cart has one of these products."""
+    holders = Cart.objects.filter(product_id__in=list(product_ids), is_checked_out=False).values_list('user_id', flat=True)
+    invalidate_users(holders.distinct())
+
+
+def invalidate_carts_in_category(category_id):
+    """Drop the cached sections of users whose open cart has a product in this category."""
+    holders = Cart.objects.filter(product__category_id=category_id, is_checked_out=False).values_list('user_id', flat=True)
+    invalidate_users(holders.distinct())
+
+
+def invalidate_categories():
+    cache.delete(CATEGORIES_KEY)
+
+
+def user_sections(request):
+    user = request.user
+    context = {'request': request}
+    cart = FastCartSerializer(Cart.objects.filter(user=user, is_checked_out=False), context=context)
+    return {
+        'cart': {'cart_items': cart.data, 'total_cart_price': cart.total},
+        'orders': FastOrderSerializer(Order.objects.filter(user=user).order_by('-created_at')).data,
+        'print_orders': FastPrintOrderSerializer(PrintOrder.objects.filter(user=user), context=context).data,
+    }
+
+
+def cached_user_sections(request):
+    # Media URLs are absolute, so an entry built for another host can't be reused.
+    host = request.get_host()
+    cached = cache.get(user_key(request.user.pk))
+    if cached is None or cached['host'] != host:
+        cached = {'host': host, 'sections': user_sections(request)}
+        cache.set(user_key(request.user.pk), cached, getattr(settings, 'BOOTSTRAP_CACHE_SECONDS', 300))
+    return cached['sections']
+
+
+def build(request, sections=SECTIONS):
+    data = {}
+    if 'user' in sections:
+        data['user'] = UserSerializer(request.user).data  # already loaded by authentication
+    if 'categories' in sections:
+        data['categories'] = cache.get(CATEGORIES_KEY)
+        if data['categories'] is None:
+            data['categories'] = [dict(row) for row in CategorySerializer(Category.objects.all(), many=True).data]
+            cache.set(CATEGORIES_KEY, data['categories'], None)
+    if 'products' in sections:
+        data['products'] = FastProductSerializer(Product.objects.order_by('name'), context={'request': request}).data
+    if any(section in sections for section in USER_SECTIONS):
+        cached = cached_user_sections(request)
+        data.update((section, cached[section]) for section in USER_SECTIONS if section in sections)
+    if 'cart' in data:
+        # Priced on every request: discounts start, end and change without touching the cached cart
+        data['cart'] = price_cart_data(data['cart']['cart_items'], request.user)
+    return data
@@ -0,0 +1,138 @@
+"""
+Admin changelists that stay fast on tables with millions of orders.
+
+- Counts: above ADMIN_EXACT_COUNT_LIMIT rows, pagination uses Postgres' estimate (table
+  statistics when unfiltered, the planner's row estimate otherwise) instead of COUNT(*), and
+  the unfiltered total isn't counted at all.
+- Search: a number finds the order with that id or transaction id, a status name filters by
+  status, and anything else searches usernames through a subquery (backed by the trigram index
+  from migration 0025) instead of ILIKE over a join on every search field.
+- Keyset pages: ?before=<id> lists the rows below that id, newest first, so going deep into the
+  history costs the same as the first page. Filters and search still apply. They're only offered
+  while the list is sorted newest first (by id); under any other sorting, such as the order
+  admin's pickup queue, ?before is ignored and the pager says how to get them.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+BEFORE_VAR = 'before'
+MAX_BIGINT = 2 ** 63 - 1
+
+
+def exact_count_limit():
+    return getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000)
+
+
+def estimated_count(queryset):
+    """Postgres' estimate of the queryset's row count, or None on other databases / unanalyzed tables."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None  # -1: never vacuumed or analyzed
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < exact_count_limit():
+            return super().count
+        self.estimated = True
+        return estimate
+
+
+class KeysetChangeList(ChangeList):
+    keyset = False
+    keyset_url = None
+    older_url = None
+    pages_url = None
+    before = None
+    newest_first = False
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        ordering = super().get_ordering(request, queryset)
+        # Keyset pages list by -pk; they'd silently drop any other sorting
+        self.newest_first = ordering[0] in ('-pk', f'-{self.lookup_opts.pk.attname}')
+        return ordering
+
+    def get_results(self, request):
+        if BEFORE_VAR not in self.params or not self.newest_first:
+            super().get_results(request)
+            if self.multi_page and self.newest_first:
+                self.keyset_url = self.get_query_string({BEFORE_VAR: ''}, [PAGE_VAR])
+            return
+
+        try:
+            self.before = int(self.params[BEFORE_VAR]) if self.params[BEFORE_VAR] else None
+        except ValueError:
+            raise IncorrectLookupParameters
+        queryset = self.queryset.order_by('-pk')
+        if self.before is not None:
+            queryset = queryset.filter(pk__lt=self.before)
+        rows = list(queryset[:self.list_per_page + 1])
+        self.result_list = rows[:self.list_per_page]
+        if len(rows) > self.list_per_page:
+            self.older_url = self.get_query_string({BEFORE_VAR: self.result_list[-1].pk}, [PAGE_VAR])
+        self.keyset = True
+        self.keyset_url = self.get_query_string({BEFORE_VAR: ''}, [PAGE_VAR])
+        self.pages_url = self.get_query_string(remove=[BEFORE_VAR])
+        self.result_count = len(self.result_list)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+
+
+class LargeTableAdmin:
+    """ModelAdmin mixin for order tables: estimated counts, indexed search and keyset pages."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    choice_search_fields = ('status', 'payment_status')
+    search_help_text = "Order number or transaction ID, a status, or part of a username."
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            if int(term) > MAX_BIGINT:
+                return queryset.filter(transaction_id=term), False
+            return queryset.filter(Q(pk=int(term)) | Q(transaction_id=term)), False
+        for field_name in self.choice_search_fields:
+            field = self.model._meta.get_field(field_name)
+            for value, label in field.choices:
+                if term.casefold() in (str(value).casefold(), str(label).casefold()):
+                    return queryset.filter(**{field_name: value}), False
+        users = get_user_model().objects.filter(username__icontains=term).values('pk')
+        return queryset.filter(user__in=users), False
@@ -0,0 +1,89 @@
+"""
+Negotiated response compression: brotli when the client accepts it and the `brotli` package is
+installed, gzip otherwise (Django's GZipMiddleware, including its BREACH padding). HTML always
+gets gzip: it is where secrets (CSRF tokens) sit next to text an attacker can reflect, and only
+the gzip path has the padding that mitigates BREACH.
+
+Only text-like content types at least COMPRESSION_MIN_LENGTH bytes long are compressed; images,
+PDFs and partial (Range) responses pass through untouched. Streaming responses are compressed
+chunk by chunk, so they stay streaming.
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml', 'application/x-ndjson', 'image/svg+xml',
+)
+
+
+def accepted_encodings(header):
+    """Codings from an Accept-Encoding header that the client didn't refuse with q=0."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in sequence:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_length = getattr(settings, 'COMPRESSION_MIN_LENGTH', 1024)
+        self.brotli_quality = getattr(settings, 'BROTLI_QUALITY', 5)  # 11 is far too slow for per-request work
+
+    def should_compress(self, response):
+        if response.status_code != 200 or response.has_header('Content-Encoding'):
+            return False
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return False
+        return response.streaming or len(response.content) >= self.min_length
+
+    def process_response(self, request, response):
+        if not self.should_compress(response):
+            return response
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if (brotli is None or 'br' not in accepted or getattr(response, 'is_async', False)
+                or response['Content-Type'].startswith('text/html')):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = brotli_sequence(response.streaming_content, self.brotli_quality)
+            del response.headers['Content-Length']
+        else:
+            compressed = brotli.compress(response.content, quality=self.brotli_quality)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,372 @@
+"""
+Discount engine: prices a cart against the active Discount rules.
+
+Rules are compiled into a RuleSet that indexes them by product and by category, so pricing a
+cart only looks at the rules that can touch one of its lines (plus catalog-wide rules and the
+coupon, if one was entered). The merged list of rules for each (product, category) is worked
+out once per RuleSet and kept, so a cart costs one lookup per line. Each line gets at most one
+discount: the rule saving the most on the lines still undiscounted is applied first, then the
+next, until no rule saves anything.
+
+Each worker process keeps its compiled RuleSet until the rules change. Discount signals bump a
+version in the cache, which settings_production shares between workers; the others notice the
+new version and recompile, so CartView, the bootstrap cart and CheckoutView price with the same
+rules. A compiled RuleSet is also never used for more than DISCOUNT_RULES_MAX_AGE seconds, so
+a missed bump (a per-process cache, an evicted version) can't keep a disabled coupon working for
+longer. Start and end times are checked when pricing, so rules switch on and off without a
+recompile.
+"""
+import heapq
+import threading
+import time
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .fast_serializers import money
+from .models import Discount, Order
+
+
+VERSION_KEY = 'discount-rules-version'
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+class InvalidCoupon(Exception):
+    pass
+
+
+def cents(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class Line:
+    """One cart line being priced; `discount` and `rule` are filled in by RuleSet.price."""
+    __slots__ = ('key', 'product_id', 'category_id', 'quantity', 'unit_price', 'subtotal', 'discount', 'rule')
+
+    def __init__(self, key, product_id, category_id, quantity, unit_price):
+        self.key = key
+        self.product_id = product_id
+        self.category_id = category_id
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.subtotal = unit_price * quantity
+        self.discount = ZERO
+        self.rule = None
+
+    @property
+    def total(self):
+        return self.subtotal - self.discount
+
+
+class Rule:
+    __slots__ = ('id', 'name', 'code', 'kind', 'value', 'min_quantity', 'product_ids', 'category_ids',
+                 'first_order_only', 'starts_at', 'ends_at', 'scheduled')
+
+    def __init__(self, id, name, code, kind, value, min_quantity, product_ids=(), category_ids=(),
+                 first_order_only=False, starts_at=None, ends_at=None):
+        self.id = id
+        self.name = name
+        self.code = code
+        self.kind = kind
+        self.value = value
+        self.min_quantity = max(min_quantity, 1)
+        self.product_ids = frozenset(product_ids)
+        self.category_ids = frozenset(category_ids)
+        self.first_order_only = first_order_only
+        self.starts_at = starts_at
+        self.ends_at = ends_at
+        self.scheduled = starts_at is not None or ends_at is not None
+
+    @property
+    def catalog_wide(self):
+        return not self.product_ids and not self.category_ids
+
+    def live(self, now):
+        return (self.starts_at is None or self.starts_at <= now) and (self.ends_at is None or now < self.ends_at)
+
+    def matches(self, line):
+        return self.catalog_wide or line.product_id in self.product_ids or line.category_id in self.category_ids
+
+    def saving(self, lines, quantity=None, subtotal=None):
+        """
+        What the rule takes off the given (matching, undiscounted) lines; percentages unrounded per
+        line. The lines' total quantity and subtotal can be passed in when already worked out.
+        """
+        if (sum(line.quantity for line in lines) if quantity is None else quantity) < self.min_quantity:
+            return ZERO
+        if self.kind == Discount.PERCENT:
+            return (sum(line.subtotal for line in lines) if subtotal is None else subtotal) * self.value / 100
+        if self.kind == Discount.AMOUNT:
+            value = self.value
+            return sum((min(value, line.unit_price) * line.quantity for line in lines), ZERO)
+        return sum((off for _, off in self.combo_groups(lines)), ZERO)
+
+    def allocate(self, lines):
+        """[(line, amount)] the rule takes off the given lines, rounded to cents."""
+        if sum(line.quantity for line in lines) < self.min_quantity:
+            return []
+        if self.kind == Discount.PERCENT:
+            return [(line, cents(line.subtotal * self.value / 100)) for line in lines]
+        if self.kind == Discount.AMOUNT:
+            return [(line, min(self.value, line.unit_price) * line.quantity) for line in lines]
+        saved = defaultdict(Decimal)
+        for group, off in self.combo_groups(lines):
+            full = off + self.value
+            left = off
+            for price, line in group[:-1]:  # split the group's saving over its units by price
+                share = cents(off * price / full)
+                saved[line] += share
+                left -= share
+            saved[group[-1][1]] += left
+        return list(saved.items())
+
+    def combo_groups(self, lines):
+        """Yield (units, saving) per group of min_quantity units, dearest units first, while groups save anything."""
+        units = []
+        for line in lines:
+            units.extend([(line.unit_price, line)] * line.quantity)
+        units.sort(key=itemgetter(0), reverse=True)
+        size = self.min_quantity
+        for start in range(0, len(units) - size + 1, size):
+            group = units[start:start + size]
+            off = sum(price for price, _ in group) - self.value
+            if off <= 0:
+                return  # later groups are cheaper still
+            yield group, off
+
+
+class RuleSet:
+    def __init__(self, rules, version=None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.catalog_wide = []
+        self.by_product = defaultdict(list)
+        self.by_category = defaultdict(list)
+        self.by_line = {}  # (product_id, category_id) -> rules, filled in as carts are priced
+        self.coupons = {}
+        for rule in rules:
+            if rule.code:
+                self.coupons[rule.code] = rule  # only considered when the customer enters the code
+            elif rule.catalog_wide:
+                self.catalog_wide.append(rule)
+            else:
+                for product_id in rule.product_ids:
+                    self.by_product[product_id].append(rule)
+                for category_id in rule.category_ids:
+                    self.by_category[category_id].append(rule)
+
+    def coupon(self, code, now=None):
+        rule = self.coupons.get(code.strip().upper())
+        if rule is None or not rule.live(now or timezone.now()):
+            raise InvalidCoupon("Unknown or expired coupon.")
+        return rule
+
+    def line_rules(self, product_id, category_id):
+        """Every non-coupon rule that applies to a line of this product and category."""
+        key = (product_id, category_id)
+        rules = self.by_line.get(key)
+        if rules is None:
+            product_rules = self.by_product.get(product_id, [])
+            rules = product_rules + [rule for rule in self.by_category.get(category_id, ()) if rule not in product_rules]
+            rules = self.by_line[key] = tuple(rules + self.catalog_wide)
+        return rules
+
+    def candidates(self, lines, code=''):
+        """Rule -> the cart lines it applies to, for every rule that touches the cart."""
+        matching = {}
+        for line in lines:
+            for rule in self.by_line.get((line.product_id, line.category_id)) or self.line_rules(line.product_id, line.category_id):
+                if rule in matching:
+                    matching[rule].append(line)
+                else:
+                    matching[rule] = [line]
+        if code:
+            rule = self.coupon(code)
+            matching[rule] = [line for line in lines if rule.matches(line)]
+        return matching
+
+    def price(self, lines, code='', first_order=None, now=None):
+        """
+        Set each line's discount; returns [(rule, amount)] for the rules applied. Raises InvalidCoupon
+        for a code that isn't a live coupon. `first_order` is a callable, only asked when a
+        first-order rule touches the cart.
+        """
+        now = now or timezone.now()
+        # A rule can only save less once other rules take some of its lines, so a saving worked out
+        # earlier is an upper bound: pop the best, and work it out again only if its lines changed.
+        # Rules that apply to exactly the same lines share one heap entry, led by the best of them:
+        # a crowded category then costs one entry instead of one per rule. Entries remember how
+        # many lines were taken when they were worked out; while that is unchanged they can't be stale.
+        groups = {}
+        for rule, matching in self.candidates(lines, code).items():
+            if rule.scheduled and not rule.live(now):
+                continue
+            if rule.first_order_only and not (first_order and first_order()):
+                continue
+            groups.setdefault(tuple(map(id, matching)), (matching, []))[1].append(rule)
+        heap = []
+        for matching, rules in groups.values():
+            entry = best_of(rules, matching, 0)
+            if entry is not None:
+                heap.append(entry)
+        heapq.heapify(heap)
+
+        taken = set()
+        applied = []
+        while heap and len(taken) < len(lines):
+            bound, rule_id, rule, rules, matching, seen = heapq.heappop(heap)
+            if seen != len(taken):
+                available = [line for line in matching if line not in taken]
+                if rule is None or len(available) != len(matching):
+                    entry = best_of(rules, available, len(taken)) if available else None
+                    if entry is not None:
+                        heapq.heappush(heap, entry)
+                    continue
+            others = [other for other in rules if other is not rule]
+            if others:  # still candidates for whatever lines the rule leaves; bounded by its saving
+                heapq.heappush(heap, (bound, min(other.id for other in others), None, others, matching, -1))
+            total = ZERO
+            for line, amount in rule.allocate(matching):
+                if amount > 0:
+                    line.discount = min(amount, line.subtotal)
+                    line.rule = rule
+                    taken.add(line)
+                    total += line.discount
+            if total:
+                applied.append((rule, total))
+        return applied
+
+
+def best_of(rules, lines, seen):
+    """The heap entry for rules sharing `lines`: led by the one saving the most (lowest id on a tie), or None."""
+    quantity = sum(line.quantity for line in lines)
+    subtotal = sum(line.subtotal for line in lines)
+    best = None
+    for rule in rules:
+        saving = rule.saving(lines, quantity, subtotal)
+        if saving > 0 and (best is None or (-saving, rule.id) < best[:2]):
+            best = (-saving, rule.id, rule, rules, lines, seen)
+    return best
+
+
+compiled = None
+lock = threading.Lock()
+
+
+def compile_rules():
+    version = cache.get_or_set(VERSION_KEY, new_version, None)
+    now = timezone.now()
+    live = Discount.objects.filter(is_active=True).filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+    product_ids, category_ids = defaultdict(list), defaultdict(list)
+    for discount_id, product_id in Discount.products.through.objects.filter(discount__in=live).values_list('discount_id', 'product_id'):
+        product_ids[discount_id].append(product_id)
+    for discount_id, category_id in Discount.categories.through.objects.filter(discount__in=live).values_list('discount_id', 'category_id'):
+        category_ids[discount_id].append(category_id)
+    rules = [
+        Rule(
+            pk, name, code.upper(), kind, value, min_quantity, product_ids[pk], category_ids[pk],
+            first_order_only, starts_at, ends_at,
+        )
+        for pk, name, code, kind, value, min_quantity, first_order_only, starts_at, ends_at in live.values_list(
+            'id', 'name', 'code', 'kind', 'value', 'min_quantity', 'first_order_only', 'starts_at', 'ends_at',
+        )
+    ]
+    return RuleSet(rules, version)
+
+
+def max_age():
+    return getattr(settings, 'DISCOUNT_RULES_MAX_AGE', 60)
+
+
+def current_rules():
+    global compiled
+    version = cache.get(VERSION_KEY)
+    if (compiled is None or version is None or version != compiled.version
+            or time.monotonic() - compiled.built_at > max_age()):
+        with lock:
+            compiled = compile_rules()
+    return compiled
+
+
+def new_version():
+    # From the clock, so a version re-created after the cache lost it never equals an old one
+    return time.time_ns()
+
+
+def bump_version():
+    """Tell every worker to recompile its rules (also call this after bulk changes to discounts)."""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        version = new_version()
+        cache.set(VERSION_KEY, version, None)
+        return version
+
+
+def unit_price(price, sale_price):
+    # Same as Cart.save: a sale price, when set, replaces the price
+    return sale_price if sale_price else price
+
+
+def first_order_check(user):
+    """A callable telling whether the user has no orders yet (one query, on first call only)."""
+    answer = []
+
+    def first_order():
+        if not answer:
+            answer.append(not Order.objects.filter(user=user).exclude(status='cancelled').exists())
+        return answer[0]
+    return first_order
+
+
+def price_cart(cart_items, user, code=''):
+    """
+    Price Cart rows (with their products loaded) for checkout. Returns (lines, applied) where
+    lines[i] belongs to cart_items[i]. Raises InvalidCoupon.
+    """
+    lines = [
+        Line(item.pk, item.product_id, item.product.category_id, item.quantity,
+             unit_price(item.product.price, item.product.sale_price))
+        for item in cart_items
+    ]
+    return lines, current_rules().price(lines, code, first_order_check(user))
+
+
+def price_cart_data(cart_items, user, code=''):
+    """
+    Discount a serialized cart (FastCartSerializer/CartSerializer items). Returns the cart in
+    CartView's shape, with each item's total_price after its discount. Raises InvalidCoupon.
+    """
+    lines = [
+        Line(item['id'], item['product']['id'], item['product']['category']['id'], item['quantity'],
+             unit_price(Decimal(item['product']['price']), item['product']['sale_price'] and Decimal(item['product']['sale_price'])))
+        for item in cart_items
+    ]
+    applied = current_rules().price(lines, code, first_order_check(user))
+    items = []
+    for item, line in zip(cart_items, lines):
+        items.append({
+            **item,
+            'total_price': money(line.total),
+            'discount': money(line.discount),
+            'discount_name': line.rule.name if line.rule else None,
+        })
+    subtotal = sum((line.subtotal for line in lines), ZERO)
+    discount = sum((line.discount for line in lines), ZERO)
+    return {
+        'cart_items': items,
+        'subtotal': subtotal,
+        'discount': discount,
+        'discounts': applied_data(applied),
+        'total_cart_price': subtotal - discount,
+    }
+
+
+def applied_data(applied):
+    return [{'id': rule.id, 'name': rule.name, 'code': rule.code or None, 'amount': money(amount)} for rule, amount in applied]
@@ -0,0 +1,220 @@
+"""
+Read-only fast paths for the large list endpoints.
+
+Each serializer reads one `values_list()` query (plus one query per nested collection)
+and builds plain dicts with converters that are set up once per response, instead of
+instantiating models and running DRF's field-by-field machinery for every row. The output
+must stay identical to the matching ModelSerializer in api.serializers; see
+`manage.py bench_serializers`, which checks the bytes as well as the timings.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+
+from .images import RENDITION_FORMATS, get_renditions, has_renditions, rendition_path
+from .models import OrderItem, PrintOrderFile
+from .previews import preview_paths
+
+
+CENT = Decimal('0.01')
+
+
+def money(value):
+    """DecimalField(decimal_places=2) representation."""
+    return None if value is None else '{:f}'.format(value.quantize(CENT))
+
+
+def timestamp(value):
+    """DateTimeField representation: ISO 8601 in the current time zone, 'Z' for UTC."""
+    if not value:
+        return None
+    value = timezone.localtime(value).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def media_url_builder(request):
+    """Return name -> URL exactly as FileField/ImageField would render it for this request."""
+    if isinstance(default_storage, FileSystemStorage):
+        prefix = default_storage.base_url
+        if request is not None:
+            prefix = request.build_absolute_uri(prefix)
+        return lambda name: prefix + filepath_to_uri(name).lstrip('/')
+    if request is not None:
+        return lambda name: request.build_absolute_uri(default_storage.url(name))
+    return default_storage.url
+
+
+class FastSerializer:
+    columns = ()
+
+    def __init__(self, queryset, context=None):
+        self.queryset = queryset
+        self.context = context or {}
+        self.media_url = media_url_builder(self.context.get('request'))
+
+    @property
+    def data(self):
+        return self.serialize(list(self.queryset.values_list(*self.columns)))
+
+    def serialize(self, rows):
+        return [self.build(row) for row in rows]
+
+    def stream(self, chunk_size=1000):
+        """Like `data`, but yields items from a queryset iterator `chunk_size` rows at a time."""
+        # Bind the database now: a streamed response is read after the view (and its replica choice) has returned.
+        rows = self.queryset.using(self.queryset.db).values_list(*self.columns).iterator(chunk_size=chunk_size)
+        return self.stream_rows(rows, chunk_size)
+
+    def stream_rows(self, rows, chunk_size):
+        while chunk := list(islice(rows, chunk_size)):
+            yield from self.serialize(chunk)
+
+    def build(self, row):
+        raise NotImplementedError
+
+
+class FastProductSerializer(FastSerializer):
+    """Same output as ProductSerializer."""
+    columns = (
+        'id', 'category_id', 'category__name', 'image_hash', 'name', 'short_description',
+        'full_description', 'image', 'price', 'available_quantity', 'sale_price',
+    )
+
+    def __init__(self, queryset, context=None):
+        super().__init__(queryset, context)
+        self.renditions = [(name, width) for name, width in get_renditions().items()]
+
+    def rendition_urls(self, source_hash):
+        if not has_renditions(source_hash):
+            return {}
+        urls = {}
+        for name, width in self.renditions:
+            urls[name] = entry = {'width': width}
+            for ext in RENDITION_FORMATS:
+                entry[ext] = self.media_url(rendition_path(source_hash, width, ext))
+        return urls
+
+    def build(self, row):
+        pk, category_id, category_name, image_hash, name, short_description, full_description, image, price, quantity, sale_price = row
+        return {
+            'id': pk,
+            'category': {'id': category_id, 'name': category_name},
+            'image_renditions': self.rendition_urls(image_hash),
+            'name': name,
+            'short_description': short_description,
+            'full_description': full_description,
+            'image': self.media_url(image) if image else None,
+            'price': money(price),
+            'available_quantity': quantity,
+            'sale_price': money(sale_price),
+        }
+
+
+class FastCartSerializer(FastSerializer):
+    """Same output as CartSerializer, plus the running total CartView reports."""
+    columns = ('id', 'user_id', 'quantity', 'total_price') + tuple('product__' + c for c in FastProductSerializer.columns)
+
+    def __init__(self, queryset, context=None):
+        super().__init__(queryset, context)
+        self.product = FastProductSerializer(None, context)
+        self.total = 0
+
+    def build(self, row):
+        pk, user_id, quantity, total_price = row[:4]
+        self.total += total_price
+        return {
+            'id': pk,
+            'user': user_id,
+            'product': self.product.build(row[4:]),
+            'quantity': quantity,
+            'total_price': money(total_price),
+        }
+
+
+class FastOrderSerializer(FastSerializer):
+    """Same output as OrderSerializer."""
+    address_fields = ('first_name', 'last_name', 'registration_no', 'phone_number', 'email', 'note')
+    slot_fields = ('id', 'date', 'start_time', 'end_time')
+    columns = (
+        'id', 'user_id', 'total_price', 'status', 'payment_status', 'transaction_id', 'created_at',
+    ) + tuple('order_address__' + f for f in address_fields) + tuple('pickup_slot__' + f for f in slot_fields)
+
+    def serialize(self, rows):
+        items = defaultdict(list)
+        lines = (
+            OrderItem.objects.filter(order_id__in=[row[0] for row in rows]).order_by('id')
+            .values_list('order_id', 'product__name', 'quantity', 'price')
+        )
+        for order_id, product_name, quantity, price in lines:
+            items[order_id].append({'product': product_name, 'quantity': quantity, 'price': money(price)})
+        self.items = items
+        return super().serialize(rows)
+
+    def build(self, row):
+        pk, user_id, total_price, status, payment_status, transaction_id, created_at = row[:7]
+        address = row[7:7 + len(self.address_fields)]
+        slot = row[7 + len(self.address_fields):]
+        return {
+            'id': pk,
+            'user': user_id,
+            'total_price': money(total_price),
+            'status': status,
+            'payment_status': payment_status,
+            'transaction_id': transaction_id,
+            'created_at': timestamp(created_at),
+            'items': self.items.get(pk, []),
+            'order_address': dict(zip(self.address_fields, address)) if address[0] is not None else None,
+            'pickup_slot': {
+                'id': slot[0], 'date': slot[1].isoformat(), 'start_time': slot[2].isoformat(), 'end_time': slot[3].isoformat(),
+            } if slot[0] is not None else None,
+        }
+
+
+class FastPrintOrderSerializer(FastSerializer):
+    """Same output as PrintOrderSerializer."""
+    columns = (
+        'id', 'paper_size', 'color_mode', 'print_sides', 'binding_option', 'urgency', 'additional_notes',
+        'total_price', 'created_at', 'status', 'payment_status', 'transaction_id', 'pages_per_sheet',
+        'queue_position', 'estimated_ready_at',
+    )
+
+    def serialize(self, rows):
+        files = defaultdict(list)
+        uploads = (
+            PrintOrderFile.objects.filter(print_order_id__in=[row[0] for row in rows]).order_by('id')
+            .values_list('print_order_id', 'id', 'file', 'preview_hash', 'preview_pages')
+        )
+        for print_order_id, pk, name, preview_hash, preview_pages in uploads:
+            files[print_order_id].append({
+                'id': pk,
+                'file': self.media_url(name) if name else None,
+                'previews': [self.media_url(path) for path in preview_paths(preview_hash, preview_pages)],
+            })
+        self.files = files
+        return super().serialize(rows)
+
+    def build(self, row):
+        (pk, paper_size, color_mode, print_sides, binding_option, urgency, notes, total_price, created_at, status,
+         payment_status, transaction_id, pages_per_sheet, queue_position, estimated_ready_at) = row
+        return {
+            'id': pk,
+            'files': self.files.get(pk, []),
+            'paper_size': paper_size,
+            'color_mode': color_mode,
+            'print_sides': print_sides,
+            'binding_option': binding_option,
+            'urgency': urgency,
+            'additional_notes': notes,
+            'total_price': money(total_price),
+            'created_at': timestamp(created_at),
+            'status': status,
+            'payment_status': payment_status,
+            'transaction_id': transaction_id,
+            'pages_per_sheet': pages_per_sheet,
+            'queue_position': queue_position,
+            'estimated_ready_at': timestamp(estimated_ready_at),
+        }
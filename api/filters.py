@@ -0,0 +1,26 @@
+"""
+Product list filtering with django-filter.
+
+Only ProductListView uses it, and it imports this module on first use: django-filter is kept out
+of INSTALLED_APPS and out of the views' imports, so a newly started worker doesn't load it to
+serve its first request (see `manage.py profile_startup`).
+"""
+import django_filters
+from django_filters.rest_framework import DjangoFilterBackend
+
+from .models import Product
+
+
+class ProductFilter(django_filters.FilterSet):
+    category_id = django_filters.BaseInFilter(field_name="category_id", lookup_expr="in")  # Allow multiple values
+
+    class Meta:
+        model = Product
+        fields = ['category_id']
+
+
+class ProductFilterBackend(DjangoFilterBackend):
+    template = 'api/filter_form.html'  # django-filter's form template; its own isn't found with the app uninstalled
+
+    def get_filterset_class(self, view, queryset=None):
+        return ProductFilter
@@ -0,0 +1,152 @@
+"""
+Password hashing off the request threads.
+
+Hashing and verification run in a small process pool (PASSWORD_HASHING_WORKERS), so a login storm
+uses at most that many cores and catalog requests keep their workers. At most
+PASSWORD_HASHING_QUEUE jobs per worker may be waiting; beyond that, callers wait up to
+PASSWORD_HASHING_WAIT seconds for a slot and then get a 503 with Retry-After instead of piling up.
+Set PASSWORD_HASHING_WORKERS = 0 to hash inline, e.g. in development. If a worker dies (killed,
+out of memory), the broken pool is dropped and the next sign-in starts a fresh one; sign-ins
+caught in the broken pool get the same 503.
+
+api.backends.PooledModelBackend routes every login (JWT, admin, async) through the pool.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .workers import process_pool
+
+
+logger = logging.getLogger(__name__)
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-ins right now. Please try again in a moment."
+    default_code = 'hashing_busy'
+
+    def __init__(self):
+        super().__init__()
+        self.wait = getattr(settings, 'PASSWORD_HASHING_RETRY_AFTER', 2)  # DRF turns this into Retry-After
+
+
+class TunedArgon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id with the cost parameters from PASSWORD_ARGON2 (see `manage.py bench_password_hashers`)."""
+
+    def __init__(self):
+        params = getattr(settings, 'PASSWORD_ARGON2', {})
+        self.time_cost = params.get('time_cost', self.time_cost)
+        self.memory_cost = params.get('memory_cost', self.memory_cost)
+        self.parallelism = params.get('parallelism', self.parallelism)
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _verify_password(password, encoded):
+    """Returns (valid, new encoded hash if the stored one should be upgraded)."""
+    upgraded = []
+    valid = hashers.check_password(password, encoded, setter=lambda raw: upgraded.append(hashers.make_password(raw)))
+    return valid, upgraded[0] if upgraded else None
+
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def workers():
+    return getattr(settings, 'PASSWORD_HASHING_WORKERS', 0)
+
+
+def get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            count = workers()
+            _pool = process_pool(count)
+            if _slots is None:  # kept across pool rebuilds: jobs of a broken pool still give their slots back
+                _slots = threading.BoundedSemaphore(count * (1 + getattr(settings, 'PASSWORD_HASHING_QUEUE', 4)))
+    return _pool, _slots
+
+
+def discard_pool(pool):
+    """Drop a pool that lost a worker; every later submit to it would raise BrokenProcessPool."""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return  # someone else already replaced it
+        _pool = None
+    logger.error("A password hashing worker died; starting a new pool.")
+    pool.shutdown(wait=False)
+
+
+def submit(func, *args, block=True):
+    """Run `func(*args)` in the pool (or inline without one); returns a Future. Raises HashingBusy when saturated."""
+    if not workers():
+        future = Future()
+        future.set_result(func(*args))
+        return future
+    pool, slots = get_pool()
+    if not slots.acquire(blocking=block, timeout=getattr(settings, 'PASSWORD_HASHING_WAIT', 0.5) if block else None):
+        raise HashingBusy()
+    try:
+        try:
+            future = pool.submit(func, *args)
+        except BrokenProcessPool:
+            discard_pool(pool)
+            pool, _ = get_pool()
+            future = pool.submit(func, *args)
+    except BaseException:
+        slots.release()
+        raise
+
+    def done(future):
+        slots.release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            discard_pool(pool)
+
+    future.add_done_callback(done)
+    return future
+
+
+def result(future):
+    try:
+        return future.result()
+    except BrokenProcessPool:  # the job's worker died; the pool is being replaced, so the client can retry
+        raise HashingBusy()
+
+
+async def aresult(future):
+    try:
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        raise HashingBusy()
+
+
+def make_password(password):
+    return result(submit(_make_password, password))
+
+
+def verify_password(password, encoded):
+    if not hashers.is_password_usable(encoded):
+        return False, None
+    return result(submit(_verify_password, password, encoded))
+
+
+async def amake_password(password):
+    return await aresult(submit(_make_password, password, block=False))
+
+
+async def averify_password(password, encoded):
+    if not hashers.is_password_usable(encoded):
+        return False, None
+    return await aresult(submit(_verify_password, password, encoded, block=False))
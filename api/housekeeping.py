@@ -0,0 +1,176 @@
+"""
+Housekeeping jobs that keep table and disk growth bounded (python manage.py housekeeping).
+
+A job is a function registered with @housekeeping_job(every=...) that takes a batch size and
+yields the number of rows or files it handled per batch. Every batch is its own small
+transaction and re-queries what is left, so jobs can be interrupted and re-run safely.
+The last run of each job is recorded in a JobCheckpoint (`updated_at` is when it ran,
+`position` how much it handled), which is how the scheduler decides what is due.
+"""
+import logging
+import posixpath
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from . import bootstrap, printqueue
+from .archive import archive_carts, archive_in_batches
+from .images import RENDITION_DIR
+from .previews import PREVIEW_DIR
+from .models import ArchivedPrintOrder, Cart, JobCheckpoint, PrintJob, PrintOrderFile, Product
+
+
+logger = logging.getLogger(__name__)
+
+JOBS = {}  # name -> (function, interval)
+
+
+def housekeeping_job(every):
+    def register(func):
+        JOBS[func.__name__] = (func, every)
+        return func
+    return register
+
+
+def delete_in_batches(queryset, batch_size):
+    return archive_in_batches(queryset, lambda pks: queryset.model.objects.filter(pk__in=pks).delete(), batch_size)
+
+
+@housekeeping_job(every=timedelta(hours=1))
+def expire_carts(batch_size):
+    """Drop cart lines nobody has touched for CART_EXPIRY_DAYS."""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'CART_EXPIRY_DAYS', 30))
+    queryset = Cart.objects.filter(is_checked_out=False, updated_at__lt=cutoff)
+    return archive_in_batches(queryset, expire_cart_batch, batch_size)
+
+
+def expire_cart_batch(ids):
+    user_ids = set(Cart.objects.filter(pk__in=ids).values_list('user_id', flat=True))
+    Cart.objects.filter(pk__in=ids).delete()
+    transaction.on_commit(lambda: bootstrap.invalidate_users(user_ids))  # the delete sends no signals
+
+
+@housekeeping_job(every=timedelta(days=1))
+def archive_checked_out_carts(batch_size):
+    """Move checked-out cart lines older than ARCHIVE_AFTER_DAYS out of the cart table."""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'ARCHIVE_AFTER_DAYS', 180))
+    return archive_carts(cutoff, batch_size)
+
+
+@housekeeping_job(every=timedelta(days=1))
+def clear_sessions(batch_size):
+    """Expired admin/browsable-API sessions."""
+    return delete_in_batches(Session.objects.filter(expire_date__lt=timezone.now()), batch_size)
+
+
+@housekeeping_job(every=timedelta(days=1))
+def prune_tokens(batch_size):
+    """Expired refresh tokens (and their blacklist entries), when simplejwt's token_blacklist app is installed."""
+    if not apps.is_installed('rest_framework_simplejwt.token_blacklist'):
+        return iter(())
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+    return delete_in_batches(OutstandingToken.objects.filter(expires_at__lt=timezone.now()), batch_size)
+
+
+@housekeeping_job(every=timedelta(minutes=5))
+def refresh_print_queue(batch_size):
+    """Restamp the waiting print orders' estimates, which drift while the queue stands still."""
+    yield printqueue.refresh()
+
+
+@housekeeping_job(every=timedelta(days=1))
+def collect_media(batch_size):
+    """
+    Delete uploads nothing refers to any more: product images that were replaced, renditions of
+    images no product uses, and print files (with their previews and print jobs) of deleted or
+    cancelled print orders. Files younger than MEDIA_GC_GRACE_HOURS are left alone so in-flight
+    uploads are never touched.
+    """
+    referenced = set(Product.objects.exclude(image='').values_list('image', flat=True).iterator(chunk_size=5000))
+    referenced.update(
+        PrintOrderFile.objects.exclude(print_order__status='cancelled').values_list('file', flat=True).iterator(chunk_size=5000)
+    )
+    referenced.update(
+        PrintJob.objects.exclude(print_order__status='cancelled').exclude(file='').values_list('file', flat=True).iterator(chunk_size=5000)
+    )
+    for files in ArchivedPrintOrder.objects.exclude(status='cancelled').values_list('files', flat=True).iterator(chunk_size=1000):
+        referenced.update(upload['file'] for upload in files)
+    hashes = set(Product.objects.exclude(image_hash='').values_list('image_hash', flat=True).iterator(chunk_size=5000))
+    preview_hashes = set(
+        PrintOrderFile.objects.exclude(print_order__status='cancelled').exclude(preview_hash='')
+        .values_list('preview_hash', flat=True).iterator(chunk_size=5000)
+    )
+
+    def unreferenced(name):
+        if name.startswith(RENDITION_DIR + '/'):
+            return posixpath.basename(name).split('-', 1)[0] not in hashes
+        if name.startswith(PREVIEW_DIR + '/'):
+            return posixpath.basename(name).split('-', 1)[0] not in preview_hashes
+        return name not in referenced
+
+    grace_cutoff = timezone.now() - timedelta(hours=getattr(settings, 'MEDIA_GC_GRACE_HOURS', 24))
+    batch = []
+    for top in ('product_images', 'print_orders', 'print_jobs', RENDITION_DIR, PREVIEW_DIR):
+        for name in walk_storage(top):
+            if unreferenced(name) and default_storage.get_modified_time(name) < grace_cutoff:
+                batch.append(name)
+            if len(batch) >= batch_size:
+                yield delete_files(batch)
+                batch = []
+    if batch:
+        yield delete_files(batch)
+
+
+def walk_storage(path):
+    if not default_storage.exists(path):
+        return
+    directories, files = default_storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk_storage(posixpath.join(path, directory))
+
+
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+    return len(names)
+
+
+def due_jobs(names=None):
+    """Registered jobs (or just `names`) whose interval has passed since their last run."""
+    last_runs = dict(
+        JobCheckpoint.objects.filter(name__in=[checkpoint_name(name) for name in JOBS]).values_list('name', 'updated_at')
+    )
+    now = timezone.now()
+    return [
+        name for name, (_, every) in JOBS.items()
+        if (names is None or name in names)
+        and (checkpoint_name(name) not in last_runs or now - last_runs[checkpoint_name(name)] >= every)
+    ]
+
+
+def checkpoint_name(name):
+    return f'housekeeping:{name}'
+
+
+def run_job(name, batch_size=1000):
+    """Run one job to completion; returns (items handled, seconds taken)."""
+    func, _ = JOBS[name]
+    start = time.monotonic()
+    handled = batches = 0
+    for count in func(batch_size):
+        handled += count
+        batches += 1
+        logger.debug("housekeeping %s: batch %d, %d so far", name, batches, handled)
+    elapsed = time.monotonic() - start
+    JobCheckpoint.objects.update_or_create(name=checkpoint_name(name), defaults={'position': handled})
+    logger.info("housekeeping %s: %d handled in %d batches, %.2fs", name, handled, batches, elapsed)
+    return handled, elapsed
@@ -0,0 +1,103 @@
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+
+# Rendition name -> bounding width in pixels. Override with PRODUCT_IMAGE_RENDITIONS in settings.
+DEFAULT_RENDITIONS = {
+    'thumb': 160,
+    'card': 400,
+    'detail': 800,
+}
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+RENDITION_DIR = 'renditions'
+# Stored as Product.image_hash when the image couldn't be read, so saving the product again doesn't
+# retry it on every save; generate_renditions retries these.
+UNREADABLE = 'unreadable'
+
+
+def get_renditions():
+    return getattr(settings, 'PRODUCT_IMAGE_RENDITIONS', DEFAULT_RENDITIONS)
+
+
+def hash_file(field_file):
+    """SHA-1 of the stored file, read in chunks so large uploads are never fully in memory."""
+    digest = hashlib.sha1()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+def rendition_path(source_hash, width, ext):
+    """Renditions are content-addressed, so identical uploads share one set of files."""
+    return f"{RENDITION_DIR}/{source_hash[:2]}/{source_hash}-{width}.{ext}"
+
+
+def generate_renditions(field_file, force=False):
+    """
+    Write every configured size/format for an uploaded image and return its source hash.
+    Returns an empty string if the file is missing or is not a readable image.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError  # Pillow loads on first upload, not at boot
+
+    try:
+        source_hash = hash_file(field_file)
+        wanted = [
+            (width, ext)
+            for width in sorted(set(get_renditions().values()))
+            for ext in RENDITION_FORMATS
+            if force or not default_storage.exists(rendition_path(source_hash, width, ext))
+        ]
+        if not wanted:
+            return source_hash
+
+        field_file.open('rb')
+        try:
+            with Image.open(field_file) as img:
+                img = ImageOps.exif_transpose(img)
+                img.load()
+        finally:
+            field_file.close()
+    except (OSError, UnidentifiedImageError):
+        return ''
+
+    for width, ext in wanted:
+        fmt, options = RENDITION_FORMATS[ext]
+        resized = img.copy()
+        resized.thumbnail((width, width * 4))  # never upscales
+        if fmt == 'JPEG' and resized.mode not in ('RGB', 'L'):
+            resized = resized.convert('RGB')
+        buffer = BytesIO()
+        resized.save(buffer, fmt, **options)
+        path = rendition_path(source_hash, width, ext)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(buffer.getvalue()))
+    return source_hash
+
+
+def has_renditions(source_hash):
+    return bool(source_hash) and source_hash != UNREADABLE
+
+
+def rendition_urls(source_hash, request=None):
+    """Build {name: {format: url}} for a product image hash without touching the disk."""
+    if not has_renditions(source_hash):
+        return {}
+    urls = {}
+    for name, width in get_renditions().items():
+        urls[name] = {'width': width}
+        for ext in RENDITION_FORMATS:
+            url = default_storage.url(rendition_path(source_hash, width, ext))
+            urls[name][ext] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,164 @@
+"""
+Stock availability with soft reservations.
+
+An open cart line holds its quantity until `Cart.reserved_until` (CART_RESERVATION_MINUTES after
+the user last changed it); after that it simply stops counting, so nothing has to run for a
+reservation to expire. Available = Product.available_quantity (physical stock, decremented at
+checkout) minus the quantities held by unexpired open cart lines.
+
+Only the writes (add to cart, change quantity, checkout) lock the product row. Reads go through
+a per-product cache entry that those writes invalidate and that never outlives the earliest
+reservation it counted.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Min, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import bootstrap
+from .models import Cart, LowStockAlert, OrderItem, Product
+
+
+class InsufficientStock(Exception):
+    def __init__(self, available):
+        super().__init__(available)
+        self.available = available  # product_id -> quantity that could still be reserved
+
+
+def cache_key(product_id):
+    return f'stock:{product_id}'
+
+
+def invalidate(product_ids):
+    cache.delete_many([cache_key(product_id) for product_id in product_ids])
+
+
+def reservation_ttl():
+    return timedelta(minutes=getattr(settings, 'CART_RESERVATION_MINUTES', 15))
+
+
+def low_stock_threshold():
+    return getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
+
+
+def held_quantities(product_ids, exclude_user=None):
+    """product_id -> (quantity held by unexpired open cart lines, earliest expiry)."""
+    held = Cart.objects.filter(product_id__in=product_ids, is_checked_out=False, reserved_until__gt=timezone.now())
+    if exclude_user is not None:
+        held = held.exclude(user=exclude_user)
+    return {
+        row['product_id']: (row['held'], row['expires'])
+        for row in held.values('product_id').annotate(held=Sum('quantity'), expires=Min('reserved_until'))
+    }
+
+
+def availability(product_ids):
+    """product_id -> quantity that can still be added to a cart, for existing products."""
+    product_ids = set(product_ids)
+    found = cache.get_many([cache_key(product_id) for product_id in product_ids])
+    result = {int(key.split(':', 1)[1]): value for key, value in found.items()}
+    missing = product_ids - result.keys()
+    if missing:
+        now = timezone.now()
+        max_age = getattr(settings, 'STOCK_CACHE_SECONDS', 30)
+        held = held_quantities(missing)
+        for product_id, stock in Product.objects.filter(id__in=missing).values_list('id', 'available_quantity'):
+            quantity, expires = held.get(product_id, (0, None))
+            result[product_id] = available = max(0, stock - quantity)
+            timeout = max_age if expires is None else max(1, min(max_age, int((expires - now).total_seconds())))
+            cache.set(cache_key(product_id), available, timeout)
+    return result
+
+
+def lock_stock(product_ids):
+    """Lock the products' rows (in id order, so concurrent checkouts can't deadlock); returns id -> stock."""
+    return dict(
+        Product.objects.select_for_update().filter(id__in=product_ids).order_by('id').values_list('id', 'available_quantity')
+    )
+
+
+def hold(user, product, quantity, cart_item=None, add=False):
+    """
+    Set the user's open cart line for `product` to `quantity` and reserve it, raising
+    InsufficientStock if other users' reservations leave less than that. With add=True the
+    quantity is added to the line as it stands once the product is locked, so two adds racing
+    each other both count.
+    """
+    with transaction.atomic():
+        stock = lock_stock([product.pk])[product.pk]
+        if add:  # every cart write locks the product first, so this read can't be stale
+            cart_item = Cart.objects.filter(user=user, product=product, is_checked_out=False).first()
+            quantity += cart_item.quantity if cart_item else 0
+        others = held_quantities([product.pk], exclude_user=user).get(product.pk, (0, None))[0]
+        if quantity > stock - others:
+            raise InsufficientStock({product.pk: max(0, stock - others)})
+        if cart_item is None:
+            cart_item = Cart(user=user, product=product)
+        cart_item.quantity = quantity
+        cart_item.reserved_until = timezone.now() + reservation_ttl()
+        cart_item.save()
+    invalidate([product.pk])
+    return cart_item
+
+
+def release(cart_item):
+    cart_item.delete()
+    invalidate([cart_item.product_id])
+    bootstrap.invalidate_user(cart_item.user_id)
+
+
+def commit_stock(user, cart_items):
+    """
+    Take the cart's quantities out of stock at checkout. Call inside the checkout transaction;
+    raises InsufficientStock (before changing anything) if any line can't be fulfilled.
+    """
+    wanted = {}
+    for item in cart_items:
+        wanted[item.product_id] = wanted.get(item.product_id, 0) + item.quantity
+    stock = lock_stock(wanted)
+    held = held_quantities(wanted, exclude_user=user)
+    short = {
+        product_id: max(0, stock.get(product_id, 0) - held.get(product_id, (0, None))[0])
+        for product_id, quantity in wanted.items()
+        if quantity > stock.get(product_id, 0) - held.get(product_id, (0, None))[0]
+    }
+    if short:
+        raise InsufficientStock(short)
+    for product_id, quantity in wanted.items():
+        Product.objects.filter(id=product_id).update(available_quantity=F('available_quantity') - quantity)
+    transaction.on_commit(lambda: (invalidate(wanted), bootstrap.invalidate_carts_holding(wanted)))
+    threshold = low_stock_threshold()
+    for product_id, quantity in wanted.items():
+        remaining = stock[product_id] - quantity
+        if remaining <= threshold < stock[product_id]:
+            raise_alert(product_id, remaining)
+
+
+def raise_alert(product_id, stock):
+    try:
+        with transaction.atomic():  # the partial unique constraint keeps one open alert per product
+            LowStockAlert.objects.create(product_id=product_id, stock=stock)
+    except IntegrityError:
+        pass
+
+
+def restock_order(order_id, sign=1):
+    """Put a cancelled order's items back in stock (sign=-1 takes them out again if it is un-cancelled)."""
+    lines = list(OrderItem.objects.filter(order_id=order_id).values('product_id').annotate(quantity=Sum('quantity')))
+    for line in lines:
+        Product.objects.filter(id=line['product_id']).update(
+            available_quantity=Greatest(F('available_quantity') + sign * line['quantity'], 0)  # stock is unsigned
+        )
+    invalidate([line['product_id'] for line in lines])
+    bootstrap.invalidate_carts_holding([line['product_id'] for line in lines])
+
+
+def stock_changed(product):
+    """Staff edited the product: drop its cached availability and close its alert if it was restocked."""
+    invalidate([product.pk])
+    if product.available_quantity > low_stock_threshold():
+        LowStockAlert.objects.filter(product=product, resolved_at__isnull=True).update(resolved_at=timezone.now())
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.archive import archive_carts, archive_orders, archive_print_orders
+
+
+ARCHIVERS = {
+    'orders': archive_orders,
+    'print_orders': archive_print_orders,
+    'carts': archive_carts,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Move delivered/cancelled orders and print orders, and checked-out cart rows, older than "
+        "ARCHIVE_AFTER_DAYS into the archive tables. Safe to interrupt and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ARCHIVE_AFTER_DAYS', 180))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--only', choices=sorted(ARCHIVERS), action='append', help="Repeatable; defaults to all")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        for name in options['only'] or ARCHIVERS:
+            moved = 0
+            for count in ARCHIVERS[name](cutoff, options['batch_size']):
+                moved += count
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{name}: {moved} archived so far")
+            self.stdout.write(self.style.SUCCESS(f"Archived {moved} {name} older than {cutoff:%Y-%m-%d}."))
@@ -0,0 +1,62 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request database overhead with a fresh connection per request versus the "
+        "active settings profile (persistent connections or a pool). Run against a local Postgres, e.g. "
+        "DJANGO_SETTINGS_MODULE=grabpoint.settings_production python manage.py bench_db_connections"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--queries', type=int, default=1, help="Queries per simulated request")
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        configured_max_age = connection.settings_dict['CONN_MAX_AGE']
+        pooled = bool(connection.settings_dict['OPTIONS'].get('pool'))
+        self.stdout.write(
+            f"{connection.vendor} {connection.settings_dict['HOST'] or 'local'}: "
+            f"CONN_MAX_AGE={configured_max_age}, pool={'on' if pooled else 'off'}, "
+            f"health checks={'on' if connection.settings_dict['CONN_HEALTH_CHECKS'] else 'off'}"
+        )
+
+        results = {}
+        if not pooled:
+            # Pools hand out already-open connections regardless of CONN_MAX_AGE, so "fresh" only means something without one.
+            results['fresh connection per request'] = self.run(connection, options, max_age=0)
+        results['configured profile'] = self.run(connection, options, max_age=configured_max_age)
+        connection.settings_dict['CONN_MAX_AGE'] = configured_max_age
+
+        for label, timings in results.items():
+            timings.sort()
+            self.stdout.write(
+                f"{label:>30}: mean {statistics.mean(timings):7.3f} ms  "
+                f"p50 {timings[len(timings) // 2]:7.3f} ms  p95 {timings[int(len(timings) * 0.95)]:7.3f} ms"
+            )
+        if len(results) == 2:
+            fresh, configured = (statistics.mean(t) for t in results.values())
+            self.stdout.write(self.style.SUCCESS(f"Connection reuse saves {fresh - configured:.3f} ms per request."))
+
+    def run(self, connection, options, max_age):
+        """Simulate request_started/request_finished around a few trivial queries."""
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        timings = []
+        for _ in range(options['requests']):
+            start = time.perf_counter()
+            close_old_connections()
+            for _ in range(options['queries']):
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+            close_old_connections()
+            timings.append((time.perf_counter() - start) * 1000)
+        connection.close()
+        return timings
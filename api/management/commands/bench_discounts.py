@@ -0,0 +1,74 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from api.discounts import Line, Rule, RuleSet
+from api.models import Discount
+
+
+class Command(BaseCommand):
+    help = (
+        "Price a synthetic cart against a synthetic rule set (percent, amount and combo rules scoped "
+        "to products and categories, a few catalog-wide) and report the time per cart. Nothing "
+        "touches the database, so this measures the engine alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', type=int, default=500)
+        parser.add_argument('--lines', type=int, default=30)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=40)
+        parser.add_argument('--repeat', type=int, default=2000)
+        parser.add_argument('--category-share', type=float, default=0.28, help="Share of percent/amount rules scoped to a category")
+        parser.add_argument('--catalog-share', type=float, default=0.02, help="Share of percent/amount rules for everything")
+        parser.add_argument(
+            '--dense', action='store_true',
+            help="Many overlapping category rules and none catalog-wide: 300 rules, about 7 per category",
+        )
+
+    def handle(self, *args, **options):
+        if options['dense']:
+            options.update(rules=300, category_share=1.0, catalog_share=0.0)
+        rng = random.Random(42)
+        products, categories = options['products'], options['categories']
+        product_share = max(0.0, 1 - options['category_share'] - options['catalog_share'])
+        category_share = product_share + options['category_share']
+        kinds = [Discount.PERCENT, Discount.AMOUNT, Discount.COMBO]
+        rules = []
+        for pk in range(1, options['rules'] + 1):
+            kind = kinds[pk % 3]
+            value = {Discount.PERCENT: Decimal(rng.choice([5, 10, 15, 20])), Discount.AMOUNT: Decimal('5.00'), Discount.COMBO: Decimal('150.00')}[kind]
+            scope = rng.random()
+            rules.append(Rule(
+                pk, f"Rule {pk}", '', kind, value, 3 if kind == Discount.COMBO else rng.choice([1, 1, 2]),
+                # Combos are for named products; a few percent/amount rules cover a category or everything
+                product_ids=rng.sample(range(products), rng.randint(2, 6)) if kind == Discount.COMBO or scope < product_share else (),
+                category_ids=[rng.randrange(categories)] if kind != Discount.COMBO and product_share <= scope < category_share else (),
+                first_order_only=pk % 50 == 0,
+            ))
+        rule_set = RuleSet(rules)
+        lines = [
+            Line(i, rng.randrange(products), rng.randrange(categories), rng.randint(1, 4), Decimal(rng.randint(10, 120)))
+            for i in range(options['lines'])
+        ]
+
+        timings = []
+        for _ in range(options['repeat']):
+            for line in lines:
+                line.discount, line.rule = Decimal('0.00'), None
+            start = time.perf_counter()
+            applied = rule_set.price(lines, first_order=lambda: True)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        candidates = len(rule_set.candidates(lines))
+        self.stdout.write(
+            f"{len(rules)} rules, {len(lines)}-line cart: {candidates} candidate rules, {len(applied)} applied, "
+            f"{sum(line.discount for line in lines)} off {sum(line.subtotal for line in lines)}"
+        )
+        self.stdout.write(
+            f"median {statistics.median(timings):.3f} ms, p95 {timings[int(len(timings) * 0.95) - 1]:.3f} ms per cart"
+        )
@@ -0,0 +1,84 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+from api import hashing
+from api.hashing import HashingBusy, TunedArgon2PasswordHasher
+
+
+class Command(BaseCommand):
+    help = (
+        "Time one password check with each configured hasher and with candidate Argon2 parameters, "
+        "then push a burst of concurrent logins through the hashing pool. Aim for a check of "
+        "roughly 50-100 ms per core with the memory cost the server can afford per pool process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--argon2', action='append', default=[], metavar='TIME,MEMORY_KIB,PARALLELISM',
+            help="Extra Argon2 parameters to try, e.g. 3,65536,1. Repeatable.",
+        )
+        parser.add_argument('--logins', type=int, default=200, help="Concurrent logins for the pool burst (0 to skip)")
+        parser.add_argument('--workers', type=int, default=None, help="Pool size for the burst (default PASSWORD_HASHING_WORKERS)")
+
+    def handle(self, *args, **options):
+        for path in settings.PASSWORD_HASHERS:
+            label = path.rsplit('.', 1)[1]
+            try:
+                self.report(label, import_string(path)(), options['repeat'])
+            except ValueError as exc:  # the hasher's library isn't installed
+                self.stdout.write(f"{label:>40}: skipped ({exc})")
+
+        for spec in options['argon2']:
+            try:
+                time_cost, memory_cost, parallelism = (int(value) for value in spec.split(','))
+            except ValueError:
+                raise CommandError(f"--argon2 expects TIME,MEMORY_KIB,PARALLELISM, got {spec!r}")
+            with override_settings(PASSWORD_ARGON2={'time_cost': time_cost, 'memory_cost': memory_cost, 'parallelism': parallelism}):
+                self.report(f"Argon2 t={time_cost} m={memory_cost}KiB p={parallelism}", TunedArgon2PasswordHasher(), options['repeat'])
+
+        if options['logins']:
+            workers = options['workers'] if options['workers'] is not None else hashing.workers()
+            with override_settings(PASSWORD_HASHING_WORKERS=workers):
+                self.burst(options['logins'], workers)
+
+    def report(self, label, hasher, repeat):
+        encoded = hasher.encode('correct horse battery staple', hasher.salt())
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            hasher.verify('correct horse battery staple', encoded)
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(f"{label:>40}: {statistics.median(timings):7.1f} ms per check")
+
+    def burst(self, logins, workers):
+        encoded = get_hasher().encode('correct horse battery staple', get_hasher().salt())
+        hashing.verify_password('warm up', encoded)  # start the pool processes outside the timing
+
+        def login(_):
+            start = time.perf_counter()
+            try:
+                hashing.verify_password('correct horse battery staple', encoded)
+            except HashingBusy:
+                return None
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=64) as threads:
+            latencies = list(threads.map(login, range(logins)))
+        elapsed = time.perf_counter() - start
+        served = sorted(latency for latency in latencies if latency is not None)
+        rejected = len(latencies) - len(served)
+        p95 = served[int(len(served) * 0.95) - 1] * 1000 if served else 0
+        self.stdout.write(
+            f"{logins} concurrent logins, {workers or 'no'} pool workers: {elapsed:.2f}s, {len(served) / elapsed:.0f} checks/s, "
+            f"p95 {p95:.0f} ms, {rejected} rejected with 503"
+        )
+
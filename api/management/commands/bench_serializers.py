@@ -0,0 +1,102 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import FastCartSerializer, FastOrderSerializer, FastPrintOrderSerializer, FastProductSerializer
+from api.models import Cart, Category, CustomUser, Order, OrderAddress, OrderItem, PrintOrder, PrintOrderFile, Product
+from api.renderers import ORJSONRenderer
+from api.serializers import CartSerializer, OrderSerializer, PrintOrderSerializer, ProductSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ModelSerializer + JSONRenderer against the fast-path serializers + ORJSONRenderer "
+        "on synthetic list payloads, checking the rendered bytes are identical. Nothing is kept in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['rows'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rows, repeat):
+        user, category = self.seed(rows)
+        request = RequestFactory().get('/api/products/')
+        context = {'request': request}
+        cases = [
+            ('products', Product.objects.filter(category=category).order_by('name'), ProductSerializer, FastProductSerializer, context),
+            ('cart', Cart.objects.filter(user=user, is_checked_out=False), CartSerializer, FastCartSerializer, context),
+            ('orders', Order.objects.filter(user=user).order_by('-created_at'), OrderSerializer, FastOrderSerializer, {}),
+            ('print orders', PrintOrder.objects.filter(user=user), PrintOrderSerializer, FastPrintOrderSerializer, context),
+        ]
+        slow_renderer, fast_renderer = JSONRenderer(), ORJSONRenderer()
+
+        for label, queryset, slow_class, fast_class, ctx in cases:
+            slow = lambda: slow_renderer.render(slow_class(queryset.all(), many=True, context=ctx).data)
+            fast = lambda: fast_renderer.render(fast_class(queryset.all(), context=ctx).data)
+            if slow() != fast():
+                raise CommandError(f"{label}: fast-path output differs from {slow_class.__name__}")
+            slow_ms, fast_ms = self.best_of(slow, repeat), self.best_of(fast, repeat)
+            self.stdout.write(
+                f"{label:>13} x{queryset.count()}: {slow_ms:8.1f} ms -> {fast_ms:7.1f} ms  ({slow_ms / fast_ms:4.1f}x, identical bytes)"
+            )
+
+    def best_of(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+    def seed(self, rows):
+        user = CustomUser.objects.create_user(username='bench-serializers', email='bench@example.com', password=None)
+        category = Category.objects.create(name='Bench   Snacks')
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Bench product {i} é", short_description='Short "quoted"', full_description='Line\nbreak',
+                image=f'product_images/bench {i}.png' if i % 3 else '', image_hash=f'{i:040x}' if i % 2 else '',
+                price=Decimal('12.50') + i, sale_price=Decimal('9.99') if i % 4 == 0 else None,
+                available_quantity=i, category=category,
+            )
+            for i in range(rows)
+        )
+        Cart.objects.bulk_create(
+            Cart(user=user, product=p, quantity=2, total_price=(p.sale_price or p.price) * 2) for p in products
+        )
+        orders = Order.objects.bulk_create(
+            Order(user=user, total_price=Decimal('30.00'), transaction_id=f'UPI{i}' if i % 2 else None) for i in range(rows)
+        )
+        OrderAddress.objects.bulk_create(
+            OrderAddress(order=o, first_name='A', last_name='B', registration_no='R1', phone_number='1', email='a@b.c')
+            for o in orders
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=o, product=products[(i + k) % rows], quantity=k + 1, price=Decimal('10.00'))
+            for i, o in enumerate(orders) for k in range(3)
+        )
+        print_orders = PrintOrder.objects.bulk_create(
+            PrintOrder(user=user, paper_size='A4', color_mode='color', print_sides='double', binding_option='none',
+                       urgency='standard', total_price=Decimal('4.00'), additional_notes=None if i % 2 else 'Notes')
+            for i in range(rows)
+        )
+        PrintOrderFile.objects.bulk_create(
+            PrintOrderFile(print_order=po, file=f'print_orders/file {i}-{k}.pdf', page_count=3)
+            for i, po in enumerate(print_orders) for k in range(2)
+        )
+        return user, category
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.recommendations import rebuild, refresh
+
+
+class Command(BaseCommand):
+    help = (
+        "Update the precomputed 'frequently bought together' recommendations. By default only orders "
+        "placed since the last run are folded in; --full recounts everything (including archived orders) "
+        "and also drops pairs from orders cancelled after they were counted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--top-k', type=int, default=10)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        build = rebuild if options['full'] else refresh
+        pairs, products = build(options['top_k'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Counted {pairs} product pairs; re-ranked {products} products."))
@@ -0,0 +1,62 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from api.models import Order, PrintOrder, Rating
+
+
+# Flat column lists per export; relations are read through the join, never per row.
+EXPORTS = {
+    'orders': (
+        Order.objects.order_by('id'),
+        ['id', 'user__username', 'total_price', 'status', 'payment_status', 'transaction_id', 'created_at',
+         'order_address__registration_no', 'order_address__phone_number'],
+    ),
+    'print_orders': (
+        PrintOrder.objects.order_by('id'),
+        ['id', 'user__username', 'paper_size', 'color_mode', 'print_sides', 'binding_option', 'urgency',
+         'total_price', 'status', 'payment_status', 'transaction_id', 'created_at'],
+    ),
+    'ratings': (
+        Rating.objects.order_by('id'),
+        ['id', 'product_id', 'product__name', 'user__username', 'rating', 'title', 'description', 'created_at'],
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = "Stream orders, print orders or ratings to CSV/JSONL in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--output', '-o', help="File to write to (defaults to stdout)")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        queryset, columns = EXPORTS[options['dataset']]
+        rows = queryset.values_list(*columns).iterator(chunk_size=options['chunk_size'])
+
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        count = 0
+        try:
+            if options['format'] == 'csv':
+                writer = csv.writer(out)
+                writer.writerow(columns)
+                for row in rows:
+                    writer.writerow(row)
+                    count += 1
+            else:
+                encoder = DjangoJSONEncoder()
+                for row in rows:
+                    out.write(encoder.encode(dict(zip(columns, row))))
+                    out.write('\n')
+                    count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Exported {count} {options['dataset']} rows to {options['output']}"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from api.models import PrintOrderFile
+from api.previews import generate_previews
+from api.workers import process_pool
+
+
+class Command(BaseCommand):
+    help = "Backfill preview thumbnails for uploaded print files, in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Re-render previews that already exist")
+        parser.add_argument('--workers', type=int, default=2, help="Processes to render with (0 = in this process)")
+
+    def handle(self, *args, **options):
+        uploads = PrintOrderFile.objects.exclude(file='')
+        if not options['force']:
+            uploads = uploads.filter(preview_hash='')
+        file_ids = list(uploads.values_list('id', flat=True))
+        forces = [options['force']] * len(file_ids)
+
+        if options['workers']:
+            with process_pool(options['workers']) as pool:
+                results = list(pool.map(generate_previews, file_ids, forces, chunksize=8))
+        else:
+            results = [generate_previews(file_id, force) for file_id, force in zip(file_ids, forces)]
+
+        done = sum(result is not None for result in results)
+        self.stdout.write(self.style.SUCCESS(f"Rendered previews for {done} files ({len(file_ids) - done} skipped)."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api.images import UNREADABLE, generate_renditions
+from api.models import Product
+
+
+class Command(BaseCommand):
+    help = "Backfill resized image renditions for existing products, retrying images that couldn't be read before."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate renditions that already exist")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').only('id', 'image', 'image_hash')
+        if not options['force']:
+            products = products.filter(image_hash__in=['', UNREADABLE])
+
+        done = failed = 0
+        for product in products.iterator(chunk_size=options['chunk_size']):
+            source_hash = generate_renditions(product.image, force=options['force'])
+            if not source_hash:
+                failed += 1
+                self.stderr.write(f"Could not read image for product {product.id}: {product.image.name}")
+                if product.image_hash != UNREADABLE:
+                    Product.objects.filter(pk=product.pk).update(image_hash=UNREADABLE)
+                continue
+            if source_hash != product.image_hash:
+                Product.objects.filter(pk=product.pk).update(image_hash=source_hash)
+            done += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Generated renditions for {done} products ({failed} failed)."))
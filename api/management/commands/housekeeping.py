@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.housekeeping import JOBS, due_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the housekeeping jobs that are due (expire stale carts, archive checked-out carts, clear "
+        "sessions, prune expired tokens, collect unreferenced media). Run it from cron every few minutes, "
+        "or keep it running with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', choices=sorted(JOBS), action='append', help="Repeatable; defaults to all")
+        parser.add_argument('--force', action='store_true', help="Run the selected jobs even if they aren't due")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help="Keep running, checking for due jobs every --sleep seconds")
+        parser.add_argument('--sleep', type=int, default=60)
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_due(options)
+            if not options['loop']:
+                return
+            close_old_connections()  # don't hold a connection (or a stale one) while idle
+            time.sleep(options['sleep'])
+
+    def run_due(self, options):
+        names = options['job'] or sorted(JOBS)
+        for name in names if options['force'] else due_jobs(names):
+            handled, elapsed = run_job(name, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{name}: {handled} handled in {elapsed:.2f}s"))
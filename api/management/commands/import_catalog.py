@@ -0,0 +1,210 @@
+import csv
+import json
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.bootstrap import invalidate_carts_holding
+from api.models import Category, Product
+from api.suggest import bump_version
+
+
+PRODUCT_FIELDS = [
+    'short_description', 'full_description', 'image', 'price', 'available_quantity', 'sale_price', 'category', 'image_hash',
+]
+PRODUCT_ATTNAMES = [field if field != 'category' else 'category_id' for field in PRODUCT_FIELDS]
+MAX_PRICE = Decimal('99999999.99')  # DecimalField(max_digits=10, decimal_places=2)
+
+
+def read_rows(path, fmt):
+    """Yield (line number, row) for each row of a CSV or JSONL file without loading it all."""
+    with open(path, newline='', encoding='utf-8') as fh:
+        if fmt == 'csv':
+            reader = csv.DictReader(fh)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_no, line in enumerate(fh, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    raise CommandError(f"Invalid JSON at line {line_no} of {path}: {exc}")
+                yield line_no, row
+
+
+def parse_price(value, field):
+    try:
+        price = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"{field} {value!r} is not a number")
+    if not price.is_finite() or not 0 <= price <= MAX_PRICE:
+        raise ValueError(f"{field} {value!r} is out of range")
+    return price
+
+
+def clean_row(row):
+    """Check a row and parse its values, so a bad row fails before anything is written; raises ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError("expected an object")
+    cleaned = {}
+    for field in ('name', 'category'):
+        value = row.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{field} is missing")
+        cleaned[field] = value.strip()
+    for field in ('short_description', 'full_description', 'image'):
+        cleaned[field] = str(row.get(field) or '')
+    if row.get('price') in (None, ''):
+        raise ValueError("price is missing")
+    cleaned['price'] = parse_price(row['price'], 'price')
+    # A file without the column leaves stock and sale price alone (an empty cell still clears them)
+    if 'available_quantity' in row:
+        quantity = row['available_quantity']
+        try:
+            cleaned['available_quantity'] = int(quantity) if quantity not in (None, '') else 0
+        except (TypeError, ValueError):
+            raise ValueError(f"available_quantity {quantity!r} is not a whole number")
+        if cleaned['available_quantity'] < 0:
+            raise ValueError("available_quantity can't be negative")
+    if 'sale_price' in row:
+        sale_price = row['sale_price']
+        cleaned['sale_price'] = parse_price(sale_price, 'sale_price') if sale_price not in (None, '') else None
+    return cleaned
+
+
+def cleaned_rows(rows, path):
+    for line_no, row in rows:
+        try:
+            row = clean_row(row)
+        except ValueError as exc:
+            raise CommandError(f"Invalid row at line {line_no} of {path}: {exc}")
+        yield row
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Import categories and products from a CSV or JSONL file (upsert on name). Products are written "
+        "in bulk, which skips Product.save: run generate_renditions afterwards for new or changed images."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file to import")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--categories-only', action='store_true', help="Only create the categories listed in the file")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        batch_size = options['batch_size']
+
+        categories = dict(Category.objects.values_list('name', 'id'))  # name -> id, grows as we go
+        created = updated = unchanged = 0
+
+        for batch in batched(cleaned_rows(read_rows(path, fmt), path), batch_size):
+            with transaction.atomic():
+                self.ensure_categories(batch, categories)
+                if options['categories_only']:
+                    continue
+                c, u, n = self.upsert_products(batch, categories)
+            created += c
+            updated += u
+            unchanged += n
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{created + updated} products processed")
+
+        bump_version()  # bulk writes skip the signals that keep the suggest index current
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} new, updated {updated} and skipped {unchanged} unchanged products "
+            f"({len(categories)} categories)."
+        ))
+        missing = Product.objects.exclude(image='').filter(image_hash='').count()
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f"{missing} products have images without resized renditions: run `manage.py generate_renditions`."
+            ))
+
+    def ensure_categories(self, batch, categories):
+        """Bulk-create any category names in the batch that we have not seen yet."""
+        missing = {row['category'] for row in batch} - categories.keys()
+        if not missing:
+            return
+        Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+        categories.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    def upsert_products(self, batch, categories):
+        """Create new products and update existing ones matched by name, one query each."""
+        rows = {}
+        for row in batch:
+            rows[row['name']] = row  # last row wins for duplicate names in a batch
+
+        existing = {p.name: p for p in Product.objects.filter(name__in=rows.keys())}
+        to_create = []
+        changes = defaultdict(list)  # ((field, new value), ...) -> products needing exactly that change
+
+        for name, row in rows.items():
+            product = existing.get(name) or Product(name=name)
+            before = [getattr(product, attname) for attname in PRODUCT_ATTNAMES]
+            product.short_description = row['short_description'] or product.short_description or ''
+            product.full_description = row['full_description'] or product.full_description or ''
+            product.image = row['image'] or product.image or ''
+            if str(product.image) != str(before[PRODUCT_ATTNAMES.index('image')]):
+                product.image_hash = ''  # the renditions are of the old image; generate_renditions redoes them
+            product.price = row['price']
+            if 'available_quantity' in row or not product.pk:
+                product.available_quantity = row.get('available_quantity', 0)
+            if 'sale_price' in row:
+                product.sale_price = row['sale_price']
+            product.category_id = categories[row['category']]
+            if not product.pk:
+                to_create.append(product)
+                continue
+            changed = tuple(
+                (attname, str(value) if attname == 'image' else value)
+                for attname, old, value in zip(PRODUCT_ATTNAMES, before, (getattr(product, a) for a in PRODUCT_ATTNAMES))
+                if old != value
+            )
+            if changed:  # unchanged rows cost nothing on re-import
+                changes[changed].append(product)
+
+        Product.objects.bulk_create(to_create)
+        updated = self.apply_changes(changes)
+        changed_ids = [product.pk for products in changes.values() for product in products]
+        # Bulk writes skip the signals that drop cached carts showing the old price or stock
+        transaction.on_commit(lambda: invalidate_carts_holding(changed_ids))
+        return len(to_create), updated, len(rows) - len(to_create) - updated
+
+    def apply_changes(self, changes):
+        """
+        Products sharing the same change (a new price list, a restock) get a single
+        UPDATE ... WHERE id IN (...); one-off changes go through bulk_update on just
+        the columns that actually changed.
+        """
+        singles = defaultdict(list)
+        updated = 0
+        for changed, products in changes.items():
+            updated += len(products)
+            if len(products) > 1:
+                Product.objects.filter(pk__in=[p.pk for p in products]).update(**dict(changed))
+            else:
+                singles[tuple(attname for attname, _ in changed)].extend(products)
+        for attnames, products in singles.items():
+            fields = [PRODUCT_FIELDS[PRODUCT_ATTNAMES.index(attname)] for attname in attnames]
+            Product.objects.bulk_update(products, fields, batch_size=200)
+        return updated
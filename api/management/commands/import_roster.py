@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.roster import RosterFormatError, import_roster, verify_matches
+
+
+class Command(BaseCommand):
+    help = "Import a CSV student roster (registration number, email) and verify the accounts it lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="CSV file to import")
+        parser.add_argument('--verify-only', action='store_true', help="Just verify accounts matching the existing roster")
+
+    def handle(self, *args, **options):
+        if options['verify_only']:
+            self.stdout.write(self.style.SUCCESS(f"Verified {verify_matches()} accounts."))
+            return
+        if not options['path']:
+            raise CommandError("Give the roster CSV to import (or --verify-only).")
+        try:
+            with open(options['path'], 'rb') as fh:
+                roster = import_roster(fh, options['path'].rsplit('/', 1)[-1])
+        except (OSError, RosterFormatError) as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {roster.entry_count} roster entries; verified {roster.verified_count} accounts."
+        ))
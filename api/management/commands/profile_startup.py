@@ -0,0 +1,104 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Runs in a fresh interpreter, like a newly started worker: set Django up, then serve one request.
+PROBE = """
+import json, sys, time
+from io import BytesIO
+start = time.perf_counter()
+import django
+django.setup()
+from django.core.handlers.wsgi import WSGIHandler
+handler = WSGIHandler()
+setup = time.perf_counter()
+status = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '', 'SERVER_NAME': sys.argv[2],
+    'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': sys.argv[2], 'wsgi.url_scheme': 'http',
+    'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': True,
+    'wsgi.run_once': False, 'wsgi.version': (1, 0),
+}
+response = handler(environ, lambda code, headers, *args: status.append(code))
+b''.join(response)
+response.close()
+done = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (setup - start) * 1000, 'first_request_ms': (done - start) * 1000, 'status': status[0],
+    'heavy': [name for name in sys.argv[3:] if name in sys.modules],
+}))
+"""
+# Libraries only some requests need; they should not be loaded by booting and serving a plain request.
+LAZY_MODULES = ('PIL.Image', 'pypdf', 'pypdfium2', 'django_filters')
+
+
+class Command(BaseCommand):
+    help = (
+        "Boot Django in fresh processes and time setup and the first request, then break the import "
+        "time down by package and module (python -X importtime). Fails when the median time to the "
+        "first request is over the budget (--budget or STARTUP_BUDGET_MS), so CI can track boot time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/categories/', help="Request to serve after setup")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help="Rows in each import breakdown (0 to skip it)")
+        parser.add_argument('--budget', type=float, default=None, help="Milliseconds to the first request")
+
+    def handle(self, *args, **options):
+        runs = [self.run_probe(options['path'])[0] for _ in range(max(options['repeat'], 1))]
+        setup = statistics.median(run['setup_ms'] for run in runs)
+        first_request = statistics.median(run['first_request_ms'] for run in runs)
+        self.stdout.write(
+            f"{len(runs)} runs, median: setup {setup:.0f} ms, first request {first_request:.0f} ms "
+            f"(GET {options['path']} -> {runs[0]['status']})"
+        )
+        if runs[0]['heavy']:
+            self.stdout.write(self.style.WARNING(f"Loaded at boot but only needed on first use: {', '.join(runs[0]['heavy'])}"))
+
+        if options['top']:
+            self.breakdown(options['path'], options['top'])
+
+        budget = options['budget'] if options['budget'] is not None else getattr(settings, 'STARTUP_BUDGET_MS', None)
+        if budget:
+            if first_request > budget:
+                raise CommandError(f"First request after {first_request:.0f} ms, over the {budget:.0f} ms budget")
+            self.stdout.write(self.style.SUCCESS(f"Within the {budget:.0f} ms budget"))
+
+    def run_probe(self, path, *flags):
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        result = subprocess.run(
+            [sys.executable, *flags, '-c', PROBE, path, host, *LAZY_MODULES],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy(),
+        )
+        if result.returncode:
+            raise CommandError(f"The startup probe failed:\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+    def breakdown(self, path, top):
+        _, stderr = self.run_probe(path, '-X', 'importtime')
+        modules = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+        by_package = defaultdict(int)
+        for name, self_us, _ in modules:
+            by_package[name.split('.')[0]] += self_us
+        total = sum(by_package.values())
+        self.stdout.write(f"\nImports: {len(modules)} modules, {total / 1000:.0f} ms (inflated by -X importtime)")
+        self.stdout.write("\nBy package (own time of its modules):")
+        for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"{us / 1000:9.1f} ms  {package}")
+        self.stdout.write("\nSlowest modules (including what they import):")
+        for name, _, cumulative_us in sorted(modules, key=lambda module: -module[2])[:top]:
+            self.stdout.write(f"{cumulative_us / 1000:9.1f} ms  {name}")
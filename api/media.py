@@ -0,0 +1,139 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+
+from .images import RENDITION_DIR
+from .previews import PREVIEW_DIR
+
+
+# Only visible to the owner (uploads and their previews) and staff
+PRIVATE_PREFIXES = ('print_orders/', 'print_jobs/', PREVIEW_DIR + '/')
+IMMUTABLE_PREFIXES = (RENDITION_DIR + '/',)  # Content-addressed, the URL changes when the content does
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+PUBLIC_CACHE = 'public, max-age=86400'
+PRIVATE_CACHE = 'private, no-cache'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def is_private(path):
+    return path.startswith(PRIVATE_PREFIXES)
+
+
+def is_preview(path):
+    return path.startswith(PREVIEW_DIR + '/')
+
+
+def resolve_media_path(path):
+    """Absolute filesystem path for a MEDIA_URL-relative path, refusing anything outside MEDIA_ROOT."""
+    return safe_join(settings.MEDIA_ROOT, path)
+
+
+def media_name(full_path):
+    """The storage name of a resolved media file, with `.` and `..` segments gone, as access checks must see it."""
+    return os.path.relpath(full_path, os.path.abspath(settings.MEDIA_ROOT)).replace(os.sep, '/')
+
+
+def cache_control_for(path):
+    if is_private(path):
+        return PRIVATE_CACHE
+    if path.startswith(IMMUTABLE_PREFIXES):
+        return IMMUTABLE_CACHE
+    return PUBLIC_CACHE
+
+
+def make_etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """Return (start, end) inclusive for a single `bytes=` range, None to send everything, or False if unsatisfiable."""
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None  # multi-range and malformed headers get the whole file, as RFC 9110 allows
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def read_range(fh, start, length):
+    try:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def sendfile_response(path, full_path, content_type):
+    """Let the front-end server stream the file; Python only sets headers."""
+    backend = getattr(settings, 'MEDIA_SENDFILE_BACKEND', None)
+    response = HttpResponse(content_type=content_type)
+    if backend == 'nginx':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + path
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def serve_file(request, path, full_path):
+    """
+    Serve a media file with ETag/Last-Modified revalidation and single byte-range support.
+    Whole files go through FileResponse so the WSGI server can use sendfile(); only partial
+    responses are copied in Python.
+    """
+    stat = os.stat(full_path)
+    etag = make_etag(stat)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    elif getattr(settings, 'MEDIA_SENDFILE_BACKEND', None):
+        response = sendfile_response(path, full_path, content_type)
+    else:
+        byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+        if request.headers.get('If-Range') not in (None, etag):
+            byte_range = None  # the client's partial copy is stale
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif byte_range:
+            start, end = byte_range
+            response = FileResponse(
+                read_range(open(full_path, 'rb'), start, end - start + 1),
+                status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control_for(path)
+    return response
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['is_checked_out', 'updated_at'], name='cart_checked_out_updated'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def claim_existing_payments(apps, schema_editor):
+    """Claim the transaction IDs already on orders; where one was reused, the earliest order keeps it."""
+    PaymentClaim = apps.get_model('api', 'PaymentClaim')
+    for model_name, field in (('Order', 'order'), ('PrintOrder', 'print_order')):
+        rows = (
+            apps.get_model('api', model_name).objects.filter(payment_status='upi').exclude(transaction_id__isnull=True)
+            .exclude(transaction_id='').order_by('id').values_list('id', 'transaction_id', 'total_price', 'created_at')
+        )
+        batch = []
+        for pk, transaction_id, total_price, created_at in rows.iterator(chunk_size=2000):
+            batch.append(PaymentClaim(
+                method='upi', transaction_id=transaction_id.strip(), amount=total_price, created_at=created_at, **{f'{field}_id': pk},
+            ))
+            if len(batch) == 2000:
+                PaymentClaim.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        PaymentClaim.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_inventory'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='transaction_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='printorder',
+            name='transaction_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.CreateModel(
+            name='PaymentClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=20)),
+                ('transaction_id', models.CharField(max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment_claim', to='api.order')),
+                ('print_order', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment_claim', to='api.printorder')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PaymentStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('method', models.CharField(default='upi', max_length=20)),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('uploaded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_no', models.PositiveIntegerField()),
+                ('transaction_id', models.CharField(db_index=True, max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('expected_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('status', models.CharField(choices=[('matched', 'Matched'), ('amount_mismatch', 'Amount mismatch'), ('unknown', 'Unknown transaction'), ('duplicate', 'Duplicate')], default='unknown', max_length=20)),
+                ('claim', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statement_lines', to='api.paymentclaim')),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='api.paymentstatement')),
+            ],
+            options={
+                'ordering': ['statement', 'line_no'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='paymentclaim',
+            constraint=models.UniqueConstraint(fields=('method', 'transaction_id'), name='unique_payment_claim'),
+        ),
+        migrations.AddIndex(
+            model_name='statementline',
+            index=models.Index(fields=['statement', 'status'], name='statement_line_status'),
+        ),
+        migrations.RunPython(claim_existing_payments, migrations.RunPython.noop),
+    ]
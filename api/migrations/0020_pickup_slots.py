@@ -0,0 +1,60 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_student_roster'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PickupSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('capacity', models.PositiveIntegerField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['date', 'start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PickupWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('capacity', models.PositiveIntegerField()),
+                ('weekdays', models.CharField(default='0123456', help_text='Days it is offered, 0 = Monday ... 6 = Sunday', max_length=7)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['start_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='pickup_slot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='api.pickupslot'),
+        ),
+        migrations.AddField(
+            model_name='pickupslot',
+            name='window',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='slots', to='api.pickupwindow'),
+        ),
+        migrations.AddIndex(
+            model_name='pickupslot',
+            index=models.Index(fields=['date', 'start_time'], name='pickup_slot_date_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='pickupslot',
+            constraint=models.UniqueConstraint(fields=('window', 'date'), name='unique_pickup_slot'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_pickup_slots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='printorderfile',
+            name='preview_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='printorderfile',
+            name='preview_pages',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_print_previews'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='printorder',
+            name='pages_per_sheet',
+            field=models.PositiveSmallIntegerField(choices=[(1, '1'), (2, '2'), (4, '4')], default=1),
+        ),
+        migrations.CreateModel(
+            name='PrintJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(blank=True, upload_to='print_jobs/')),
+                ('source_key', models.CharField(blank=True, max_length=40)),
+                ('sides', models.PositiveIntegerField(default=0)),
+                ('sheets', models.PositiveIntegerField(default=0)),
+                ('prepared_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('print_order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='print_job', to='api.printorder')),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:07
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_ratings(apps, schema_editor):
+    """Keep each user's latest rating of a product, as if the later ones had updated the first."""
+    Rating = apps.get_model('api', 'Rating')
+    duplicated = (
+        Rating.objects.order_by().values('user_id', 'product_id')
+        .annotate(n=Count('id'), keep=Max('id')).filter(n__gt=1)
+    )
+    for row in duplicated.iterator():
+        Rating.objects.filter(user_id=row['user_id'], product_id=row['product_id']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_print_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_ratings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['product', '-created_at'], name='rating_product_created'),
+        ),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_user_product_rating'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_unique_ratings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='Discount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('code', models.CharField(blank=True, help_text='Coupon code; leave empty to apply automatically', max_length=40)),
+                ('kind', models.CharField(choices=[('percent', 'Percent off'), ('amount', 'Amount off each unit'), ('combo', 'Combo price for every group of units')], default='percent', max_length=10)),
+                ('value', models.DecimalField(decimal_places=2, help_text="Percent, amount off, or the combo's price", max_digits=10)),
+                ('min_quantity', models.PositiveIntegerField(default=1, help_text='Matching units needed (the group size for combos)')),
+                ('first_order_only', models.BooleanField(default=False)),
+                ('starts_at', models.DateTimeField(blank=True, null=True)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('categories', models.ManyToManyField(blank=True, related_name='discounts', to='api.category')),
+                ('products', models.ManyToManyField(blank=True, related_name='discounts', to='api.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('code', ''), _negated=True), fields=('code',), name='unique_discount_code')],
+            },
+        ),
+    ]
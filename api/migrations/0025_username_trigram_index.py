@@ -0,0 +1,37 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# The admin's order search runs UPPER(username::text) LIKE UPPER('%term%') on Postgres; a trigram
+# index over that expression serves it without scanning every user. Other databases skip this.
+CREATE_INDEX = (
+    "CREATE INDEX IF NOT EXISTS api_customuser_username_trgm "
+    "ON api_customuser USING gin ((UPPER(username::text)) gin_trgm_ops)"
+)
+DROP_INDEX = "DROP INDEX IF EXISTS api_customuser_username_trgm"
+
+
+def run_on_postgres(sql):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return operation
+
+
+class PostgresTrigramExtension(TrigramExtension):
+    # TrigramExtension skips other databases going forwards but not backwards (it queries pg_extension)
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_discounts'),
+    ]
+
+    operations = [
+        PostgresTrigramExtension(),
+        migrations.RunPython(run_on_postgres(CREATE_INDEX), run_on_postgres(DROP_INDEX)),
+    ]
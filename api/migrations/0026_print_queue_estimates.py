@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_username_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='printorder',
+            name='estimated_ready_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='printorder',
+            name='queue_position',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='printorder',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'confirmed'])), fields=['created_at'], name='print_order_waiting'),
+        ),
+        migrations.AddIndex(
+            model_name='printorder',
+            index=models.Index(condition=models.Q(('queue_position__isnull', False)), fields=['queue_position'], name='print_order_queued'),
+        ),
+    ]
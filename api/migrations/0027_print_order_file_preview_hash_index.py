@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_print_queue_estimates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='printorderfile',
+            name='preview_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=40),
+        ),
+    ]
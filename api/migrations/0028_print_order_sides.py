@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_print_order_file_preview_hash_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='printorder',
+            name='sides',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_product_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='discount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='pickup_slot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
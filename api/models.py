@@ -2,6 +2,12 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .images import UNREADABLE, generate_renditions
+from .printing import count_pages
+from .previews import schedule_previews
 
 
 class CustomUser(AbstractUser):
@@ -24,7 +30,7 @@ class Category(models.Model):
         return self.name
 
 class Product(models.Model):
-    name = models.CharField(max_length=255)  # Product name
+    name = models.CharField(max_length=255, db_index=True)  # Product name; import_catalog matches rows on it
     short_description = models.CharField(max_length=255)  # Short description
     full_description = models.TextField()  # Full description
     image = models.ImageField(upload_to='product_images/')  # Product image
@@ -32,7 +38,16 @@ class Product(models.Model):
     available_quantity = models.PositiveIntegerField()  # Available quantity
     sale_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # Sale price (optional)
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)  # Category
-    
+    image_hash = models.CharField(max_length=40, blank=True, editable=False)  # Source hash of the resized renditions
+
+    def save(self, *args, **kwargs):
+        """Generate resized renditions whenever a new image is uploaded (once per image, even if unreadable)."""
+        new_upload = bool(self.image) and not self.image._committed
+        super().save(*args, **kwargs)
+        if new_upload or (self.image and not self.image_hash):
+            self.image_hash = generate_renditions(self.image) or UNREADABLE
+            Product.objects.filter(pk=self.pk).update(image_hash=self.image_hash)
+
     def __str__(self):
         return self.name
 
@@ -41,10 +56,11 @@ class Cart(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='carts')  # Owner of the cart
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='carts')  # Product added
     quantity = models.PositiveIntegerField(default=1)  # Number of items in the cart
-    total_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # Auto-calculated total price
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # Auto-calculated, before discounts
     is_checked_out = models.BooleanField(default=False)  # Status of cart (checked out or not)
     created_at = models.DateTimeField(auto_now_add=True)  # Timestamp when cart item was added
     updated_at = models.DateTimeField(auto_now=True)  # Timestamp when cart was updated
+    reserved_until = models.DateTimeField(blank=True, null=True)  # Stock is held for this line until then (api.inventory)
 
     def save(self, *args, **kwargs):
         """Auto-calculate total price before saving."""
@@ -53,6 +69,10 @@ class Cart(models.Model):
             self.total_price = self.quantity * (self.product.sale_price if self.product.sale_price else self.product.price)
         super().save(*args, **kwargs)
 
+    class Meta:
+        # Housekeeping expires stale open carts and archives old checked-out ones by these two columns.
+        indexes = [models.Index(fields=['is_checked_out', 'updated_at'], name='cart_checked_out_updated')]
+
     def __str__(self):
         return f"Cart {self.id} - {self.user.username} - {self.product.name}"
 
@@ -84,10 +104,12 @@ class Order(models.Model):
     
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='orders')
     total_price = models.DecimalField(max_digits=10, decimal_places=2)  # Total order cost
-    created_at = models.DateTimeField(auto_now_add=True)  # Order creation time
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Order creation time
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     payment_status = models.CharField(max_length=20, choices=PAYMENT_CHOICES, default='cod')
-    transaction_id = models.CharField(max_length=100, blank=True, null=True)  # New field
+    transaction_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)  # New field
+    pickup_slot = models.ForeignKey('PickupSlot', on_delete=models.SET_NULL, blank=True, null=True, related_name='orders')
+    discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # Taken off total_price's lines at checkout
 
     def __str__(self):
         return f"Order {self.id} - {self.user.username} - {self.status}"
@@ -111,13 +133,36 @@ class PrintOrder(models.Model):
     urgency = models.CharField(max_length=10, choices=[("standard", "Standard"), ("express", "Express")])
     additional_notes = models.TextField(blank=True, null=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     status = models.CharField(max_length=20, choices=[
         ("pending", "Pending"), ("confirmed", "Confirmed"),("printed", "Printed"),
         ("delivered", "Delivered"), ("cancelled", "Cancelled")
     ], default="pending")
     payment_status = models.CharField(max_length=20, choices=[("cod", "Cash on Delivery"), ("upi", "UPI Payment")], default="cod")
-    transaction_id = models.CharField(max_length=100, blank=True, null=True)  # New field
+    transaction_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)  # New field
+    pages_per_sheet = models.PositiveSmallIntegerField(choices=[(1, "1"), (2, "2"), (4, "4")], default=1)  # n-up
+    # Kept current by api.printqueue while the order waits to be printed, empty afterwards
+    sides = models.PositiveIntegerField(default=1, editable=False)  # Printed sides, from the files' page counts
+    queue_position = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    estimated_ready_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    class Meta:
+        # Partial indexes over the few queued rows, so walking the queue never touches the history
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(status__in=['pending', 'confirmed']), name='print_order_waiting'),
+            models.Index(fields=['queue_position'], condition=models.Q(queue_position__isnull=False), name='print_order_queued'),
+        ]
+
+    QUEUE_FIELDS = ('sides', 'queue_position', 'estimated_ready_at')
+
+    def save(self, *args, **kwargs):
+        """Saving an order never writes the queue fields: api.printqueue updates them, and this copy may be stale."""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.QUEUE_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Print Order {self.id} - {self.user.username}"
@@ -125,6 +170,18 @@ class PrintOrder(models.Model):
 class PrintOrderFile(models.Model):
     print_order = models.ForeignKey(PrintOrder, on_delete=models.CASCADE, related_name="files")
     file = models.FileField(upload_to="print_orders/")  # Stores each file separately
+    page_count = models.PositiveIntegerField(default=0)  # Counted once on upload
+    preview_hash = models.CharField(max_length=40, blank=True, editable=False, db_index=True)  # Source hash of the preview images
+    preview_pages = models.PositiveSmallIntegerField(default=0, editable=False)  # How many pages have a preview
+
+    def save(self, *args, **kwargs):
+        """Count pages once the upload is stored so reports never have to open the file, and queue its previews."""
+        super().save(*args, **kwargs)
+        if not self.page_count and self.file:
+            self.page_count = count_pages(self.file)
+            PrintOrderFile.objects.filter(pk=self.pk).update(page_count=self.page_count)
+        if not self.preview_hash and self.file:
+            schedule_previews([self.pk])
 
     def __str__(self):
         return f"File for Order {self.print_order.id}"
@@ -146,10 +203,345 @@ class Rating(models.Model):
     description = models.TextField(blank=True, null=True)  # Optional review
     created_at = models.DateTimeField(auto_now_add=True)  # Timestamp
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'product'], name='unique_user_product_rating')]  # Rating again updates it
+        indexes = [models.Index(fields=['product', '-created_at'], name='rating_product_created')]
+
     def save(self, *args, **kwargs):
         """Auto-assign title based on rating value."""
         self.title = dict(self.RATING_CHOICES).get(self.rating, 'Unknown')
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'rating' in update_fields:  # e.g. update_or_create when rating again
+            kwargs['update_fields'] = {*update_fields, 'title'}
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.product.name} - {self.user.username} ({self.rating})"
\ No newline at end of file
+        return f"{self.product.name} - {self.user.username} ({self.rating})"
+
+
+# Reporting rollups, maintained incrementally by api.reporting. Staff dashboards read only these.
+
+class ProductDailySales(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)  # Units sold, net of cancellations
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)  # Orders containing the product
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'product'], name='unique_product_daily_sales')]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day}: {self.quantity}"
+
+
+class OrderStatusHourly(models.Model):
+    hour = models.DateTimeField()  # Start of the hour
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    count = models.IntegerField(default=0)  # Orders that entered `status` during the hour
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['hour', 'status'], name='unique_order_status_hourly')]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.status}: {self.count}"
+
+
+class PrintDailyVolume(models.Model):
+    day = models.DateField(unique=True)
+    jobs = models.IntegerField(default=0)  # Print orders marked as printed
+    pages = models.IntegerField(default=0)  # Pages in those orders' files
+
+    def __str__(self):
+        return f"{self.day}: {self.pages} pages"
+
+
+# Archive tables for history moved out of the hot tables by api.archive. Rows keep their
+# original ids; related rows (items, address, files) are folded into JSON snapshots.
+
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # Same id as the original Order
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_orders')
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_CHOICES)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    items = models.JSONField(default=list)  # [{"product_id", "product", "quantity", "price"}]
+    order_address = models.JSONField(null=True, blank=True)
+    pickup_slot = models.JSONField(null=True, blank=True)  # {"id", "date", "start_time", "end_time"}; slots don't last
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at'], name='archived_order_user_created')]
+
+    def __str__(self):
+        return f"Archived order {self.id} - {self.status}"
+
+
+class ArchivedPrintOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # Same id as the original PrintOrder
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_print_orders')
+    paper_size = models.CharField(max_length=10)
+    color_mode = models.CharField(max_length=12)
+    print_sides = models.CharField(max_length=10)
+    binding_option = models.CharField(max_length=10)
+    urgency = models.CharField(max_length=10)
+    additional_notes = models.TextField(blank=True, null=True)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    payment_status = models.CharField(max_length=20)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    files = models.JSONField(default=list)  # [{"id", "file", "page_count"}]
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at'], name='archived_print_user_created')]
+
+    def __str__(self):
+        return f"Archived print order {self.id} - {self.status}"
+
+
+class ArchivedCart(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # Same id as the original checked-out Cart row
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_carts')
+    product_id = models.BigIntegerField()  # Plain id: products may be deleted later
+    quantity = models.PositiveIntegerField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived cart {self.id}"
+
+
+class JobCheckpoint(models.Model):
+    """Where a background job got to (e.g. the last OrderItem id it processed) and when it last ran."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class ProductCooccurrence(models.Model):
+    """Number of orders containing both products. Stored in both directions."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['product', 'other'], name='unique_product_cooccurrence')]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.count}"
+
+
+class ProductRecommendation(models.Model):
+    """Top-K "frequently bought together" neighbours, rebuilt by build_recommendations."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()  # 1 = most often bought together
+    score = models.PositiveIntegerField()  # Co-occurrence count
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [models.UniqueConstraint(fields=['product', 'rank'], name='unique_product_recommendation_rank')]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} (#{self.rank})"
+
+
+class LowStockAlert(models.Model):
+    """Raised when checkout takes a product's stock down to LOW_STOCK_THRESHOLD; one open alert per product."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='low_stock_alerts')
+    stock = models.IntegerField()  # available_quantity when the alert was raised
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(blank=True, null=True)  # Set when restocked or dismissed by staff
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['product'], condition=models.Q(resolved_at__isnull=True), name='one_open_low_stock_alert'),
+        ]
+
+    def __str__(self):
+        return f"Low stock: {self.product_id} ({self.stock} left)"
+
+
+class PaymentClaim(models.Model):
+    """
+    A transaction ID a customer paid with. Unique per payment method across orders and print
+    orders (and kept when they are archived), so one UPI payment can't be claimed twice.
+    """
+    method = models.CharField(max_length=20)  # Order/PrintOrder payment_status, e.g. 'upi'
+    transaction_id = models.CharField(max_length=100)
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, blank=True, null=True, related_name='payment_claim')
+    print_order = models.OneToOneField(PrintOrder, on_delete=models.SET_NULL, blank=True, null=True, related_name='payment_claim')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    verified_at = models.DateTimeField(blank=True, null=True)  # Set when a statement line matched it
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['method', 'transaction_id'], name='unique_payment_claim')]
+
+    def __str__(self):
+        return f"{self.method} {self.transaction_id}"
+
+
+class PaymentStatement(models.Model):
+    """A bank/UPI statement file imported for reconciliation."""
+    name = models.CharField(max_length=255)
+    method = models.CharField(max_length=20, default='upi')
+    uploaded_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+    line_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.uploaded_at:%Y-%m-%d})"
+
+
+class StatementLine(models.Model):
+    STATUS_CHOICES = [
+        ('matched', 'Matched'),
+        ('amount_mismatch', 'Amount mismatch'),
+        ('unknown', 'Unknown transaction'),
+        ('duplicate', 'Duplicate'),  # Repeated in the statement, or already matched by an earlier one
+    ]
+    statement = models.ForeignKey(PaymentStatement, on_delete=models.CASCADE, related_name='lines')
+    line_no = models.PositiveIntegerField()
+    transaction_id = models.CharField(max_length=100, db_index=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    paid_at = models.DateTimeField(blank=True, null=True)
+    claim = models.ForeignKey(PaymentClaim, on_delete=models.SET_NULL, blank=True, null=True, related_name='statement_lines')
+    expected_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # The claim's amount
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='unknown')
+
+    class Meta:
+        ordering = ['statement', 'line_no']
+        indexes = [models.Index(fields=['statement', 'status'], name='statement_line_status')]
+
+    def __str__(self):
+        return f"{self.transaction_id}: {self.status}"
+
+
+class Roster(models.Model):
+    """A list of enrolled students imported at term start; registrations on it are verified automatically."""
+    name = models.CharField(max_length=255)
+    uploaded_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+    entry_count = models.PositiveIntegerField(default=0)
+    verified_count = models.PositiveIntegerField(default=0)  # Existing accounts the import verified
+
+    def __str__(self):
+        return f"{self.name} ({self.uploaded_at:%Y-%m-%d})"
+
+
+class RosterEntry(models.Model):
+    """One enrolled student. Registration numbers are stored upper-case and emails lower-case."""
+    roster = models.ForeignKey(Roster, on_delete=models.CASCADE, related_name='entries')  # The latest roster listing them
+    registration_number = models.CharField(max_length=50, unique=True)
+    email = models.EmailField(blank=True, db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'roster entries'
+
+    def __str__(self):
+        return self.registration_number
+
+
+class PickupWindow(models.Model):
+    """A daily pickup window staff offer at the counter, e.g. 12:30-12:45 for 20 orders."""
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    capacity = models.PositiveIntegerField()
+    weekdays = models.CharField(max_length=7, default='0123456', help_text="Days it is offered, 0 = Monday ... 6 = Sunday")
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['start_time']
+
+    def __str__(self):
+        return f"{self.start_time:%H:%M}-{self.end_time:%H:%M} ({self.capacity})"
+
+
+class PickupSlot(models.Model):
+    """
+    A window on a given day. Times and capacity are copied from the window when the slot is
+    created, so editing a window only affects days nobody has looked at yet.
+    """
+    window = models.ForeignKey(PickupWindow, on_delete=models.SET_NULL, blank=True, null=True, related_name='slots')
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    capacity = models.PositiveIntegerField()
+    booked = models.PositiveIntegerField(default=0)  # Maintained by api.pickup, never counted from orders
+
+    class Meta:
+        ordering = ['date', 'start_time']
+        constraints = [models.UniqueConstraint(fields=['window', 'date'], name='unique_pickup_slot')]
+        indexes = [models.Index(fields=['date', 'start_time'], name='pickup_slot_date_start')]
+
+    def __str__(self):
+        return f"{self.date} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class PrintJob(models.Model):
+    """The print-ready PDF of a print order: cover sheet plus all its files, imposed and padded."""
+    print_order = models.OneToOneField(PrintOrder, on_delete=models.CASCADE, related_name='print_job')
+    file = models.FileField(upload_to='print_jobs/', blank=True)
+    source_key = models.CharField(max_length=40, blank=True)  # Hash of the files and options it was built from
+    sides = models.PositiveIntegerField(default=0)  # Printed sides, blank padding included
+    sheets = models.PositiveIntegerField(default=0)  # Sheets of paper
+    prepared_at = models.DateTimeField(blank=True, null=True)
+    error = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f"Print job for order {self.print_order_id}"
+
+
+class Discount(models.Model):
+    """A pricing rule applied to open carts and at checkout (see api.discounts)."""
+    PERCENT = 'percent'
+    AMOUNT = 'amount'
+    COMBO = 'combo'
+    KIND_CHOICES = [
+        (PERCENT, 'Percent off'),
+        (AMOUNT, 'Amount off each unit'),
+        (COMBO, 'Combo price for every group of units'),
+    ]
+
+    name = models.CharField(max_length=255)  # Shown to the customer
+    code = models.CharField(max_length=40, blank=True, help_text="Coupon code; leave empty to apply automatically")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=PERCENT)
+    value = models.DecimalField(max_digits=10, decimal_places=2, help_text="Percent, amount off, or the combo's price")
+    min_quantity = models.PositiveIntegerField(default=1, help_text="Matching units needed (the group size for combos)")
+    products = models.ManyToManyField(Product, blank=True, related_name='discounts')
+    categories = models.ManyToManyField(Category, blank=True, related_name='discounts')  # No products or categories: everything
+    first_order_only = models.BooleanField(default=False)
+    starts_at = models.DateTimeField(blank=True, null=True)
+    ends_at = models.DateTimeField(blank=True, null=True)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['code'], condition=~models.Q(code=''), name='unique_discount_code'),
+        ]
+
+    def clean(self):
+        self.code = self.code.strip().upper()
+        if self.value is not None and self.value < 0:
+            raise ValidationError({'value': "The value can't be negative."})
+        if self.kind == self.PERCENT and self.value is not None and not 0 < self.value <= 100:
+            raise ValidationError({'value': "A percentage must be between 0 and 100."})
+        if self.min_quantity < 1:
+            raise ValidationError({'min_quantity': "At least one unit has to match."})
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': "The discount has to end after it starts."})
+
+    def __str__(self):
+        return f"{self.name} ({self.code})" if self.code else self.name
@@ -0,0 +1,201 @@
+"""
+Payment claims and statement reconciliation.
+
+Checkout and print-order creation record every UPI transaction ID as a PaymentClaim, which is
+unique per method across both order types. Staff upload the bank/UPI statement as CSV; its
+lines are streamed into StatementLine in batches and then matched against the claims with a
+handful of UPDATE ... (subquery) statements, whatever the number of lines.
+"""
+import csv
+import io
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, Count, Exists, F, Max, Min, OuterRef, Subquery, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import PaymentClaim, PaymentStatement, StatementLine
+
+
+# Statement column -> header names banks and UPI apps use for it (compared case-insensitively)
+STATEMENT_COLUMNS = {
+    'transaction_id': ('transaction_id', 'transaction id', 'utr', 'utr no', 'reference', 'ref no'),
+    'amount': ('amount', 'credit', 'credit amount'),
+    'paid_at': ('paid_at', 'date', 'transaction date', 'value date'),
+}
+DATE_FORMATS = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d')
+BATCH_SIZE = 1000
+MAX_AMOUNT = Decimal('99999999.99')  # Largest value StatementLine.amount (10 digits, 2 decimals) can hold
+
+
+class DuplicatePayment(Exception):
+    pass
+
+
+class StatementFormatError(ValueError):
+    pass
+
+
+def clean_transaction_id(value):
+    """
+    The transaction ID as the client sent it, or None if blank. A UTR sent as a JSON number is
+    taken as its digits; anything else that isn't text raises ValueError.
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if value is not None and not isinstance(value, str):
+        raise ValueError("The transaction ID must be text.")
+    value = (value or '').strip()
+    if len(value) > 100:
+        raise ValueError("The transaction ID is too long.")
+    return value or None
+
+
+def claim_payment(method, transaction_id, amount, order=None, print_order=None):
+    """Record the transaction ID an order was paid with; raises DuplicatePayment if it was used before."""
+    if method != 'upi' or not transaction_id:
+        return None
+    try:
+        with transaction.atomic():
+            return PaymentClaim.objects.create(
+                method=method, transaction_id=transaction_id.strip(), amount=amount, order=order, print_order=print_order,
+            )
+    except IntegrityError:
+        raise DuplicatePayment(transaction_id)
+
+
+def parse_amount(value):
+    try:
+        amount = Decimal(value.replace(',', '').replace('₹', '').strip())
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or abs(amount) > MAX_AMOUNT:  # NaN/Infinity parse, but can't be compared or stored
+        return None
+    return amount
+
+
+def parse_paid_at(value):
+    value = value.strip()
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        for date_format in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(value, date_format)
+                break
+            except ValueError:
+                continue
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def statement_rows(text_file):
+    """Yield (line_no, transaction_id, amount, paid_at) from a CSV statement, skipping debits and blank rows."""
+    reader = csv.reader(text_file)
+    try:
+        header = [name.strip().lower() for name in next(reader, [])]
+        positions = {}
+        for column, names in STATEMENT_COLUMNS.items():
+            positions[column] = next((header.index(name) for name in names if name in header), None)
+        if positions['transaction_id'] is None or positions['amount'] is None:
+            raise StatementFormatError("The statement needs a transaction ID (or UTR) column and an amount column.")
+
+        for line_no, row in enumerate(reader, start=2):
+            try:
+                transaction_id = row[positions['transaction_id']].strip()
+                amount = parse_amount(row[positions['amount']])
+            except IndexError:
+                continue
+            if not transaction_id or amount is None or amount <= 0:
+                continue
+            paid_at = parse_paid_at(row[positions['paid_at']]) if positions['paid_at'] is not None and positions['paid_at'] < len(row) else None
+            yield line_no, transaction_id[:100], amount, paid_at
+    except csv.Error as exc:  # e.g. a NUL byte, or a quote left open at the end of the file
+        raise StatementFormatError(f"Line {reader.line_num} of the statement can't be read: {exc}.")
+
+
+def import_statement(uploaded_file, method='upi', user=None):
+    """Stream an uploaded CSV statement into StatementLine rows, then reconcile it."""
+    text_file = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', errors='replace', newline='')
+    batch = []
+    count = 0
+    with transaction.atomic():
+        statement = PaymentStatement.objects.create(name=uploaded_file.name[:255], method=method, uploaded_by=user)
+        for line_no, transaction_id, amount, paid_at in statement_rows(text_file):
+            batch.append(StatementLine(
+                statement=statement, line_no=line_no, transaction_id=transaction_id, amount=amount, paid_at=paid_at,
+            ))
+            if len(batch) == BATCH_SIZE:
+                StatementLine.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        StatementLine.objects.bulk_create(batch)
+        statement.line_count = count + len(batch)
+        statement.save(update_fields=['line_count'])
+        reconcile(statement)
+    return statement
+
+
+def reconcile(statement):
+    """Match all of a statement's lines against the payment claims. Safe to run again."""
+    lines = StatementLine.objects.filter(statement=statement)
+    claims = PaymentClaim.objects.filter(method=statement.method, transaction_id=OuterRef('transaction_id'))
+    lines.update(
+        claim_id=Subquery(claims.values('id')[:1]),
+        expected_amount=Subquery(claims.values('amount')[:1]),
+    )
+
+    repeated = lines.order_by().values('transaction_id').annotate(n=Count('id')).filter(n__gt=1).values('transaction_id')
+    matched_before = StatementLine.objects.filter(
+        claim_id=OuterRef('claim_id'), status='matched', statement_id__lt=statement.pk,
+    )
+    lines.update(status=Case(
+        When(claim_id__isnull=True, then=Value('unknown')),
+        When(transaction_id__in=repeated, then=Value('duplicate')),
+        When(Exists(matched_before), then=Value('duplicate')),
+        When(amount=F('expected_amount'), then=Value('matched')),
+        default=Value('amount_mismatch'),
+        output_field=CharField(),
+    ))
+    PaymentClaim.objects.filter(
+        id__in=lines.filter(status='matched').values('claim_id'), verified_at__isnull=True,
+    ).update(verified_at=timezone.now())
+
+
+def unpaid_claims(statement):
+    """Claims from the days the statement covers that no statement has matched (yet)."""
+    period = statement.lines.aggregate(first=Min('paid_at'), last=Max('paid_at'))
+    if period['first'] is None:
+        return PaymentClaim.objects.none()
+    start = timezone.make_aware(datetime.combine(timezone.localdate(period['first']), time.min))
+    end = timezone.make_aware(datetime.combine(timezone.localdate(period['last']), time.min)) + timedelta(days=1)
+    return PaymentClaim.objects.filter(
+        method=statement.method, verified_at__isnull=True, created_at__gte=start, created_at__lt=end,
+    ).order_by('created_at')
+
+
+def statement_summary(statement, detail=False):
+    counts = dict(statement.lines.order_by().values_list('status').annotate(n=Count('id')))
+    unpaid = unpaid_claims(statement)
+    summary = {
+        'id': statement.pk,
+        'name': statement.name,
+        'method': statement.method,
+        'uploaded_at': statement.uploaded_at,
+        'lines': statement.line_count,
+        'counts': {status: counts.get(status, 0) for status, _ in StatementLine.STATUS_CHOICES},
+        'unpaid': unpaid.count(),
+    }
+    if detail:
+        summary['flagged'] = list(
+            statement.lines.exclude(status='matched')
+            .values('line_no', 'transaction_id', 'amount', 'expected_amount', 'paid_at', 'status', 'claim__order_id', 'claim__print_order_id')[:1000]
+        )
+        summary['unpaid_claims'] = list(
+            unpaid.values('transaction_id', 'amount', 'created_at', 'order_id', 'print_order_id')[:1000]
+        )
+    return summary
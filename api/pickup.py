@@ -0,0 +1,125 @@
+"""
+Pickup slots, so orders are collected across the lunch hour instead of all at once.
+
+Staff configure PickupWindows (times, capacity, weekdays). A day's windows become PickupSlot
+rows the first time anyone asks for that day. Checkout books a slot by bumping its `booked`
+counter with a conditional UPDATE (booked < capacity), so taking the last place is decided by
+the database and no orders are ever counted; cancelling an order gives its place back.
+Un-cancelling takes the place again under the same condition; if the slot has filled up since,
+the order loses its slot instead of overbooking it.
+Availability per day is cached and dropped whenever a booking or cancellation commits.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Order, PickupSlot, PickupWindow
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def cache_key(date):
+    return f'pickup:{date.isoformat()}'
+
+
+def invalidate(date):
+    cache.delete(cache_key(date))
+
+
+def bookable_dates(today=None):
+    today = today or timezone.localdate()
+    return [today + timedelta(days=offset) for offset in range(getattr(settings, 'PICKUP_DAYS_AHEAD', 2))]
+
+
+def booking_cutoff(now=None):
+    """Slots starting before this can no longer be booked."""
+    now = timezone.localtime(now)
+    return now + timedelta(minutes=getattr(settings, 'PICKUP_LEAD_MINUTES', 10))
+
+
+def starts_at(slot):
+    return timezone.make_aware(datetime.combine(slot['date'], slot['start_time']))
+
+
+def ensure_slots(date):
+    """Create the day's slots from the active windows offered on that weekday (once)."""
+    windows = [
+        window for window in PickupWindow.objects.filter(is_active=True)
+        if str(date.weekday()) in window.weekdays
+    ]
+    PickupSlot.objects.bulk_create(
+        [
+            PickupSlot(window=window, date=date, start_time=window.start_time, end_time=window.end_time, capacity=window.capacity)
+            for window in windows
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def day_slots(date):
+    """The day's slots with their counters, from the cache when possible."""
+    slots = cache.get(cache_key(date))
+    if slots is None:
+        ensure_slots(date)
+        slots = list(
+            PickupSlot.objects.filter(date=date).order_by('start_time', 'id')
+            .values('id', 'date', 'start_time', 'end_time', 'capacity', 'booked')
+        )
+        cache.set(cache_key(date), slots, getattr(settings, 'PICKUP_CACHE_SECONDS', 60))
+    return slots
+
+
+def availability(dates=None, now=None):
+    """Slots that can still be booked, with the places left in each."""
+    cutoff = booking_cutoff(now)
+    result = []
+    for date in dates or bookable_dates(cutoff.date()):
+        for slot in day_slots(date):
+            if starts_at(slot) >= cutoff:
+                result.append({
+                    'id': slot['id'],
+                    'date': slot['date'],
+                    'start_time': slot['start_time'],
+                    'end_time': slot['end_time'],
+                    'capacity': slot['capacity'],
+                    'remaining': max(0, slot['capacity'] - slot['booked']),
+                })
+    return result
+
+
+def book(slot_id, now=None):
+    """Take one place in the slot; call inside the checkout transaction. Raises SlotUnavailable."""
+    slot = PickupSlot.objects.filter(pk=slot_id).values('id', 'date', 'start_time').first()
+    cutoff = booking_cutoff(now)
+    if slot is None or slot['date'] not in bookable_dates(cutoff.date()) or starts_at(slot) < cutoff:
+        raise SlotUnavailable("That pickup slot can't be booked.")
+    if not PickupSlot.objects.filter(pk=slot_id, booked__lt=F('capacity')).update(booked=F('booked') + 1):
+        raise SlotUnavailable("That pickup slot is full.")
+    transaction.on_commit(lambda: invalidate(slot['date']))
+    return slot['id']
+
+
+def release_order_slot(order_id, sign=1):
+    """
+    Give a cancelled order's place back (sign=-1 takes it again if the order is un-cancelled).
+    Returns False when an un-cancelled order's slot has filled up meanwhile; the order is then
+    left without a slot, for staff to arrange its pickup.
+    """
+    slot = Order.objects.filter(pk=order_id, pickup_slot__isnull=False).values('pickup_slot_id', 'pickup_slot__date').first()
+    if slot is None:
+        return True
+    slots = PickupSlot.objects.filter(pk=slot['pickup_slot_id'])
+    if sign > 0:
+        slots.update(booked=Greatest(F('booked') - 1, 0))
+    elif not slots.filter(booked__lt=F('capacity')).update(booked=F('booked') + 1):
+        Order.objects.filter(pk=order_id).update(pickup_slot=None)
+        return False
+    invalidate(slot['pickup_slot__date'])
+    return True
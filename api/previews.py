@@ -0,0 +1,166 @@
+"""
+Preview thumbnails of uploaded print files, so nobody has to download a 50 MB PDF to see what it is.
+
+When a PrintOrderFile is saved, rendering is queued for after the transaction commits and runs
+in a process pool (PRINT_PREVIEW_WORKERS; 0 renders inline). The first PRINT_PREVIEW_PAGES pages
+of a PDF (or the image itself) become WebP thumbnails PRINT_PREVIEW_WIDTH pixels wide, stored
+under the file's content hash, so the same upload is only ever rendered once. PDFs are
+rasterised with pypdfium2 when it is installed; without it, a page's preview is the largest
+image embedded in it, which covers scanned documents.
+
+models.py imports this module, so models, Pillow and the PDF libraries are only imported inside
+the functions that need them.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .images import hash_file
+from .workers import TaskPool
+
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DIR = 'previews'
+PREVIEW_FORMAT = ('WEBP', {'quality': 75, 'method': 4})
+
+
+def preview_width():
+    return getattr(settings, 'PRINT_PREVIEW_WIDTH', 320)
+
+
+def preview_path(source_hash, page, width=None):
+    return f"{PREVIEW_DIR}/{source_hash[:2]}/{source_hash}-{page}-{width or preview_width()}.webp"
+
+
+def source_hash_of(path):
+    """The source hash a preview's storage name was built from (see preview_path)."""
+    return os.path.basename(path).split('-', 1)[0]
+
+
+def preview_paths(source_hash, pages):
+    """Storage names of a file's previews, first page first."""
+    return [preview_path(source_hash, page) for page in range(1, pages + 1)] if source_hash else []
+
+
+def preview_urls(source_hash, pages, request=None):
+    """URLs of a file's previews without touching the disk."""
+    urls = [default_storage.url(path) for path in preview_paths(source_hash, pages)]
+    return [request.build_absolute_uri(url) for url in urls] if request is not None else urls
+
+
+def thumbnail(img, width):
+    img = img.copy()
+    img.thumbnail((width, width * 4))  # never upscales
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.mode or 'transparency' in img.info else 'RGB')
+    return img
+
+
+def pdf_pages(fh, count, width):
+    """Yield up to `count` rendered pages of a PDF as PIL images."""
+    try:
+        import pypdfium2
+    except ImportError:
+        pypdfium2 = None
+
+    if pypdfium2 is not None:
+        document = pypdfium2.PdfDocument(fh)
+        try:
+            for index in range(min(count, len(document))):
+                page = document[index]
+                yield page.render(scale=width / page.get_width()).to_pil()
+        finally:
+            document.close()
+        return
+
+    from pypdf import PdfReader
+
+    reader = PdfReader(fh)
+    for page in reader.pages[:count]:
+        images = list(page.images)
+        if not images:
+            return  # nothing to show for a text-only page without a rasteriser
+        yield max(images, key=lambda image: image.image.width * image.image.height).image
+
+
+def render_previews(field_file, source_hash, pages, force=False):
+    """Write previews for the first `pages` pages of the file; returns how many exist afterwards."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    from pypdf.errors import PdfReadError
+
+    width = preview_width()
+    if not force and all(default_storage.exists(path) for path in preview_paths(source_hash, pages)):
+        return pages
+
+    is_pdf = os.path.splitext(field_file.name)[1].lower() == '.pdf'
+    rendered = 0
+    field_file.open('rb')
+    try:
+        if is_pdf:
+            sources = pdf_pages(field_file, pages, width)
+        else:
+            img = Image.open(field_file)
+            sources = [ImageOps.exif_transpose(img)]
+        for page, img in enumerate(sources, start=1):
+            fmt, options = PREVIEW_FORMAT
+            buffer = BytesIO()
+            thumbnail(img, width).save(buffer, fmt, **options)
+            path = preview_path(source_hash, page, width)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            default_storage.save(path, ContentFile(buffer.getvalue()))
+            rendered = page
+    # RuntimeError: pypdfium2.PdfiumError
+    except (OSError, ValueError, RuntimeError, UnidentifiedImageError, PdfReadError, Image.DecompressionBombError) as exc:
+        logger.warning("Could not render previews of %s: %s", field_file.name, exc)
+    finally:
+        field_file.close()
+    return rendered
+
+
+def generate_previews(file_id, force=False):
+    """Render one PrintOrderFile's previews and record them; returns its print order's user id."""
+    from .models import PrintOrderFile
+
+    upload = PrintOrderFile.objects.select_related('print_order').filter(pk=file_id).first()
+    if upload is None or not upload.file:
+        return None
+    try:
+        source_hash = hash_file(upload.file)
+    except OSError:
+        logger.warning("Print file %s is missing from storage", upload.file.name)
+        return None
+    wanted = min(getattr(settings, 'PRINT_PREVIEW_PAGES', 1), upload.page_count or 1)
+    pages = render_previews(upload.file, source_hash, wanted, force=force)
+    PrintOrderFile.objects.filter(pk=file_id).update(preview_hash=source_hash, preview_pages=pages)
+    return upload.print_order.user_id
+
+
+def previews_done(future):
+    try:
+        user_id = future.result()
+    except Exception:
+        logger.exception("Rendering print previews failed")
+        return
+    if user_id is not None:
+        from . import bootstrap
+
+        bootstrap.invalidate_user(user_id)  # the print orders section now has preview URLs
+
+
+pool = TaskPool('PRINT_PREVIEW_WORKERS')
+
+
+def schedule_previews(file_ids):
+    """Render the files' previews once the current transaction commits."""
+    def start():
+        for file_id in file_ids:
+            pool.submit(generate_previews, file_id).add_done_callback(previews_done)
+
+    transaction.on_commit(start)
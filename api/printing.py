@@ -0,0 +1,19 @@
+import os
+
+
+def count_pages(field_file):
+    """Number of printable pages in an uploaded file: PDF page count, 1 for images and anything unreadable."""
+    ext = os.path.splitext(field_file.name)[1].lower()
+    if ext != '.pdf':
+        return 1
+    from pypdf import PdfReader  # pypdf is the heaviest import in the app; only uploads need it
+    from pypdf.errors import PdfReadError
+
+    try:
+        field_file.open('rb')
+        try:
+            return len(PdfReader(field_file).pages) or 1
+        finally:
+            field_file.close()
+    except (OSError, PdfReadError, ValueError):
+        return 1
@@ -0,0 +1,269 @@
+"""
+Print-ready jobs: one PDF per print order, so the counter prints a single file per order.
+
+Confirming an order queues its preparation (after the transaction commits) in a process pool
+(PRINT_JOB_WORKERS; 0 prepares inline). The order's files are streamed one at a time into a
+single PDF: a cover sheet with the order details, then every document scaled onto the order's
+paper size, `pages_per_sheet` pages to a side. For double-sided orders every document starts on
+a front side, padded with a blank side where needed; with PRINT_MANUAL_DUPLEX the fronts come
+first and the backs after them in reverse, for printers without a duplex unit.
+
+The job records a hash of the files and options it was built from, so preparing it again only
+rebuilds when something changed. Pillow and pypdf are imported by the functions that use them,
+since this module is loaded at boot (admin -> reporting) but only pool workers build jobs.
+"""
+import hashlib
+import logging
+import os
+import textwrap
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .images import hash_file
+from .models import PrintJob, PrintOrder
+from .workers import TaskPool
+
+
+logger = logging.getLogger(__name__)
+
+PAPER_SIZES = {'A4': (595.28, 841.89), 'A3': (841.89, 1190.55), 'letter': (612.0, 792.0)}  # points, portrait
+NUP_LAYOUTS = {1: (1, 1, False), 2: (2, 1, True), 4: (2, 2, False)}  # pages per side -> (columns, rows, landscape)
+NUP_MARGIN = 12  # points around each page when several share a side
+COVER_DPI = 100
+JOB_VERSION = '1'  # bump when the output changes, so cached jobs are rebuilt
+
+
+class UnreadableFile(Exception):
+    pass
+
+
+def manual_duplex():
+    return getattr(settings, 'PRINT_MANUAL_DUPLEX', False)
+
+
+def side_size(order):
+    width, height = PAPER_SIZES.get(order.paper_size, PAPER_SIZES['A4'])
+    return (height, width) if NUP_LAYOUTS[order.pages_per_sheet][2] else (width, height)
+
+
+def place(side, page, x, y, width, height):
+    """Scale `page` into the box at (x, y), turned a quarter if its orientation differs, and center it."""
+    from pypdf import Transformation
+
+    page.transfer_rotation_to_content()
+    box = page.mediabox
+    page_width, page_height = float(box.width), float(box.height)
+    transform = Transformation().translate(-float(box.left), -float(box.bottom))
+    if (page_width > page_height) != (width > height):
+        transform = transform.rotate(90).translate(page_height, 0)
+        page_width, page_height = page_height, page_width
+    scale = min(width / page_width, height / page_height)
+    side.merge_transformed_page(page, transform.scale(scale).translate(
+        x + (width - page_width * scale) / 2, y + (height - page_height * scale) / 2,
+    ))
+
+
+def impose(pages, pages_per_sheet, size):
+    """Yield sides with `pages_per_sheet` pages each, left to right and top to bottom."""
+    from pypdf import PageObject
+
+    columns, rows, _ = NUP_LAYOUTS[pages_per_sheet]
+    width, height = size
+    margin = NUP_MARGIN if pages_per_sheet > 1 else 0
+    cell_width, cell_height = width / columns, height / rows
+    side = None
+    for index, page in enumerate(pages):
+        cell = index % pages_per_sheet
+        if cell == 0:
+            if side is not None:
+                yield side
+            side = PageObject.create_blank_page(width=width, height=height)
+        column, row = cell % columns, cell // columns
+        place(
+            side, page, column * cell_width + margin, height - (row + 1) * cell_height + margin,
+            cell_width - 2 * margin, cell_height - 2 * margin,
+        )
+    if side is not None:
+        yield side
+
+
+def document_pages(fh, name):
+    """The pages of an uploaded PDF, or a one-page PDF made from an uploaded image."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    from pypdf import PdfReader
+    from pypdf.errors import PdfReadError
+
+    try:
+        if os.path.splitext(name)[1].lower() == '.pdf':
+            reader = PdfReader(fh)
+            if reader.is_encrypted:
+                reader.decrypt('')
+            return reader.pages
+        with Image.open(fh) as img:
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            buffer = BytesIO()
+            img.save(buffer, 'PDF', resolution=150)
+        return PdfReader(buffer).pages
+    except (OSError, ValueError, UnidentifiedImageError, PdfReadError, Image.DecompressionBombError) as exc:
+        raise UnreadableFile(name) from exc
+
+
+def cover_sheet(order, uploads):
+    """A page with the order details, the first thing off the printer."""
+    from PIL import Image, ImageDraw, ImageFont
+    from pypdf import PdfReader
+
+    width, height = (round(points / 72 * COVER_DPI) for points in PAPER_SIZES.get(order.paper_size, PAPER_SIZES['A4']))
+    img = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    title, body = ImageFont.load_default(size=36), ImageFont.load_default(size=18)
+    margin, y = COVER_DPI, COVER_DPI
+    draw.text((margin, y), f"Print order #{order.pk}", font=title, fill=0)
+    y += 70
+    details = [
+        ("Customer", f"{order.user.full_name or order.user.username} ({order.user.username})"),
+        ("Email", order.user.email),
+        ("Placed", timezone.localtime(order.created_at).strftime('%Y-%m-%d %H:%M')),
+        ("Paper", f"{order.paper_size}, {order.get_color_mode_display()}, {order.get_print_sides_display()}-sided"),
+        ("Pages per side", order.pages_per_sheet),
+        ("Binding", order.get_binding_option_display()),
+        ("Urgency", order.get_urgency_display()),
+        ("Payment", f"{order.get_payment_status_display()} {order.transaction_id or ''}".strip()),
+        ("Total", order.total_price),
+    ]
+    for label, value in details:
+        draw.text((margin, y), f"{label}: {value}", font=body, fill=0)
+        y += 30
+    y += 20
+    draw.text((margin, y), "Files:", font=body, fill=0)
+    for upload in uploads:
+        y += 30
+        draw.text((margin + 20, y), f"{os.path.basename(upload.file.name)} ({upload.page_count} pages)", font=body, fill=0)
+    if order.additional_notes:
+        y += 50
+        draw.text((margin, y), "Notes:", font=body, fill=0)
+        for line in textwrap.wrap(order.additional_notes, 70)[:20]:
+            y += 28
+            draw.text((margin + 20, y), line, font=body, fill=0)
+    buffer = BytesIO()
+    img.save(buffer, 'PDF', resolution=COVER_DPI)
+    return PdfReader(buffer).pages[0]
+
+
+def source_key(order, uploads):
+    digest = hashlib.sha1(JOB_VERSION.encode())
+    options = (
+        order.pk, order.paper_size, order.color_mode, order.print_sides, order.pages_per_sheet, order.binding_option,
+        order.urgency, order.additional_notes, order.payment_status, order.transaction_id, order.total_price, manual_duplex(),
+    )
+    for value in options:
+        digest.update(f'{value}\0'.encode())
+    for upload in uploads:
+        digest.update((upload.preview_hash or hash_file(upload.file)).encode())  # previews already hashed the content
+    return digest.hexdigest()
+
+
+def build(order, uploads, output):
+    """Write the print-ready PDF to `output`; returns (sides, names of files that could not be read)."""
+    from pypdf import PdfWriter
+    from pypdf.errors import PdfReadError
+
+    duplex = order.print_sides == 'double'
+    size = side_size(order)
+    writer = PdfWriter()
+    writer.add_page(cover_sheet(order, uploads))
+    if duplex:
+        writer.add_blank_page(*PAPER_SIZES.get(order.paper_size, PAPER_SIZES['A4']))  # the cover's back
+    skipped = []
+    for upload in uploads:
+        upload.file.open('rb')
+        try:
+            sides = 0
+            # add_page copies each side into the writer, so the file can be closed afterwards
+            for side in impose(document_pages(upload.file, upload.file.name), order.pages_per_sheet, size):
+                writer.add_page(side)
+                sides += 1
+            if duplex and sides % 2:
+                writer.add_blank_page(*size)
+        except (UnreadableFile, PdfReadError, ValueError):  # pages are parsed lazily, so errors can come late
+            skipped.append(os.path.basename(upload.file.name))
+        finally:
+            upload.file.close()
+
+    if duplex and manual_duplex():
+        pages = list(writer.pages)
+        reordered = PdfWriter()
+        for page in pages[0::2] + pages[1::2][::-1]:
+            reordered.add_page(page)
+        writer = reordered
+    writer.write(output)
+    return len(writer.pages), skipped
+
+
+def prepare_print_job(print_order_id, force=False):
+    """Build (or reuse) the order's print-ready PDF; returns the PrintJob id, or None for cancelled/missing orders."""
+    order = PrintOrder.objects.select_related('user').filter(pk=print_order_id).exclude(status='cancelled').first()
+    if order is None:
+        return None
+    uploads = list(order.files.exclude(file='').order_by('id'))
+    job, _ = PrintJob.objects.get_or_create(print_order=order)
+    try:
+        return update_print_job(job, order, uploads, force)
+    except Exception as exc:  # shown to staff on the job; job_done logs the traceback
+        job.error = f"Preparing the job failed: {exc!r}"[:255]
+        job.save(update_fields=['error'])
+        raise
+
+
+def update_print_job(job, order, uploads, force):
+    try:
+        key = source_key(order, uploads)
+    except OSError as exc:
+        job.error = f"A file is missing from storage: {exc}"[:255]
+        job.save(update_fields=['error'])
+        return job.pk
+    if not force and job.source_key == key and job.file and default_storage.exists(job.file.name):
+        return job.pk
+
+    old_name = job.file.name
+    with SpooledTemporaryFile(max_size=32 * 1024 * 1024) as output:
+        sides, skipped = build(order, uploads, output)
+        output.seek(0)
+        job.file.save(f'order-{order.pk}.pdf', File(output), save=False)
+    job.source_key = key
+    job.sides = sides
+    job.sheets = (sides + 1) // 2 if order.print_sides == 'double' else sides
+    job.prepared_at = timezone.now()
+    job.error = f"Skipped unreadable files: {', '.join(skipped)}"[:255] if skipped else ''
+    job.save()
+    if old_name and old_name != job.file.name:
+        default_storage.delete(old_name)
+    return job.pk
+
+
+pool = TaskPool('PRINT_JOB_WORKERS')
+
+
+def job_done(future):
+    try:
+        future.result()
+    except Exception:
+        logger.exception("Preparing a print job failed")
+
+
+def schedule_print_jobs(print_order_ids, force=False):
+    """Prepare the orders' print jobs once the current transaction commits."""
+    def start():
+        for print_order_id in print_order_ids:
+            try:
+                pool.submit(prepare_print_job, print_order_id, force).add_done_callback(job_done)
+            except Exception:  # the orders are committed by now; staff can prepare the job again
+                logger.exception("Queueing the print job of order %s failed", print_order_id)
+
+    transaction.on_commit(start)
@@ -0,0 +1,219 @@
+"""
+Print queue positions and ready-time estimates.
+
+Waiting print orders (pending or confirmed) are printed express first, then oldest first. Each
+waiting order stores its printed sides, queue_position and estimated_ready_at, so serializers and
+staff views read them off the row.
+
+The queue is kept incrementally once a change commits (sync): an order joining the queue takes
+the place after the queued order printed just before it, and everyone behind it moves back one
+place and by its printing time, in one UPDATE. An order leaving the queue moves everyone
+behind it up again, and an order whose sides change (a file added later) shifts the estimates
+behind it by the difference. Queue changes are serialized by locking the 'print-throughput'
+JobCheckpoint row. The admin's bulk status actions and the housekeeping job call refresh(),
+which walks the whole queue once: it re-anchors the estimates to the current time and rate, and
+corrects anything the incremental updates couldn't (pages counted after their order was queued).
+
+An estimate is the printed sides ahead of the order, its own included, times the seconds one side
+takes. That rate is learned from the orders marked printed: the time since the previous printed
+batch (or since the order came in, if later) divided by the batch's sides, smoothed into a
+running average kept in the 'print-throughput' JobCheckpoint (position = milliseconds per
+side). Gaps longer than PRINT_IDLE_MINUTES mean nobody was printing, so they teach nothing.
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import bootstrap
+from .models import JobCheckpoint, PrintOrder
+
+
+WAITING_STATUSES = ('pending', 'confirmed')
+CHECKPOINT = 'print-throughput'
+SMOOTHING = 0.2  # weight of the newest batch in the running average
+RESTAMP_SECONDS = 60  # estimates that moved less than this are left alone
+
+
+def default_ms_per_side():
+    return getattr(settings, 'PRINT_SECONDS_PER_SIDE', 6) * 1000
+
+
+def idle_gap():
+    return timedelta(minutes=getattr(settings, 'PRINT_IDLE_MINUTES', 20))
+
+
+def sides(pages, pages_per_sheet):
+    return max(1, math.ceil((pages or 0) / (pages_per_sheet or 1)))
+
+
+def seconds_per_side():
+    ms = JobCheckpoint.objects.filter(name=CHECKPOINT).values_list('position', flat=True).first()
+    return (ms or default_ms_per_side()) / 1000
+
+
+def with_pages(queryset):
+    return queryset.annotate(pages=Coalesce(Sum('files__page_count'), 0))
+
+
+def waiting_orders():
+    """Waiting orders in printing order."""
+    express_first = Case(When(urgency='express', then=Value(0)), default=Value(1), output_field=IntegerField())
+    return with_pages(PrintOrder.objects.filter(status__in=WAITING_STATUSES)).order_by(express_first, 'created_at', 'id')
+
+
+def lock_queue():
+    """Serialize queue changes (call inside a transaction); returns the seconds one side takes."""
+    checkpoint, _ = JobCheckpoint.objects.select_for_update().get_or_create(
+        name=CHECKPOINT, defaults={'position': default_ms_per_side()},
+    )
+    return (checkpoint.position or default_ms_per_side()) / 1000
+
+
+def queued():
+    return PrintOrder.objects.filter(queue_position__isnull=False)
+
+
+def printed_before(order):
+    """Queued orders printed before `order`, nearest first."""
+    earlier = Q(created_at__lt=order.created_at) | Q(created_at=order.created_at, pk__lt=order.pk)
+    if order.urgency == 'express':
+        earlier &= Q(urgency='express')
+    else:
+        earlier |= Q(urgency='express')
+    return queued().filter(earlier).exclude(pk=order.pk).order_by('-queue_position')
+
+
+def shift(from_position, places, seconds):
+    """Move the queued orders from `from_position` on by `places` and their estimates by `seconds`; returns their users."""
+    behind = queued().filter(queue_position__gte=from_position)
+    users = set(behind.values_list('user_id', flat=True))
+    if users:
+        behind.update(
+            queue_position=F('queue_position') + places,
+            estimated_ready_at=F('estimated_ready_at') + timedelta(seconds=seconds),
+        )
+    return users
+
+
+def sync(print_order_id, now=None):
+    """Bring one order's place in the queue, and the estimates of everyone behind it, up to date."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        per_side = lock_queue()
+        order = with_pages(PrintOrder.objects.filter(pk=print_order_id)).first()
+        if order is None:
+            return
+        users = {order.user_id}
+        order_sides = sides(order.pages, order.pages_per_sheet)
+        if order.status not in WAITING_STATUSES:
+            if order.queue_position is None:
+                return
+            users |= close_gap(order.queue_position, order.sides, per_side)
+            PrintOrder.objects.filter(pk=order.pk).update(queue_position=None, estimated_ready_at=None, sides=order_sides)
+        else:
+            before = printed_before(order).values_list('queue_position', 'estimated_ready_at').first()
+            place, start = (before[0] + 1, max(before[1], now)) if before else (1, now)
+            if order.queue_position is None:
+                users |= shift(place, 1, order_sides * per_side)
+                PrintOrder.objects.filter(pk=order.pk).update(
+                    queue_position=place, estimated_ready_at=start + timedelta(seconds=order_sides * per_side), sides=order_sides,
+                )
+            elif order.queue_position != place:
+                transaction.on_commit(refresh)  # moved in the queue (urgency changed); rare, so re-walk it
+            elif order.sides != order_sides:
+                users |= shift(place, 0, (order_sides - order.sides) * per_side)
+                PrintOrder.objects.filter(pk=order.pk).update(sides=order_sides)
+            else:
+                return
+    bootstrap.invalidate_users(users)  # queryset updates skip the signals that drop cached print orders
+
+
+def close_gap(position, order_sides, per_side):
+    return shift(position + 1, -1, -order_sides * per_side)
+
+
+def schedule_sync(print_order_id):
+    """Sync the order once the current transaction commits, when its files are counted."""
+    transaction.on_commit(lambda: sync(print_order_id))
+
+
+def schedule_removal(print_order):
+    """Before a waiting order is deleted: move everyone behind it up once the delete commits."""
+    if print_order.status not in WAITING_STATUSES:
+        return  # finished orders (archiving deletes thousands) have left the queue already
+    row = queued().filter(pk=print_order.pk).values_list('queue_position', 'sides').first()
+    if row is None:
+        return
+    position, order_sides = row  # this instance's copy of the queue fields may be stale
+
+    def removed():
+        with transaction.atomic():
+            users = close_gap(position, order_sides, lock_queue())
+        bootstrap.invalidate_users(users)
+    transaction.on_commit(removed)
+
+
+def refresh(now=None):
+    """Recompute every waiting order's sides, position and estimate; returns how many users' orders changed."""
+    now = now or timezone.now()
+    changed = []
+    users = set()
+    ahead = 0
+    with transaction.atomic():
+        per_side = lock_queue()
+        rows = waiting_orders().values_list(
+            'id', 'user_id', 'pages', 'pages_per_sheet', 'sides', 'queue_position', 'estimated_ready_at',
+        )
+        for position, (pk, user_id, pages, pages_per_sheet, old_sides, old_position, old_estimate) in enumerate(rows, start=1):
+            order_sides = sides(pages, pages_per_sheet)
+            ahead += order_sides
+            estimate = now + timedelta(seconds=ahead * per_side)
+            if (position != old_position or order_sides != old_sides or old_estimate is None
+                    or abs((estimate - old_estimate).total_seconds()) > RESTAMP_SECONDS):
+                changed.append(PrintOrder(pk=pk, sides=order_sides, queue_position=position, estimated_ready_at=estimate))
+                users.add(user_id)
+        PrintOrder.objects.bulk_update(changed, ['sides', 'queue_position', 'estimated_ready_at'], batch_size=500)
+        done = queued().exclude(status__in=WAITING_STATUSES)
+        users.update(done.values_list('user_id', flat=True))
+        done.update(queue_position=None, estimated_ready_at=None)
+    bootstrap.invalidate_users(users)  # bulk updates skip the signals that drop cached print orders
+    return len(users)
+
+
+def record_printed(print_order_ids, at=None):
+    """Learn from orders that just came off the printer (one admin save or bulk action)."""
+    at = at or timezone.now()
+    batch = list(with_pages(PrintOrder.objects.filter(pk__in=print_order_ids)).values_list('pages', 'pages_per_sheet', 'created_at'))
+    if not batch:
+        return
+    batch_sides = sum(sides(pages, pages_per_sheet) for pages, pages_per_sheet, _ in batch)
+    arrived = min(created_at for _, _, created_at in batch)
+    with transaction.atomic():
+        checkpoint, created = JobCheckpoint.objects.select_for_update().get_or_create(
+            name=CHECKPOINT, defaults={'position': default_ms_per_side()},
+        )
+        if not created:
+            busy = at - max(checkpoint.updated_at, arrived)
+            if timedelta(0) < busy <= idle_gap():
+                sample = busy.total_seconds() * 1000 / batch_sides
+                checkpoint.position = round((1 - SMOOTHING) * checkpoint.position + SMOOTHING * sample)
+        checkpoint.save()  # updated_at marks where the next batch's printing time starts
+
+
+def queue_summary():
+    """The waiting orders with their stored estimates, for staff."""
+    orders = list(
+        PrintOrder.objects.filter(status__in=WAITING_STATUSES, queue_position__isnull=False)
+        .order_by('queue_position')
+        .values('id', 'user__username', 'status', 'urgency', 'created_at', 'queue_position', 'estimated_ready_at')
+    )
+    return {
+        'seconds_per_side': seconds_per_side(),
+        'clears_at': orders[-1]['estimated_ready_at'] if orders else None,
+        'orders': orders,
+    }
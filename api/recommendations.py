@@ -0,0 +1,205 @@
+"""
+"Frequently bought together" recommendations.
+
+Pair counts are accumulated in memory as a sparse dict keyed by one packed integer per
+product pair (low id << 32 | high id), so memory grows with the number of distinct pairs,
+not with the number of order lines streamed. (A dense product x product matrix, e.g. with
+numpy, would be quadratic in the catalog size and numpy isn't a dependency; the packed keys
+keep the sparse dict compact instead.) Counts are persisted in ProductCooccurrence (both
+directions) and the top K per product in ProductRecommendation, which is all the endpoint
+reads.
+
+refresh() only folds in orders placed more than SETTLE ago, and stops at the first item of a
+newer order: item ids are assigned at insert but become visible at commit, so a checkout still
+in progress could otherwise commit lower ids behind the checkpoint and never be counted. This
+assumes no checkout transaction stays open for longer than SETTLE.
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+from itertools import combinations, groupby, islice
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from .models import ArchivedOrder, JobCheckpoint, OrderItem, Product, ProductCooccurrence, ProductRecommendation
+
+
+CHECKPOINT = 'recommendations'
+MAX_BASKET = 50  # Larger orders (bulk purchases) say little about affinity and cost O(n^2) pairs
+CACHE_TIMEOUT = 60 * 60
+SETTLE = timedelta(minutes=5)  # Longer than any checkout transaction stays open
+CHUNK = 1000  # Products per IN (...) list
+
+
+def cache_key(product_id):
+    return f'recommendations:{product_id}'
+
+
+def unpack(key):
+    return key >> 32, key & 0xFFFFFFFF
+
+
+def order_baskets(queryset, chunk_size):
+    """Yield the distinct product ids of each order from an OrderItem queryset, streamed in order_id order."""
+    rows = queryset.exclude(order__status='cancelled').order_by('order_id').values_list('order_id', 'product_id')
+    for _, group in groupby(rows.iterator(chunk_size=chunk_size), key=lambda row: row[0]):
+        yield {product_id for _, product_id in group}
+
+
+def archived_baskets(chunk_size):
+    """Like order_baskets, for archived orders; products deleted since are left out (they can't be recommended)."""
+    live = set(Product.objects.values_list('id', flat=True))
+    rows = ArchivedOrder.objects.exclude(status='cancelled').values_list('items', flat=True)
+    for items in rows.iterator(chunk_size=chunk_size):
+        yield {item['product_id'] for item in items} & live
+
+
+def count_pairs(baskets, counts=None):
+    counts = defaultdict(int) if counts is None else counts
+    for basket in baskets:
+        if 1 < len(basket) <= MAX_BASKET:
+            for a, b in combinations(sorted(basket), 2):
+                counts[(a << 32) | b] += 1
+    return counts
+
+
+def top_k(counts, k):
+    """product_id -> [(count, other_id)] best first, without materialising a full neighbour list per product."""
+    heaps = defaultdict(list)
+    for key, count in counts.items():
+        a, b = unpack(key)
+        for product_id, other_id in ((a, b), (b, a)):
+            heap = heaps[product_id]
+            if len(heap) < k:
+                heapq.heappush(heap, (count, -other_id))
+            elif (count, -other_id) > heap[0]:
+                heapq.heapreplace(heap, (count, -other_id))
+    return {
+        product_id: [(count, -neg_other) for count, neg_other in sorted(heap, reverse=True)]
+        for product_id, heap in heaps.items()
+    }
+
+
+def settled_position(after, now=None):
+    """The highest OrderItem id such that every item from `after` up to it belongs to a settled order."""
+    pending = OrderItem.objects.filter(id__gt=after)
+    unsettled = pending.filter(order__created_at__gte=(now or timezone.now()) - SETTLE).aggregate(first=Min('id'))['first']
+    if unsettled is not None:
+        return unsettled - 1
+    return pending.aggregate(last=Max('id'))['last'] or after
+
+
+def chunked(values, size=CHUNK):
+    values = iter(sorted(values))
+    while chunk := list(islice(values, size)):
+        yield chunk
+
+
+def recommendation_rows(product_id, neighbours):
+    return [
+        ProductRecommendation(product_id=product_id, recommended_id=other_id, rank=rank, score=count)
+        for rank, (count, other_id) in enumerate(neighbours, start=1)
+    ]
+
+
+def rebuild(k=10, chunk_size=5000):
+    """Recount everything, including archived orders. Returns (distinct pairs, products with recommendations)."""
+    last_item = settled_position(0)
+    counts = count_pairs(order_baskets(OrderItem.objects.filter(id__lte=last_item), chunk_size))
+    count_pairs(archived_baskets(chunk_size), counts)
+    best = top_k(counts, k)
+
+    with transaction.atomic():
+        ProductCooccurrence.objects.all().delete()
+        ProductCooccurrence.objects.bulk_create(
+            (
+                ProductCooccurrence(product_id=product_id, other_id=other_id, count=count)
+                for key, count in counts.items()
+                for product_id, other_id in (unpack(key), unpack(key)[::-1])
+            ),
+            batch_size=5000,
+        )
+        ProductRecommendation.objects.all().delete()
+        ProductRecommendation.objects.bulk_create(
+            (row for product_id, neighbours in best.items() for row in recommendation_rows(product_id, neighbours)),
+            batch_size=5000,
+        )
+        JobCheckpoint.objects.update_or_create(name=CHECKPOINT, defaults={'position': last_item})
+    cache.delete_many([cache_key(product_id) for product_id in best])
+    return len(counts), len(best)
+
+
+def add_counts(counts):
+    """
+    Add the pair counts to ProductCooccurrence (both directions); returns the products touched.
+    Pairs seen for the first time are bulk-created; the others get one UPDATE per product and
+    increment, which for a day of orders is mostly +1.
+    """
+    increments = defaultdict(list)  # (product_id, increment) -> other ids
+    for key, count in counts.items():
+        a, b = unpack(key)
+        increments[a, count].append(b)
+        increments[b, count].append(a)
+    affected = {product_id for product_id, _ in increments}
+    existing = set()
+    for chunk in chunked(affected):
+        existing.update(ProductCooccurrence.objects.filter(product_id__in=chunk).values_list('product_id', 'other_id'))
+
+    ProductCooccurrence.objects.bulk_create(
+        (
+            ProductCooccurrence(product_id=product_id, other_id=other_id, count=count)
+            for (product_id, count), others in increments.items()
+            for other_id in others if (product_id, other_id) not in existing
+        ),
+        batch_size=5000,
+    )
+    for (product_id, count), others in increments.items():
+        others = [other_id for other_id in others if (product_id, other_id) in existing]
+        if others:
+            ProductCooccurrence.objects.filter(product_id=product_id, other_id__in=others).update(count=F('count') + count)
+    return affected
+
+
+def rerank(product_ids, k):
+    for chunk in chunked(product_ids):
+        rows = (
+            ProductCooccurrence.objects.filter(product_id__in=chunk).order_by('product_id', '-count', 'other_id')
+            .values_list('product_id', 'count', 'other_id')
+        )
+        ProductRecommendation.objects.filter(product_id__in=chunk).delete()
+        ProductRecommendation.objects.bulk_create(
+            row
+            for product_id, group in groupby(rows.iterator(chunk_size=5000), key=lambda row: row[0])
+            for row in recommendation_rows(product_id, [(count, other_id) for _, count, other_id in islice(group, k)])
+        )
+
+
+def refresh(k=10, chunk_size=5000):
+    """Fold in orders settled since the last run and re-rank only the products they touched."""
+    with transaction.atomic():
+        # Locked, so two runs can't both count the same orders
+        checkpoint, _ = JobCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT)
+        last_item = settled_position(checkpoint.position)
+        if last_item <= checkpoint.position:
+            return 0, 0
+
+        # Checkout bulk-creates all of an order's items together, so new orders never straddle the checkpoint.
+        new_items = OrderItem.objects.filter(id__gt=checkpoint.position, id__lte=last_item)
+        counts = count_pairs(order_baskets(new_items, chunk_size))
+        affected = add_counts(counts)
+        rerank(affected, k)
+        checkpoint.position = last_item
+        checkpoint.save()
+    cache.delete_many([cache_key(product_id) for product_id in affected])
+    return len(counts), len(affected)
+
+
+def recommended_ids(product_id):
+    ids = cache.get(cache_key(product_id))
+    if ids is None:
+        ids = list(ProductRecommendation.objects.filter(product_id=product_id).values_list('recommended_id', flat=True))
+        cache.set(cache_key(product_id), ids, CACHE_TIMEOUT)
+    return ids
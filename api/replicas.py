@@ -0,0 +1,88 @@
+"""
+Read-replica routing.
+
+Views that opt in with ReplicaReadMixin send their safe (GET/HEAD) queries to one of
+settings.DATABASE_REPLICAS for the rest of the request. Everything else, including
+authentication and all writes, uses `default`. After any write request a user is pinned to
+`default` for REPLICA_PIN_SECONDS so they always read their own cart, orders and ratings.
+
+Pins live in the Django cache, which settings_production shares between all workers. When that
+cache is the database cache table, it is always read from the primary: a replica's copy lags
+behind, which is exactly what a pin is for.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user):
+    cache.set(pin_key(user.pk), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(pin_key(user.pk)) is not None
+
+
+class ReplicaRouter:
+    """Reads go where the current request chose; writes always go to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'django_cache':  # DatabaseCache's entries
+            return 'default'
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """For APIViews whose GETs can tolerate a few seconds of replication lag."""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)  # authenticates against the primary
+        replicas = get_replicas()
+        if replicas and request.method in SAFE_METHODS and not is_pinned(request.user):
+            _read_alias.set(random.choice(replicas))
+
+
+class ReplicaPinMiddleware:
+    """Pins a user to the primary after any successful write request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF copies the user it authenticated (e.g. from the JWT) onto the Django request.
+        user = getattr(request, 'user', None)
+        if (request.method not in SAFE_METHODS and response.status_code < 400 and get_replicas()
+                and user is not None and user.is_authenticated):
+            pin_to_primary(user)
+        return response
@@ -0,0 +1,187 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from . import printqueue
+from .bootstrap import invalidate_users
+from .inventory import restock_order
+from .pickup import release_order_slot
+from .printjobs import schedule_print_jobs
+from .models import (
+    ArchivedOrder, ArchivedPrintOrder, Order, OrderItem, OrderStatusHourly, PrintDailyVolume, PrintOrder, PrintOrderFile,
+    Product, ProductDailySales,
+)
+
+
+PRINTED_STATUSES = {'printed', 'delivered'}  # Statuses whose pages have come off the printer
+
+
+def local_day(dt):
+    return timezone.localtime(dt).date()
+
+
+def local_hour(dt):
+    return timezone.localtime(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def bump(model, keys, **deltas):
+    """Add `deltas` to the rollup row identified by `keys`, creating it on first use."""
+    increments = {field: F(field) + delta for field, delta in deltas.items()}
+    with transaction.atomic():
+        if model.objects.filter(**keys).update(**increments):
+            return
+        try:
+            with transaction.atomic():
+                model.objects.create(**keys, **deltas)
+        except IntegrityError:  # another worker created it first
+            model.objects.filter(**keys).update(**increments)
+
+
+def add_sales(day, lines, sign=1):
+    """`lines` maps product_id -> (quantity, revenue) for a single order."""
+    for product_id, (quantity, revenue) in lines.items():
+        bump(ProductDailySales, {'product_id': product_id, 'day': day},
+             quantity=sign * quantity, revenue=sign * revenue, orders=sign)
+
+
+def order_lines(order_id):
+    lines = OrderItem.objects.filter(order_id=order_id).values('product_id').annotate(
+        quantity=Sum('quantity'), revenue=Sum('price'),
+    )
+    return {line['product_id']: (line['quantity'], line['revenue']) for line in lines}
+
+
+def record_order_created(order, items):
+    """Call after checkout with the OrderItems that were just created."""
+    lines = defaultdict(lambda: [0, 0])
+    for item in items:
+        lines[item.product_id][0] += item.quantity
+        lines[item.product_id][1] += item.price  # OrderItem.price is the line total
+    add_sales(local_day(order.created_at), lines)
+    bump(OrderStatusHourly, {'hour': local_hour(order.created_at), 'status': order.status}, count=1)
+
+
+def record_order_transition(order_id, created_at, old_status, new_status, at=None):
+    """Count the transition; returns False if un-cancelling the order cost it its (since full) pickup slot."""
+    if old_status == new_status:
+        return True
+    bump(OrderStatusHourly, {'hour': local_hour(at or timezone.now()), 'status': new_status}, count=1)
+    if 'cancelled' in (old_status, new_status):
+        # Sales stay attributed to the day the order was placed, net of cancellations.
+        add_sales(local_day(created_at), order_lines(order_id), sign=-1 if new_status == 'cancelled' else 1)
+        restock_order(order_id, sign=1 if new_status == 'cancelled' else -1)
+        return release_order_slot(order_id, sign=1 if new_status == 'cancelled' else -1)
+    return True
+
+
+def record_print_transition(print_order_id, old_status, new_status, at=None):
+    """Count a job (and its pages) when it is first printed; uncount it if that is reverted."""
+    was_printed, is_printed = old_status in PRINTED_STATUSES, new_status in PRINTED_STATUSES
+    if was_printed == is_printed:
+        return
+    pages = PrintOrderFile.objects.filter(print_order_id=print_order_id).aggregate(total=Sum('page_count'))['total'] or 0
+    sign = 1 if is_printed else -1
+    bump(PrintDailyVolume, {'day': local_day(at or timezone.now())}, jobs=sign, pages=sign * pages)
+
+
+def transition_orders(queryset, new_status):
+    """Bulk status change for the admin actions, recording each real transition. Returns the ids of orders that lost their pickup slot."""
+    changed = list(queryset.exclude(status=new_status).values_list('id', 'created_at', 'status'))
+    queryset.update(status=new_status)
+    invalidate_users(Order.objects.filter(id__in=[row[0] for row in changed]).values_list('user_id', flat=True))
+    return [
+        order_id for order_id, created_at, old_status in changed
+        if not record_order_transition(order_id, created_at, old_status, new_status)
+    ]
+
+
+def transition_print_orders(queryset, new_status):
+    changed = list(queryset.exclude(status=new_status).values_list('id', 'status'))
+    queryset.update(status=new_status)
+    invalidate_users(PrintOrder.objects.filter(id__in=[row[0] for row in changed]).values_list('user_id', flat=True))
+    for print_order_id, old_status in changed:
+        record_print_transition(print_order_id, old_status, new_status)
+    if new_status in PRINTED_STATUSES:
+        printqueue.record_printed([row[0] for row in changed if row[1] in printqueue.WAITING_STATUSES])
+    transaction.on_commit(printqueue.refresh)  # one walk for the whole batch rather than a shift per order
+    if new_status == 'confirmed':
+        schedule_print_jobs([row[0] for row in changed])
+
+
+def rebuild_rollups(chunk_size=5000):
+    """
+    Recompute every rollup from the order tables and the archive (archive_history moves old
+    orders out of the live tables, and their history must survive a rebuild). Exact for sales;
+    status history is not stored anywhere else, so each order is counted once under its current
+    status in the hour it was placed, and print volume under the day the job was placed.
+    Archived sales of products deleted since are left out, as they have nowhere to go.
+    """
+    sales = defaultdict(lambda: [0, Decimal('0.00'), 0])  # (day, product_id) -> quantity, revenue, orders
+    statuses = defaultdict(int)  # (hour, status) -> orders
+    printed = defaultdict(lambda: [0, 0])  # day -> jobs, pages
+
+    live_sales = (
+        OrderItem.objects.exclude(order__status='cancelled')
+        .annotate(day=TruncDate('order__created_at'))
+        .values_list('day', 'product_id')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('price'), orders=Count('order_id', distinct=True))
+    )
+    for day, product_id, quantity, revenue, orders in live_sales.iterator(chunk_size=chunk_size):
+        sales[day, product_id] = [quantity, revenue, orders]
+    live_statuses = Order.objects.annotate(hour=TruncHour('created_at')).values_list('hour', 'status').annotate(count=Count('id'))
+    for hour, status, count in live_statuses.iterator(chunk_size=chunk_size):
+        statuses[hour, status] = count
+    live_printed = (
+        PrintOrder.objects.filter(status__in=PRINTED_STATUSES)
+        .annotate(day=TruncDate('created_at'))
+        .values_list('day')
+        .annotate(jobs=Count('id', distinct=True), pages=Sum('files__page_count'))
+    )
+    for day, jobs, pages in live_printed:
+        printed[day] = [jobs, pages or 0]
+
+    products = set(Product.objects.values_list('id', flat=True))
+    archived = ArchivedOrder.objects.values_list('created_at', 'status', 'items')
+    for created_at, status, items in archived.iterator(chunk_size=chunk_size):
+        statuses[local_hour(created_at), status] += 1
+        if status == 'cancelled':
+            continue
+        day = local_day(created_at)
+        lines = defaultdict(lambda: [0, Decimal('0.00')])
+        for item in items:
+            lines[item['product_id']][0] += item['quantity']
+            lines[item['product_id']][1] += Decimal(item['price'])
+        for product_id, (quantity, revenue) in lines.items():
+            if product_id in products:
+                row = sales[day, product_id]
+                row[0] += quantity
+                row[1] += revenue
+                row[2] += 1
+    archived_printed = ArchivedPrintOrder.objects.filter(status__in=PRINTED_STATUSES).values_list('created_at', 'files')
+    for created_at, files in archived_printed.iterator(chunk_size=chunk_size):
+        row = printed[local_day(created_at)]
+        row[0] += 1
+        row[1] += sum(upload['page_count'] for upload in files)
+
+    with transaction.atomic():
+        ProductDailySales.objects.all().delete()
+        OrderStatusHourly.objects.all().delete()
+        PrintDailyVolume.objects.all().delete()
+        ProductDailySales.objects.bulk_create(
+            (
+                ProductDailySales(day=day, product_id=product_id, quantity=quantity, revenue=revenue, orders=orders)
+                for (day, product_id), (quantity, revenue, orders) in sales.items()
+            ),
+            batch_size=chunk_size,
+        )
+        OrderStatusHourly.objects.bulk_create(
+            (OrderStatusHourly(hour=hour, status=status, count=count) for (hour, status), count in statuses.items()),
+            batch_size=chunk_size,
+        )
+        PrintDailyVolume.objects.bulk_create(
+            PrintDailyVolume(day=day, jobs=jobs, pages=pages) for day, (jobs, pages) in printed.items()
+        )
@@ -0,0 +1,134 @@
+"""
+Student rosters and automatic verification.
+
+Staff upload the term's roster as CSV (registration number, email). It is streamed into
+RosterEntry in batches, upserting on the registration number, and every unverified account
+whose username is a listed registration number AND whose email is that entry's email is then
+verified with batched UPDATEs. Accounts registered later are checked against the roster as
+they are inserted (see signals.py), through the unique/indexed roster columns.
+
+Registrants type in both values and emails aren't confirmed, so one matching value proves
+nothing: accounts matching only by number or only by email stay unverified, and staff find them
+with the user admin's roster filter (partial_matches) to confirm by hand.
+"""
+import csv
+import io
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Lower, Upper
+
+from .models import CustomUser, Roster, RosterEntry
+
+
+# Roster column -> header names registrars use for it (compared case-insensitively)
+ROSTER_COLUMNS = {
+    'registration_number': ('registration_number', 'registration number', 'registration no', 'reg no', 'reg_no',
+                            'regno', 'roll no', 'roll_number', 'enrollment no', 'enrolment no'),
+    'email': ('email', 'email address', 'e-mail', 'email id'),
+}
+BATCH_SIZE = 1000
+
+
+class RosterFormatError(ValueError):
+    pass
+
+
+def normalize(registration_number, email):
+    return registration_number.strip().upper(), email.strip().lower()
+
+
+def roster_rows(text_file):
+    """Yield (registration_number, email) from a CSV roster, normalized and skipping rows without a number."""
+    reader = csv.reader(text_file)
+    header = [name.strip().lower() for name in next(reader, [])]
+    positions = {}
+    for column, names in ROSTER_COLUMNS.items():
+        positions[column] = next((header.index(name) for name in names if name in header), None)
+    if positions['registration_number'] is None:
+        raise RosterFormatError("The roster needs a registration number column.")
+
+    for row in reader:
+        if positions['registration_number'] >= len(row):
+            continue
+        email = row[positions['email']] if positions['email'] is not None and positions['email'] < len(row) else ''
+        registration_number, email = normalize(row[positions['registration_number']], email)
+        if registration_number:
+            yield registration_number, email
+
+
+def save_entries(roster, batch):
+    # One row per number: an upsert can't touch the same row twice in a statement
+    entries = [
+        RosterEntry(roster=roster, registration_number=registration_number, email=email)
+        for registration_number, email in batch.items()
+    ]
+    RosterEntry.objects.bulk_create(
+        entries, update_conflicts=True, unique_fields=['registration_number'], update_fields=['roster', 'email'],
+    )
+    return len(entries)
+
+
+def import_roster(binary_file, name, user=None):
+    """Stream a CSV roster into RosterEntry, then verify the accounts it lists."""
+    text_file = io.TextIOWrapper(binary_file, encoding='utf-8-sig', errors='replace', newline='')
+    batch = {}
+    count = 0
+    with transaction.atomic():
+        roster = Roster.objects.create(name=name[:255], uploaded_by=user)
+        for registration_number, email in roster_rows(text_file):
+            batch[registration_number] = email
+            if len(batch) == BATCH_SIZE:
+                count += save_entries(roster, batch)
+                batch = {}
+        count += save_entries(roster, batch)
+        roster.entry_count = count
+        roster.verified_count = verify_matches()
+        roster.save(update_fields=['entry_count', 'verified_count'])
+    return roster
+
+
+def unverified_matches():
+    """Unverified accounts whose registration number (username) and email are the same roster entry's."""
+    entry = RosterEntry.objects.filter(
+        registration_number=Upper(OuterRef('username')), email=Lower(OuterRef('email')),
+    ).exclude(email='')
+    return CustomUser.objects.filter(is_verified=False).filter(Exists(entry))
+
+
+def partial_matches():
+    """Unverified accounts the roster lists by number or by email, but not both: for staff to check."""
+    by_number = RosterEntry.objects.filter(registration_number=Upper(OuterRef('username')))
+    by_email = RosterEntry.objects.filter(email=Lower(OuterRef('email'))).exclude(email='')
+    return CustomUser.objects.filter(is_verified=False).filter(Exists(by_number) | Exists(by_email)).exclude(
+        pk__in=unverified_matches().values('pk'),
+    )
+
+
+def verify_matches(batch_size=BATCH_SIZE):
+    """Verify every matching account, batch_size rows per UPDATE; returns how many were verified."""
+    matches = unverified_matches().order_by('pk').values_list('pk', flat=True)
+    verified = 0
+    while True:
+        pks = list(matches[:batch_size])
+        if not pks:
+            return verified
+        verified += CustomUser.objects.filter(pk__in=pks, is_verified=False).update(is_verified=True)
+
+
+def is_enrolled(username, email):
+    """Whether one roster entry lists both the registration number and the email."""
+    registration_number, email = normalize(username or '', email or '')
+    if not registration_number or not email:
+        return False
+    return RosterEntry.objects.filter(registration_number=registration_number, email=email).exists()
+
+
+def roster_summary(roster):
+    return {
+        'id': roster.pk,
+        'name': roster.name,
+        'uploaded_at': roster.uploaded_at,
+        'entries': roster.entry_count,
+        'verified': roster.verified_count,
+    }
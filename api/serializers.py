@@ -2,7 +2,10 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.exceptions import AuthenticationFailed
-from .models import Cart, Product, Order, OrderItem,Category,PrintOrder,PrintOrderFile,Rating,OrderAddress
+from .models import Cart, Product, Order, OrderItem,Category,PrintOrder,PrintOrderFile,Rating,OrderAddress,PickupSlot
+from .images import rendition_urls
+from .previews import preview_urls
+from .hashing import make_password
 
 
 User = get_user_model()
@@ -21,13 +24,15 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         fields = ['username', 'email', 'password', 'phone_number', 'full_name']  # Add full_name here
 
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
+        # What create_user() does, but with the password hashed in the hashing pool
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data['email']),
             phone_number=validated_data.get('phone_number', ''),
             full_name=validated_data.get('full_name', '')  # Handle full_name
         )
+        user.password = make_password(validated_data['password'])
+        user.save()
         return user
 
 class ForgotPasswordSerializer(serializers.Serializer):
@@ -48,6 +53,15 @@ class ForgotPasswordSerializer(serializers.Serializer):
         return data
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    def validate(self, attrs):
+        try:
+            return super().validate(attrs)
+        except AuthenticationFailed:
+            busy = getattr(self.context.get('request'), 'hashing_busy', None)  # set by PooledModelBackend
+            if busy is not None:
+                raise busy
+            raise
+
     @classmethod
     def get_token(cls, user):
         # Check if the user is verified before issuing a token
@@ -68,10 +82,14 @@ class CategorySerializer(serializers.ModelSerializer):
 
 class ProductSerializer(serializers.ModelSerializer):
     category = CategorySerializer()  # Include full category details
+    image_renditions = serializers.SerializerMethodField()  # Resized WebP/JPEG versions of `image`
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['image_hash']
+
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj.image_hash, self.context.get('request'))
 
 
 
@@ -107,16 +125,23 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['product', 'quantity', 'price']
 
 
+class PickupSlotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PickupSlot
+        fields = ['id', 'date', 'start_time', 'end_time']
+
+
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)  # Include order items
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     payment_status = serializers.ChoiceField(choices=Order.PAYMENT_CHOICES)  # Allow payment status update
     transaction_id = serializers.CharField(required=False, allow_null=True, allow_blank=True)  # Fix here
     order_address = OrderAddressSerializer()  # Include address details in response
+    pickup_slot = PickupSlotSerializer(read_only=True)
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'total_price', 'status', 'payment_status', 'transaction_id', 'created_at', 'items', 'order_address']
+        fields = ['id', 'user', 'total_price', 'status', 'payment_status', 'transaction_id', 'created_at', 'items', 'order_address', 'pickup_slot']
         read_only_fields = ['user', 'total_price', 'status', 'created_at', 'items']
 
     def update(self, instance, validated_data):
@@ -136,9 +161,14 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class PrintOrderFileSerializer(serializers.ModelSerializer):
+    previews = serializers.SerializerMethodField()  # Thumbnail URLs, first page first; empty until rendered
+
     class Meta:
         model = PrintOrderFile
-        fields = ["id", "file"]
+        fields = ["id", "file", "previews"]
+
+    def get_previews(self, obj):
+        return preview_urls(obj.preview_hash, obj.preview_pages, self.context.get('request'))
 
 class PrintOrderSerializer(serializers.ModelSerializer):
     files = PrintOrderFileSerializer(many=True, read_only=True)  # Handle multiple files
@@ -149,9 +179,10 @@ class PrintOrderSerializer(serializers.ModelSerializer):
             "id", "files", "paper_size", "color_mode", "print_sides",
             "binding_option", "urgency", "additional_notes",
             "total_price", "created_at", "status", "payment_status",
-            "transaction_id"  # Added transaction_id
+            "transaction_id",  # Added transaction_id
+            "pages_per_sheet", "queue_position", "estimated_ready_at",
         ]
-        read_only_fields = ["id", "created_at", "status"]
+        read_only_fields = ["id", "created_at", "status", "queue_position", "estimated_ready_at"]
 
 
 
@@ -166,7 +197,8 @@ class RatingSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'title', 'created_at']  
 
     def create(self, validated_data):
-        """Auto-assign user from request."""
+        """Auto-assign user from request; a user rating the same product again updates their rating."""
         user = self.context['request'].user
-        validated_data['user'] = user
-        return super().create(validated_data)
\ No newline at end of file
+        product = validated_data.pop('product')
+        rating, self.created = Rating.objects.update_or_create(user=user, product=product, defaults=validated_data)
+        return rating
\ No newline at end of file
@@ -0,0 +1,74 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import bootstrap, discounts, inventory, printqueue, roster, suggest
+from .models import Cart, Category, CustomUser, Discount, Order, PrintOrder, PrintOrderFile, Product
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    suggest.product_changed(instance)
+    inventory.stock_changed(instance)
+    bootstrap.invalidate_carts_holding([instance.pk])  # cached carts show its price and stock
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    bootstrap.invalidate_carts_holding([instance.pk])  # its cart lines go with it, without signals
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    suggest.product_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    suggest.category_changed()
+    bootstrap.invalidate_categories()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    if not created:
+        bootstrap.invalidate_carts_in_category(instance.pk)  # cached cart lines show the category's name
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=PrintOrder)
+def user_data_changed(sender, instance, **kwargs):
+    bootstrap.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=PrintOrderFile)
+def print_file_saved(sender, instance, created, **kwargs):
+    if created:
+        bootstrap.invalidate_user(instance.print_order.user_id)
+        printqueue.schedule_sync(instance.print_order_id)  # its pages add to the wait of everyone behind it
+
+
+@receiver(post_save, sender=PrintOrder)
+def print_queue_changed(sender, instance, **kwargs):
+    printqueue.schedule_sync(instance.pk)
+
+
+@receiver(pre_delete, sender=PrintOrder)
+def print_order_deleting(sender, instance, **kwargs):
+    printqueue.schedule_removal(instance)
+
+
+@receiver(pre_save, sender=CustomUser)
+def verify_enrolled_user(sender, instance, raw=False, **kwargs):
+    """New accounts whose registration number and email match one roster entry start out verified."""
+    if instance._state.adding and not raw and not instance.is_verified:
+        instance.is_verified = roster.is_enrolled(instance.username, instance.email)
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+@receiver(m2m_changed, sender=Discount.products.through)
+@receiver(m2m_changed, sender=Discount.categories.through)
+def discount_changed(sender, **kwargs):
+    discounts.bump_version()
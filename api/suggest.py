@@ -0,0 +1,220 @@
+"""
+In-memory prefix index behind /api/products/suggest/.
+
+Every word of a product's name and category is stored as a (token, product id) pair in
+one sorted list, so a prefix lookup is a bisect followed by a short forward scan. Results are
+ranked by units sold (from the ProductDailySales rollup) and memoised per prefix until the
+index changes. Product updates collect their added and removed pairs and are merged into the
+sorted list in one pass by the next lookup, so a burst of saves doesn't shift the list per token.
+
+Each worker process keeps its own index. Product/Category signals (and import_catalog, which
+runs in a process of its own) update it in place and bump a version in the shared cache; other
+workers notice the new version, checking it at most every SUGGEST_VERSION_CHECK_SECONDS rather
+than on every keystroke, and rebuild. A version that went missing from the cache (evicted,
+or the cache was cleared) also means a rebuild, and a new one starts from the clock, so it can't
+collide with a version a worker already holds.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .fast_serializers import money
+from .models import Product, ProductDailySales
+
+
+VERSION_KEY = 'suggest-index-version'
+POPULARITY_TTL = 15 * 60  # Seconds between popularity refreshes
+RESULT_CACHE_SIZE = 5000
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return WORD_RE.findall(text.casefold())
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.keys = []  # sorted [(token, product_id)]
+        self.added = set()  # pairs not merged into keys yet
+        self.removed = set()  # pairs still in keys that no longer belong there
+        self.products = {}  # product_id -> (name, price, sale_price, tokens)
+        self.popularity = {}
+        self.results = {}
+        self.version = None
+        self.built_at = 0
+        self.checked_at = 0
+
+    def build(self):
+        with self.lock:
+            self.version = cache.get_or_set(VERSION_KEY, new_version, None)
+            products = {}
+            keys = []
+            rows = Product.objects.values_list('id', 'name', 'price', 'sale_price', 'category__name')
+            for pk, name, price, sale_price, category_name in rows.iterator(chunk_size=5000):
+                entry = self.make_entry(name, price, sale_price, category_name)
+                products[pk] = entry
+                keys.extend((token, pk) for token in entry[3])
+            keys.sort()
+            self.products, self.keys = products, keys
+            self.added, self.removed = set(), set()
+            self.checked_at = time.monotonic()
+            self.refresh_popularity()
+
+    def refresh_popularity(self):
+        self.popularity = dict(
+            ProductDailySales.objects.values('product_id').annotate(units=Sum('quantity')).values_list('product_id', 'units')
+        )
+        self.results = {}
+        self.built_at = time.monotonic()
+
+    def make_entry(self, name, price, sale_price, category_name):
+        tokens = frozenset(tokenize(name) + tokenize(category_name or ''))
+        return (name, money(price), money(sale_price), tokens)
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        if self.version is None or now - self.checked_at >= check_interval():
+            self.checked_at = now
+            version = cache.get(VERSION_KEY)
+            if version is None or version != self.version:
+                self.build()
+                return
+        if now - self.built_at > POPULARITY_TTL:
+            with self.lock:
+                self.refresh_popularity()
+
+    def update(self, pk, name, price, sale_price, category_name):
+        with self.lock:
+            self.discard(pk)
+            entry = self.make_entry(name, price, sale_price, category_name)
+            self.products[pk] = entry
+            for token in entry[3]:
+                key = (token, pk)
+                if key in self.removed:
+                    self.removed.discard(key)
+                else:
+                    self.added.add(key)
+            self.forget_results(entry[3])
+
+    def discard(self, pk):
+        with self.lock:
+            entry = self.products.pop(pk, None)
+            if entry is None:
+                return
+            for token in entry[3]:
+                key = (token, pk)
+                if key in self.added:
+                    self.added.discard(key)
+                else:
+                    self.removed.add(key)
+            self.forget_results(entry[3])
+
+    def merge_pending(self):
+        """Fold the pairs collected by update/discard into the sorted list, in one pass."""
+        if self.added or self.removed:
+            removed = self.removed
+            kept = (key for key in self.keys if key not in removed) if removed else self.keys
+            self.keys = list(heapq.merge(kept, sorted(self.added)))
+            self.added, self.removed = set(), set()
+
+    def forget_results(self, tokens):
+        """Drop only the memoised queries a product with these tokens could appear in."""
+        self.results = {
+            key: result for key, result in self.results.items()
+            if not any(token.startswith(word) for word in key[0].split() for token in tokens)
+        }
+
+    def prefix_ids(self, prefix):
+        ids = set()
+        keys = self.keys
+        i = bisect.bisect_left(keys, (prefix,))
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            ids.add(keys[i][1])
+            i += 1
+        return ids
+
+    def search(self, query, limit=8):
+        words = tokenize(query)
+        if not words:
+            return []
+        cache_key = (' '.join(words), limit)
+        cached = self.results.get(cache_key)
+        if cached is not None:
+            return cached
+        with self.lock:
+            return self.rank(words, limit, cache_key)
+
+    def rank(self, words, limit, cache_key):
+        self.merge_pending()
+        longest = max(words, key=len)  # the most selective word drives the scan
+        others = [word for word in words if word is not longest]
+        products = self.products
+        ids = [
+            pk for pk in self.prefix_ids(longest)
+            if all(any(token.startswith(word) for token in products[pk][3]) for word in others)
+        ]
+        popularity = self.popularity
+        top = heapq.nsmallest(limit, ids, key=lambda pk: (-popularity.get(pk, 0), products[pk][0]))
+        result = [
+            {'id': pk, 'name': products[pk][0], 'price': products[pk][1], 'sale_price': products[pk][2]}
+            for pk in top
+        ]
+        if len(self.results) >= RESULT_CACHE_SIZE:
+            self.results = {}
+        self.results[cache_key] = result
+        return result
+
+
+index = SuggestIndex()
+
+
+def check_interval():
+    return getattr(settings, 'SUGGEST_VERSION_CHECK_SECONDS', 2)
+
+
+def suggest(query, limit=8):
+    index.ensure_fresh()
+    return index.search(query, limit)
+
+
+def new_version():
+    return time.time_ns()
+
+
+def bump_version():
+    """Tell every worker its index is stale (also call this after bulk catalog changes). Returns the new version."""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        version = new_version()
+        cache.set(VERSION_KEY, version, None)
+        return version
+
+
+def product_changed(product):
+    previous = index.version
+    version = bump_version()
+    if previous is not None and version == previous + 1:  # nobody else changed the catalog meanwhile
+        category_name = product.category.name if product.category_id else ''
+        index.update(product.pk, product.name, product.price, product.sale_price, category_name)
+        index.version = version
+
+
+def product_deleted(pk):
+    previous = index.version
+    version = bump_version()
+    if previous is not None and version == previous + 1:
+        index.discard(pk)
+        index.version = version
+
+
+def category_changed():
+    """A rename touches every product in the category; rebuild lazily on the next request."""
+    bump_version()
@@ -1,3 +1,974 @@
-from django.test import TestCase
+import importlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api import (
+    archive, bootstrap, changelists, compression, discounts, hashing, housekeeping, images, inventory, payments, printjobs,
+    printqueue, recommendations, renderers, replicas, reporting, roster, suggest, workers,
+)
+from api.models import (
+    ArchivedOrder, Cart, Category, Discount, JobCheckpoint, Order, OrderItem, OrderStatusHourly, PickupSlot, PrintDailyVolume,
+    PrintJob, PrintOrder, PrintOrderFile, Product, ProductCooccurrence, ProductDailySales, Rating, Roster, RosterEntry,
+)
+from api.previews import preview_path
+from api.serializers import ProductSerializer
+
+
+PREVIEW_HASH = 'ab' * 20
+
+
+class MediaTestCase(TestCase):
+    """Serves a throwaway MEDIA_ROOT holding a print upload, its preview and a product image."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root, MEDIA_SENDFILE_BACKEND=None)
+        cls.settings_override.enable()
+        for name in ('print_orders/x.pdf', 'product_images/p.jpg', preview_path(PREVIEW_HASH, 1)):
+            os.makedirs(os.path.join(cls.media_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(cls.media_root, name), 'wb') as fh:
+                fh.write(b'%PDF-1.4 private')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root)
+        super().tearDownClass()
+
+
+class MediaTraversalTests(MediaTestCase):
+    """Private uploads stay private however the path is spelled."""
+
+    def test_plain_path_needs_login(self):
+        self.assertEqual(self.client.get('/media/print_orders/x.pdf').status_code, 401)
+
+    def test_dot_segment(self):
+        self.assertEqual(self.client.get('/media/./print_orders/x.pdf').status_code, 401)
+
+    def test_parent_segment(self):
+        self.assertEqual(self.client.get('/media/product_images/../print_orders/x.pdf').status_code, 401)
+
+    def test_encoded_parent_segment(self):
+        self.assertEqual(self.client.get('/media/product_images/%2e%2e/print_orders/x.pdf').status_code, 401)
+
+    def test_public_file_still_served(self):
+        response = self.client.get('/media/product_images/p.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=86400')
+
+
+class PreviewAccessTests(MediaTestCase):
+    """Previews of a print upload are as private as the upload."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'x')
+        self.other = User.objects.create_user('other', 'other@example.com', 'x')
+        order = PrintOrder.objects.create(
+            user=self.owner, paper_size='A4', color_mode='color', print_sides='single',
+            binding_option='none', urgency='standard', total_price=10,
+        )
+        PrintOrderFile.objects.create(print_order=order, file='print_orders/x.pdf', page_count=1, preview_hash=PREVIEW_HASH)
+        self.url = '/media/' + preview_path(PREVIEW_HASH, 1)
+
+    def test_anonymous(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_other_user(self):
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_owner(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+
+class RosterVerificationTests(TestCase):
+    """Only the registration number and email of one roster entry together verify an account."""
+
+    def setUp(self):
+        roster_upload = Roster.objects.create(name='Term roster')
+        RosterEntry.objects.create(roster=roster_upload, registration_number='21BCE001', email='first@campus.edu')
+
+    def register(self, username, email):
+        return get_user_model().objects.create_user(username, email, 'x')
+
+    def test_number_and_email(self):
+        self.assertTrue(self.register('21bce001', 'First@campus.edu').is_verified)
+
+    def test_number_only(self):
+        self.assertFalse(self.register('21BCE001', 'someone@else.com').is_verified)
+
+    def test_email_only(self):
+        self.assertFalse(self.register('impostor', 'first@campus.edu').is_verified)
+
+    def test_verify_matches(self):
+        User = get_user_model()
+        User.objects.bulk_create([
+            User(username='21BCE001', email='first@campus.edu'),
+            User(username='impostor', email='someone@else.com'),
+        ])
+        RosterEntry.objects.create(roster=Roster.objects.get(), registration_number='IMPOSTOR', email='real@campus.edu')
+        self.assertEqual(roster.verify_matches(), 1)
+        self.assertEqual(list(roster.partial_matches().values_list('username', flat=True)), ['impostor'])
+
+
+class BootstrapInvalidationTests(TestCase):
+    """A cached bootstrap cart goes when the price or stock it shows changes."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x')
+        category = Category.objects.create(name='Stationery')
+        self.product = Product.objects.create(
+            name='Pen', short_description='s', full_description='f', price=10, available_quantity=5, category=category,
+        )
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        cache.set(bootstrap.user_key(self.user.pk), {'host': 'testserver', 'sections': {}})
+
+    def assertDropped(self):
+        self.assertIsNone(cache.get(bootstrap.user_key(self.user.pk)))
+
+    def test_product_saved(self):
+        self.product.sale_price = 8
+        self.product.save()
+        self.assertDropped()
+
+    def test_product_deleted(self):
+        self.product.delete()
+        self.assertDropped()
+
+    def test_category_renamed(self):
+        category = self.product.category
+        category.name = 'Office'
+        category.save()
+        self.assertDropped()
+
+    def test_cart_expired(self):
+        Cart.objects.update(updated_at=timezone.now() - timedelta(days=365))
+        with self.captureOnCommitCallbacks(execute=True):
+            list(housekeeping.expire_carts(100))
+        self.assertFalse(Cart.objects.exists())
+        self.assertDropped()
+
+
+class DiscountRulesTests(TestCase):
+    """Workers don't price with rules the admin has changed since they compiled them."""
+
+    def test_recompiled_after_max_age(self):
+        discount = Discount.objects.create(name='Welcome', code='HELLO', kind=Discount.PERCENT, value=10)
+        self.assertIn('HELLO', discounts.current_rules().coupons)
+        cache.set(discounts.VERSION_KEY, discounts.current_rules().version)  # as if this worker missed the bump
+        Discount.objects.filter(pk=discount.pk).update(is_active=False)
+        with override_settings(DISCOUNT_RULES_MAX_AGE=0):
+            self.assertNotIn('HELLO', discounts.current_rules().coupons)
+
+    def test_lost_version(self):
+        old = discounts.current_rules()
+        cache.delete(discounts.VERSION_KEY)
+        rules = discounts.current_rules()
+        self.assertIsNot(rules, old)
+        self.assertNotEqual(rules.version, old.version)
+
+
+class ImportCatalogTests(TestCase):
+    def test_missing_columns_keep_current_values(self):
+        category = Category.objects.create(name='Stationery')
+        Product.objects.create(
+            name='Pen', short_description='s', full_description='f', price=10, available_quantity=5, sale_price=8,
+            category=category,
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fh:
+            fh.write('name,category,price\nPen,Stationery,12.00\nPencil,Stationery,3.00\n')
+        self.addCleanup(os.remove, fh.name)
+        call_command('import_catalog', fh.name, stdout=io.StringIO())
+        pen, pencil = Product.objects.order_by('name')
+        self.assertEqual((pen.price, pen.available_quantity, pen.sale_price), (12, 5, 8))
+        self.assertEqual((pencil.available_quantity, pencil.sale_price), (0, None))
+
+
+    def import_file(self, suffix, content):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as fh:
+            fh.write(content)
+        self.addCleanup(os.remove, fh.name)
+        call_command('import_catalog', fh.name, stdout=io.StringIO())
+
+    def test_invalid_rows_name_their_line(self):
+        rows = (
+            '{"name": "Pen", "category": "Stationery", "price": 1}\n'
+            '{"name": "Mug", "category": null, "price": 2}\n'
+        )
+        with self.assertRaisesMessage(CommandError, 'line 2'):
+            self.import_file('.jsonl', rows)
+        with self.assertRaisesMessage(CommandError, 'line 3'):
+            self.import_file('.csv', 'name,category,price,available_quantity\nPen,Stationery,1,5\nMug,Kitchen,2,-1\n')
+        self.assertFalse(Product.objects.exists())
+
+    def test_new_image_needs_renditions(self):
+        self.import_file('.csv', 'name,category,price,image\nPen,Stationery,1,product_images/a.png\n')
+        Product.objects.update(image_hash='a' * 40)
+        self.import_file('.csv', 'name,category,price,image\nPen,Stationery,1,product_images/b.png\n')
+        self.assertEqual(Product.objects.get().image_hash, '')
+
+
+class RecommendationRebuildTests(TestCase):
+    def test_archived_orders_of_deleted_products(self):
+        user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x')
+        category = Category.objects.create(name='Stationery')
+        pen, pencil = (
+            Product.objects.create(name=name, short_description='s', full_description='f', price=1,
+                                   available_quantity=5, category=category)
+            for name in ('Pen', 'Pencil')
+        )
+        items = [{'product_id': pk, 'product': 'x', 'quantity': 1, 'price': '1.00'} for pk in (pen.pk, pencil.pk, 999999)]
+        for pk in (1, 2):
+            ArchivedOrder.objects.create(id=pk, user=user, total_price=3, created_at=timezone.now(), status='delivered', items=items)
+        self.assertEqual(recommendations.rebuild(), (1, 2))
+        self.assertEqual(ProductCooccurrence.objects.count(), 2)
+
+    def test_refresh_waits_for_unsettled_orders(self):
+        user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x')
+        category = Category.objects.create(name='Stationery')
+        pen, pencil, ruler = (
+            Product.objects.create(name=name, short_description='s', full_description='f', price=1,
+                                   available_quantity=5, category=category)
+            for name in ('Pen', 'Pencil', 'Ruler')
+        )
+
+        def place(*products, settled=True):
+            order = Order.objects.create(user=user, total_price=2, status='delivered')
+            OrderItem.objects.bulk_create(OrderItem(order=order, product=p, quantity=1, price=1) for p in products)
+            if settled:
+                Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(hours=1))
+            return order
+
+        def counts():
+            return dict(ProductCooccurrence.objects.filter(product=pen).values_list('other_id', 'count'))
+
+        place(pen, pencil)
+        in_progress = place(pen, ruler, settled=False)
+        place(pen, pencil)  # settled, but its items come after the unsettled order's
+        self.assertEqual(recommendations.refresh(), (1, 2))
+        self.assertEqual(counts(), {pencil.pk: 1})
+
+        Order.objects.filter(pk=in_progress.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        recommendations.refresh()
+        self.assertEqual(counts(), {pencil.pk: 2, ruler.pk: 1})
+        self.assertEqual(recommendations.recommended_ids(pen.pk), [pencil.pk, ruler.pk])
+        self.assertEqual(recommendations.refresh(), (0, 0))
+
+
+class PrintQueueTests(TestCase):
+    """The incremental queue updates agree with a full walk of the queue."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('student', 'student@example.com', 'x')
+
+    def place_order(self, pages, urgency='standard'):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = PrintOrder.objects.create(
+                user=self.user, paper_size='A4', color_mode='color', print_sides='single',
+                binding_option='none', urgency=urgency, total_price=10,
+            )
+            self.add_file(order, pages)
+        return order
+
+    def add_file(self, order, pages):
+        with self.captureOnCommitCallbacks(execute=True):
+            PrintOrderFile.objects.create(print_order=order, file='print_orders/f.pdf', page_count=pages, preview_hash='x')
+
+    def positions(self):
+        return list(PrintOrder.objects.filter(queue_position__isnull=False).order_by('queue_position').values_list('pk', 'sides'))
+
+    def assertMatchesFullWalk(self):
+        self.assertEqual(printqueue.refresh(), 0)  # nothing for the full walk to correct
+
+    def test_incremental_updates(self):
+        first = self.place_order(2)
+        second = self.place_order(1)
+        express = self.place_order(3, urgency='express')
+        self.assertEqual(self.positions(), [(express.pk, 3), (first.pk, 2), (second.pk, 1)])
+        self.assertMatchesFullWalk()
+
+        self.add_file(second, 4)
+        self.assertEqual(self.positions()[-1], (second.pk, 5))
+        self.assertMatchesFullWalk()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.status = 'printed'
+            first.save()
+        self.assertEqual(self.positions(), [(express.pk, 3), (second.pk, 5)])
+        self.assertMatchesFullWalk()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            express.delete()
+        self.assertEqual(self.positions(), [(second.pk, 5)])
+        self.assertMatchesFullWalk()
+
+
+class ReportParameterTests(TestCase):
+    def setUp(self):
+        staff = get_user_model().objects.create_user('staff', 'staff@example.com', 'x', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(staff)
+
+    def test_invalid_date(self):
+        response = self.client.get('/api/reports/sales/', {'start': '2024-13-45'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_limit(self):
+        self.assertEqual(self.client.get('/api/reports/top-products/', {'limit': 'ten'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/reports/top-products/', {'limit': '5'}).status_code, 200)
+
+
+class RollupRebuildTests(TestCase):
+    def rollups(self):
+        return (
+            sorted(ProductDailySales.objects.values_list('day', 'product_id', 'quantity', 'revenue', 'orders')),
+            sorted(OrderStatusHourly.objects.values_list('hour', 'status', 'count')),
+            sorted(PrintDailyVolume.objects.values_list('day', 'jobs', 'pages')),
+        )
+
+    def test_archived_history_kept(self):
+        user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x')
+        product = Product.objects.create(
+            name='Pen', short_description='s', full_description='f', price=10, available_quantity=5,
+            category=Category.objects.create(name='Stationery'),
+        )
+        order = Order.objects.create(user=user, total_price=20, status='delivered')
+        OrderItem.objects.create(order=order, product=product, quantity=2, price=20)
+        print_order = PrintOrder.objects.create(
+            user=user, paper_size='A4', color_mode='color', print_sides='single', binding_option='none',
+            urgency='standard', total_price=10, status='delivered',
+        )
+        PrintOrderFile.objects.create(print_order=print_order, file='print_orders/f.pdf', page_count=3, preview_hash='x')
+        reporting.rebuild_rollups()
+        before = self.rollups()
+        self.assertTrue(all(before))
+
+        cutoff = timezone.now() + timedelta(days=1)
+        list(archive.archive_orders(cutoff))
+        list(archive.archive_print_orders(cutoff))
+        reporting.rebuild_rollups()
+        self.assertEqual(self.rollups(), before)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x', is_staff=True)
+        product = Product.objects.create(
+            name='Pen', short_description='s', full_description='f', price=10, available_quantity=5,
+            category=Category.objects.create(name='Stationery'),
+        )
+        self.slot = PickupSlot.objects.create(date=timezone.localdate(), start_time='12:00', end_time='12:15', capacity=5)
+        self.order = Order.objects.create(user=self.user, total_price=18, discount=2, status='delivered', pickup_slot=self.slot)
+        item = OrderItem.objects.create(order=self.order, product=product, quantity=2, price=20)
+        reporting.record_order_created(self.order, [item])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def archive(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sum(archive.archive_orders(timezone.now() + timedelta(days=1))), 1)
+
+    def test_reports_unchanged(self):
+        reports = ('/api/reports/sales/', '/api/reports/top-products/', '/api/reports/order-status/')
+        before = [self.client.get(path).json() for path in reports]
+        self.archive()
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual([self.client.get(path).json() for path in reports], before)
+        self.assertEqual(before[0]['days'][0]['quantity'], 2)
+
+    def test_discount_and_slot_kept(self):
+        self.archive()
+        data = archive.archived_order_data(ArchivedOrder.objects.get())
+        self.assertEqual(ArchivedOrder.objects.get().discount, 2)
+        self.assertEqual(data['pickup_slot'], {
+            'id': self.slot.pk, 'date': self.slot.date.isoformat(), 'start_time': '12:00:00', 'end_time': '12:15:00',
+        })
+
+
+class StatementAmountTests(TestCase):
+    def test_non_finite_amounts(self):
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf'):
+            self.assertIsNone(payments.parse_amount(value))
+        self.assertEqual(payments.parse_amount('₹1,250.50'), Decimal('1250.50'))
+
+    def test_amount_too_large_to_store(self):
+        self.assertIsNone(payments.parse_amount('123456789.00'))
+        self.assertEqual(payments.parse_amount('99999999.99'), Decimal('99999999.99'))
+
+    def test_unreadable_csv(self):
+        statement = io.StringIO('utr,amount\nUTR1,10\nUTR2,"' + 'x' * 200000 + '"\n')
+        with self.assertRaises(payments.StatementFormatError):
+            list(payments.statement_rows(statement))
+
+    def test_transaction_id(self):
+        self.assertEqual(payments.clean_transaction_id(412345678901), '412345678901')
+        self.assertEqual(payments.clean_transaction_id(' UTR1 '), 'UTR1')
+        self.assertIsNone(payments.clean_transaction_id(''))
+        for value in (True, 1.5, {'id': 1}, ['UTR1']):
+            with self.assertRaises(ValueError):
+                payments.clean_transaction_id(value)
+
+
+class PickupSlotTests(TestCase):
+    def test_uncancel_into_full_slot(self):
+        user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x')
+        slot = PickupSlot.objects.create(date=timezone.localdate(), start_time='12:00', end_time='12:15', capacity=1, booked=1)
+        order = Order.objects.create(user=user, total_price=10, pickup_slot=slot)
+        self.assertTrue(reporting.record_order_transition(order.pk, order.created_at, 'pending', 'cancelled'))
+        PickupSlot.objects.filter(pk=slot.pk).update(booked=1)  # someone else took the freed place
+        self.assertFalse(reporting.record_order_transition(order.pk, order.created_at, 'cancelled', 'pending'))
+        slot.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual(slot.booked, 1)
+        self.assertIsNone(order.pickup_slot)
+
+    def test_invalid_date(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x'))
+        self.assertEqual(client.get('/api/pickup-slots/', {'date': '2024-13-45'}).status_code, 400)
+        self.assertEqual(client.get('/api/pickup-slots/', {'date': 'soon'}).status_code, 400)
+
+
+class BrokenPool:
+    """A process pool that lost a worker: every job fails."""
+
+    def __init__(self, on_submit=True):
+        self.on_submit = on_submit
+
+    def submit(self, func, *args):
+        if self.on_submit:
+            raise BrokenProcessPool()
+        future = Future()
+        future.set_exception(BrokenProcessPool())
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+@override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE=0)
+class HashingPoolTests(TestCase):
+    def setUp(self):
+        hashing._pool = hashing._slots = None
+        self.addCleanup(setattr, hashing, '_pool', None)
+        self.addCleanup(setattr, hashing, '_slots', None)
+        self.user = get_user_model().objects.create_user('student', 'student@example.com', 'secret', is_staff=True)
+
+    def test_busy_admin_login(self):
+        with mock.patch('api.backends.verify_password', side_effect=hashing.HashingBusy):
+            response = self.client.post('/admin/login/', {'username': 'student', 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)  # the login form again, not a 500
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_busy_api_login(self):
+        with mock.patch('api.backends.verify_password', side_effect=hashing.HashingBusy):
+            response = self.client.post('/api/auth/login/', {'username': 'student', 'password': 'secret'}, 'application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+    def test_password_not_a_string(self):
+        response = self.client.post('/api/auth/login/', {'username': 'student', 'password': 12345}, 'application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_broken_pool_replaced(self):
+        with ThreadPoolExecutor(1) as healthy:
+            with mock.patch('api.hashing.process_pool', side_effect=[BrokenPool(), healthy]), self.assertLogs('api.hashing'):
+                self.assertTrue(hashing.make_password('secret'))
+                self.assertIs(hashing._pool, healthy)
+
+    def test_worker_died_mid_job(self):
+        broken = BrokenPool(on_submit=False)
+        with ThreadPoolExecutor(1) as healthy:
+            with mock.patch('api.hashing.process_pool', side_effect=[broken, healthy]), self.assertLogs('api.hashing'):
+                with self.assertRaises(hashing.HashingBusy):
+                    hashing.make_password('secret')
+                self.assertIsNone(hashing._pool)
+                self.assertTrue(hashing.make_password('secret'))  # the slot came back and a new pool started
+
+
+@override_settings(PRINT_PREVIEW_WORKERS=1)
+class TaskPoolTests(TestCase):
+    def test_broken_pool_replaced(self):
+        pool = workers.TaskPool('PRINT_PREVIEW_WORKERS')
+        with ThreadPoolExecutor(1) as healthy:
+            with mock.patch('api.workers.process_pool', side_effect=[BrokenPool(), healthy]), self.assertLogs('api.workers'):
+                self.assertEqual(pool.submit(sum, [1, 2]).result(), 3)
+            self.assertIs(pool.pool, healthy)
+
+    def test_worker_died_mid_task(self):
+        pool = workers.TaskPool('PRINT_PREVIEW_WORKERS')
+        with mock.patch('api.workers.process_pool', return_value=BrokenPool(on_submit=False)), self.assertLogs('api.workers'):
+            with self.assertRaises(BrokenProcessPool):
+                pool.submit(sum, [1, 2]).result()
+        self.assertIsNone(pool.pool)
+
+
+class PrintJobTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('student', 'student@example.com', 'x')
+        self.order = PrintOrder.objects.create(
+            user=user, paper_size='A4', color_mode='color', print_sides='single',
+            binding_option='none', urgency='standard', total_price=10,
+        )
+
+    def test_failure_recorded_on_job(self):
+        with mock.patch('api.printjobs.build', side_effect=RuntimeError('out of disk')):
+            with self.assertRaises(RuntimeError):
+                printjobs.prepare_print_job(self.order.pk)
+        self.assertIn('out of disk', PrintJob.objects.get(print_order=self.order).error)
+
+    def test_queueing_failure_logged(self):
+        with mock.patch.object(printjobs.pool, 'submit', side_effect=RuntimeError('shutting down')):
+            with self.assertLogs('api.printjobs', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                printjobs.schedule_print_jobs([self.order.pk])
+
+
+class ProductFilterTests(TestCase):
+    def setUp(self):
+        self.pen, self.mug, self.tee = (
+            Product.objects.create(
+                name=name, short_description='s', full_description='f', price=1, available_quantity=5,
+                category=Category.objects.create(name=category),
+            )
+            for name, category in (('Pen', 'Stationery'), ('Mug', 'Kitchen'), ('Tee', 'Clothing'))
+        )
+
+    def test_category_ids(self):
+        ids = f'{self.pen.category_id},{self.mug.category_id}'
+        response = self.client.get('/api/products/', {'category_id': ids}, HTTP_ACCEPT='application/json')
+        self.assertEqual(sorted(product['name'] for product in response.json()), ['Mug', 'Pen'])
+
+    def test_browsable_filter_form(self):
+        response = self.client.get('/api/products/', HTTP_ACCEPT='text/html')
+        self.assertContains(response, 'name="category_id"')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    `replica` mirrors the test database, so only the alias each query went to tells them apart.
+    The mirror is a connection of its own and only sees committed rows, hence no TestCase.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x')
+        self.product = Product.objects.create(
+            name='Pen', short_description='s', full_description='f', price=1, available_quantity=5,
+            category=Category.objects.create(name='Stationery'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request(self, method, path, data=None):
+        """The response and the number of queries sent to each alias while serving it."""
+        with CaptureQueriesContext(connections['default']) as primary, CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(path, data, format='json')
+        return response, len(primary), len(replica)
+
+    def test_reads_use_replica(self):
+        response, primary, replica = self.request('get', '/api/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_writes_use_primary_and_pin(self):
+        response, primary, replica = self.request('post', '/api/cart/add/', {'product_id': self.product.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        response, primary, replica = self.request('get', '/api/products/')
+        self.assertGreater(primary, 0)  # pinned: the user reads their own write
+        self.assertEqual(replica, 0)
+
+    def test_other_users_not_pinned(self):
+        replicas.pin_to_primary(get_user_model().objects.create_user('other', 'other@example.com', 'x'))
+        _, primary, replica = self.request('get', '/api/products/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+
+class CompressionTests(TestCase):
+    def compress(self, accept_encoding, content_type='application/json'):
+        """The Content-Encoding a compressible response gets for this Accept-Encoding."""
+        response = HttpResponse(b'{"name": "Pen"}' * 200, content_type=content_type)
+        middleware = compression.CompressionMiddleware(lambda request: response)
+        return middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)).get('Content-Encoding')
+
+    def test_negotiated(self):
+        self.assertEqual(self.compress('gzip, deflate, br'), 'br')
+        self.assertEqual(self.compress('gzip, br;q=0'), 'gzip')
+        self.assertEqual(self.compress('gzip'), 'gzip')
+        self.assertIsNone(self.compress(''))
+        self.assertIsNone(self.compress('br', content_type='application/pdf'))
+
+    def test_html_padded_gzip(self):
+        self.assertEqual(self.compress('br, gzip', content_type='text/html; charset=utf-8'), 'gzip')
+
+
+class CartHoldTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x')
+        self.product = Product.objects.create(
+            name='Pen', short_description='s', full_description='f', price=1, available_quantity=5,
+            category=Category.objects.create(name='Stationery'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, quantity):
+        return self.client.post('/api/cart/add/', {'product_id': self.product.pk, 'quantity': quantity}, format='json')
+
+    def test_concurrent_adds(self):
+        self.add(1)
+        lock_stock = inventory.lock_stock
+
+        def add_while_waiting(product_ids):
+            Cart.objects.update(quantity=F('quantity') + 1)  # another add that got the lock first
+            return lock_stock(product_ids)
+
+        with mock.patch('api.inventory.lock_stock', side_effect=add_while_waiting):
+            response = self.add(1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Cart.objects.get().quantity, 3)
+
+    def test_adds_limited_by_others_holds(self):
+        other = get_user_model().objects.create_user('other', 'other@example.com', 'x')
+        inventory.hold(other, self.product, 4)
+        self.assertEqual(self.add(1).status_code, 201)
+        response = self.add(1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['available'], {str(self.product.pk): 1})
+
+    def test_update_invalid_quantity(self):
+        cart_id = self.add(1).json()['id']
+        for quantity in ('two', None, [2], 0):
+            response = self.client.patch(f'/api/cart/update/{cart_id}/', {'quantity': quantity}, format='json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/cart/update/{cart_id}/', {'quantity': '3'}, format='json')
+        self.assertEqual(response.json()['quantity'], 3)
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(suggest, 'index', suggest.SuggestIndex())
+        self.index = patcher.start()
+        self.addCleanup(patcher.stop)
+        stationery = Category.objects.create(name='Stationery')
+        kitchen = Category.objects.create(name='Kitchen')
+        self.products = {
+            name: Product.objects.create(
+                name=name, short_description='s', full_description='f', price=Decimal('1.00'), available_quantity=5, category=category,
+            )
+            for name, category in [('Blue Pen', stationery), ('Red Pen', stationery), ('Pencil', stationery), ('Pan', kitchen)]
+        }
+        for name, units in [('Pencil', 9), ('Red Pen', 3)]:
+            ProductDailySales.objects.create(product=self.products[name], day=timezone.localdate(), quantity=units)
+
+    def names(self, query):
+        return [result['name'] for result in suggest.suggest(query)]
+
+    def test_ranked_by_units_sold_then_name(self):
+        self.assertEqual(self.names('pen'), ['Pencil', 'Red Pen', 'Blue Pen'])
+        self.assertEqual(self.names('p kitchen'), ['Pan'])
+        self.assertEqual(self.names('stat blue'), ['Blue Pen'])
+        self.assertEqual(self.names('!!'), [])
+
+    def test_version_checked_at_most_every_interval(self):
+        self.names('pen')
+        Product.objects.filter(pk=self.products['Pan'].pk).update(name='Pen tray')  # elsewhere, without signals
+        suggest.bump_version()
+        with override_settings(SUGGEST_VERSION_CHECK_SECONDS=60), mock.patch.object(cache, 'get') as get:
+            self.assertNotIn('Pen tray', self.names('pen'))
+        get.assert_not_called()
+        with override_settings(SUGGEST_VERSION_CHECK_SECONDS=0):
+            self.assertIn('Pen tray', self.names('pen'))
+
+    def test_updates_merged_on_next_lookup(self):
+        self.names('pen')
+        keys = self.index.keys
+        pen = self.products['Blue Pen']
+        pen.name = 'Blue Marker'
+        pen.save()
+        Product.objects.create(
+            name='Pen case', short_description='s', full_description='f', price=Decimal('1.00'), available_quantity=5,
+            category=pen.category,
+        )
+        self.assertIs(self.index.keys, keys)  # nothing shifted yet
+        self.assertEqual(self.names('pen'), ['Pencil', 'Red Pen', 'Pen case'])
+        self.assertEqual(self.names('marker'), ['Blue Marker'])
+        self.assertEqual(self.index.keys, sorted(self.index.keys))
+        self.assertFalse(self.index.added or self.index.removed)
+
+
+@override_settings(ADMIN_EXACT_COUNT_LIMIT=1000)
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(self.staff)
+        self.orders = [
+            PrintOrder.objects.create(
+                user=self.staff, paper_size='A4', color_mode='color', print_sides='single', binding_option='none',
+                urgency='standard', total_price=10, transaction_id=f'TX{n}',
+            )
+            for n in range(5)
+        ]
+
+    def changelist(self, model, **params):
+        with mock.patch.object(admin.site._registry[model], 'list_per_page', 2):
+            response = self.client.get(f'/admin/api/{model._meta.model_name}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_estimated_count_above_limit(self):
+        queryset = PrintOrder.objects.order_by('-pk')
+        with mock.patch('api.changelists.estimated_count', return_value=250000):
+            paginator = changelists.EstimatedCountPaginator(queryset, 20)
+            self.assertEqual((paginator.count, paginator.estimated), (250000, True))
+        with mock.patch('api.changelists.estimated_count', return_value=999):
+            paginator = changelists.EstimatedCountPaginator(queryset, 20)
+            self.assertEqual((paginator.count, paginator.estimated), (5, False))
+        with mock.patch('api.changelists.estimated_count', return_value=None):
+            self.assertEqual(changelists.EstimatedCountPaginator(queryset, 20).count, 5)
+
+    def test_keyset_pages(self):
+        cl = self.changelist(PrintOrder, before='')
+        self.assertTrue(cl.keyset)
+        self.assertEqual([order.pk for order in cl.result_list], [self.orders[4].pk, self.orders[3].pk])
+        cl = self.changelist(PrintOrder, before=self.orders[3].pk)
+        self.assertEqual([order.pk for order in cl.result_list], [self.orders[2].pk, self.orders[1].pk])
+        self.assertIn(f'before={self.orders[1].pk}', cl.older_url)
+        cl = self.changelist(PrintOrder, before=self.orders[1].pk)
+        self.assertEqual([order.pk for order in cl.result_list], [self.orders[0].pk])
+        self.assertIsNone(cl.older_url)
+
+    def test_keyset_needs_newest_first(self):
+        Order.objects.create(user=self.staff, total_price=2)
+        Order.objects.create(user=self.staff, total_price=3)
+        Order.objects.create(user=self.staff, total_price=4)
+        cl = self.changelist(Order, before='')  # the pickup queue ordering stays
+        self.assertFalse(cl.keyset)
+        self.assertIsNone(cl.keyset_url)
+        cl = self.changelist(Order, o='-1', before='')  # sorted by id, newest first
+        self.assertTrue(cl.keyset)
+
+    def test_numeric_search(self):
+        cl = self.changelist(PrintOrder, q=str(self.orders[2].pk))
+        self.assertEqual(list(cl.result_list), [self.orders[2]])
+        self.orders[0].transaction_id = '77777777777777777777777'  # too big for an id
+        self.orders[0].save()
+        cl = self.changelist(PrintOrder, q='77777777777777777777777')
+        self.assertEqual(list(cl.result_list), [self.orders[0]])
+
+
+class ProductRenditionTests(MediaTestCase):
+    def create_product(self, image):
+        return Product.objects.create(
+            name='Pen', short_description='s', full_description='f', price=Decimal('1.00'), available_quantity=5,
+            category=Category.objects.create(name='Stationery'), image=image,
+        )
+
+    def test_renditions_generated_once(self):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500), 'red').save(buffer, 'PNG')
+        product = self.create_product(SimpleUploadedFile('pen.png', buffer.getvalue()))
+        self.assertEqual(len(product.image_hash), 40)
+        self.assertEqual(set(ProductSerializer(product).data['image_renditions']), {'thumb', 'card', 'detail'})
+        with mock.patch('api.models.generate_renditions') as generate:
+            product.save()
+        generate.assert_not_called()
+
+    def test_unreadable_image_marked(self):
+        product = self.create_product('product_images/p.jpg')  # not an image
+        self.assertEqual(product.image_hash, images.UNREADABLE)
+        self.assertEqual(ProductSerializer(product).data['image_renditions'], {})
+        with mock.patch('api.models.generate_renditions') as generate:
+            product.save()
+        generate.assert_not_called()
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('generate_renditions', stdout=stdout, stderr=stderr)  # the backfill still retries it
+        self.assertIn('(1 failed)', stdout.getvalue())
+        self.assertIn('product_images/p.jpg', stderr.getvalue())
+
+
+class RatingTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x')
+        self.product = Product.objects.create(
+            name='Pen', short_description='s', full_description='f', price=1, available_quantity=5,
+            category=Category.objects.create(name='Stationery'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def rate(self, rating, description=''):
+        return self.client.post('/api/ratings/add/', {'product': self.product.pk, 'rating': rating, 'description': description}, format='json')
+
+    def test_rating_again_updates(self):
+        first = self.rate(2)
+        self.assertEqual(first.status_code, 201)
+        second = self.rate(5, 'Better than I thought')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        rating = Rating.objects.get()
+        self.assertEqual((rating.rating, rating.title, rating.description), (5, 'Very Good', 'Better than I thought'))
+
+    def test_list_in_one_query(self):
+        for n in range(3):
+            user = get_user_model().objects.create_user(f'rater{n}', f'rater{n}@example.com', 'x')
+            Rating.objects.create(user=user, product=self.product, rating=n + 1)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/products/{self.product.pk}/ratings/')
+        self.assertEqual([row['user']['username'] for row in response.json()], ['rater2', 'rater1', 'rater0'])
+
+
+class RatingDedupeMigrationTests(TransactionTestCase):
+    """Migration 0023 keeps each user's latest rating of a product before adding the constraint."""
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connections['default'])
+        executor.loader.build_graph()
+        executor.migrate([('api', target)])
+        return executor.loader.project_state([('api', target)]).apps
+
+    def test_duplicates_dropped(self):
+        latest = MigrationExecutor(connections['default']).loader.graph.leaf_nodes('api')[0][1]
+        self.addCleanup(self.migrate, latest)
+        apps = self.migrate('0022_print_jobs')
+        user = apps.get_model('api', 'CustomUser').objects.create(username='buyer', email='buyer@example.com')
+        category = apps.get_model('api', 'Category').objects.create(name='Stationery')
+        product = apps.get_model('api', 'Product').objects.create(
+            name='Pen', short_description='s', full_description='f', price=1, available_quantity=5, category=category,
+        )
+        Rating = apps.get_model('api', 'Rating')
+        ids = [Rating.objects.create(user=user, product=product, rating=n).pk for n in (1, 2, 4)]
+        apps = self.migrate('0023_unique_ratings')
+        self.assertEqual(list(apps.get_model('api', 'Rating').objects.values_list('id', 'rating')), [(ids[-1], 4)])
+
+
+class HousekeepingTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'x')
+        self.product = Product.objects.create(
+            name='Pen', short_description='s', full_description='f', price=1, available_quantity=50,
+            category=Category.objects.create(name='Stationery'),
+        )
+
+    def test_expire_carts_in_batches(self):
+        users = [get_user_model().objects.create_user(f'user{n}', f'user{n}@example.com', 'x') for n in range(5)]
+        for user in users + [self.user]:
+            Cart.objects.create(user=user, product=self.product, quantity=1)
+        Cart.objects.exclude(user=self.user).update(updated_at=timezone.now() - timedelta(days=365))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(list(housekeeping.expire_carts(2)), [2, 2, 1])
+        self.assertEqual(list(Cart.objects.values_list('user_id', flat=True)), [self.user.pk])
+        self.assertEqual(list(housekeeping.expire_carts(2)), [])  # nothing left to do on a re-run
+
+    def test_due_after_interval(self):
+        self.assertIn('clear_sessions', housekeeping.due_jobs())
+        self.assertEqual(housekeeping.run_job('clear_sessions')[0], 0)
+        self.assertNotIn('clear_sessions', housekeeping.due_jobs())
+        JobCheckpoint.objects.filter(name='housekeeping:clear_sessions').update(updated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(housekeeping.due_jobs(['clear_sessions']), ['clear_sessions'])
+
+    def test_collect_media(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        old = time.time() - 3 * 24 * 3600
+        names = {
+            'product_images/used.png': old, 'product_images/replaced.png': old, 'product_images/new.png': time.time(),
+            'renditions/ab/' + 'ab' * 20 + '-160.webp': old, 'renditions/cd/' + 'cd' * 20 + '-160.webp': old,
+        }
+        for name, modified in names.items():
+            path = os.path.join(media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as fh:
+                fh.write(b'x')
+            os.utime(path, (modified, modified))
+        Product.objects.filter(pk=self.product.pk).update(image='product_images/used.png', image_hash='ab' * 20)
+        with override_settings(MEDIA_ROOT=media_root):
+            self.assertEqual(list(housekeeping.collect_media(1)), [1, 1])
+            self.assertEqual(list(housekeeping.collect_media(1)), [])
+        remaining = {
+            os.path.relpath(os.path.join(root, name), media_root) for root, _, files in os.walk(media_root) for name in files
+        }
+        self.assertEqual(remaining, {'product_images/used.png', 'product_images/new.png', 'renditions/ab/' + 'ab' * 20 + '-160.webp'})
+
+
+class FastSerializerTests(TestCase):
+    def test_same_bytes_as_model_serializers(self):
+        stdout = io.StringIO()
+        call_command('bench_serializers', rows=30, repeat=1, stdout=stdout)  # raises CommandError on any difference
+        self.assertEqual(stdout.getvalue().count('identical bytes'), 4)
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'price': Decimal('12.50'), 'at': timezone.now(), 'day': timezone.localdate(), 'big': 2 ** 70,
+            'text': 'caf\u00e9 \u2028 \u2029 "quoted"', 'nested': [{'none': None, 'flag': True, 'ratio': 0.1}],
+        }
+        self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(renderers.ORJSONRenderer().render(None), b'')
+
+    def test_streamed_array_matches(self):
+        items = [{'id': n, 'name': f'Product {n}', 'price': Decimal(n)} for n in range(50)]
+        for chunk_bytes in (16, 64 * 1024):
+            self.assertEqual(b''.join(renderers.json_array_chunks(items, chunk_bytes)), JSONRenderer().render(items))
+        self.assertEqual(b''.join(renderers.json_array_chunks([])), b'[]')
+
+
+class ProductionSettingsTests(TestCase):
+    """The production profile reads its database setup from the environment."""
+
+    def load(self, **env):
+        with mock.patch.dict(os.environ, env):
+            module = importlib.import_module('grabpoint.settings_production')
+            return importlib.reload(module)
+
+    def test_persistent_connections(self):
+        profile = self.load(DB_POOL='0', DB_CONN_MAX_AGE='300', DB_STATEMENT_TIMEOUT_MS='5000', DB_REPLICA_HOSTS='')
+        database = profile.DATABASES['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 300)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertEqual(database['OPTIONS']['options'], '-c statement_timeout=5000')
+        self.assertNotIn('pool', database['OPTIONS'])
+        self.assertEqual(profile.DATABASE_REPLICAS, [])
+
+    def test_pooled_connections(self):
+        profile = self.load(DB_POOL='1', DB_POOL_MAX_SIZE='20', DB_REPLICA_HOSTS='replica1.internal, replica2.internal')
+        database = profile.DATABASES['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 0)  # Django refuses persistent connections with a pool
+        self.assertEqual(database['OPTIONS']['pool']['max_size'], 20)
+        self.assertEqual(profile.DATABASE_REPLICAS, ['replica1', 'replica2'])
+        self.assertEqual(profile.DATABASES['replica2']['HOST'], 'replica2.internal')
+        self.assertEqual(profile.DATABASES['replica2']['OPTIONS']['pool']['max_size'], 20)
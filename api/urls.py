@@ -1,13 +1,20 @@
 from django.urls import path
 from .views import UserRegistrationView, CustomTokenObtainPairView, LogoutView, ProductListView, CartView,AddToCartView,CheckoutView,UserOrdersView,CategoryListView,PrintOrderCreateView,UserPrintOrderListView,CartDeleteView
 from .views import ProductDetailView,RatingCreateView,ProductRatingListView, ProductRatingSummaryView,UpdateCartQuantityView,ForgotPasswordAPIView,UserDetailView
+from .views import SalesReportView, TopProductsReportView, OrderStatusReportView, PrintVolumeReportView
+from .views import ProductSuggestView, ProductRecommendationsView, ProductAvailabilityView
+from .views import PaymentStatementView, PaymentStatementDetailView, BootstrapView, LoginView
+from .views import RosterView, PickupSlotsView, PrintQueueView
 
 urlpatterns = [
     path('auth/register/', UserRegistrationView.as_view(), name='register'),
-    path('auth/login/', CustomTokenObtainPairView.as_view(), name='login'),
+    path('auth/login/', LoginView.as_view(), name='login'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
     path("user-details/", UserDetailView.as_view(), name="user-details"),
+    path('bootstrap/', BootstrapView.as_view(), name='bootstrap'),
     path('products/', ProductListView.as_view(), name='product-list'),
+    path('products/suggest/', ProductSuggestView.as_view(), name='product-suggest'),
+    path('products/availability/', ProductAvailabilityView.as_view(), name='product-availability'),
     path('products/<int:id>/', ProductDetailView.as_view(), name='product-detail'),
     path('cart/', CartView.as_view(), name='cart'),  # Added cart endpoint
     path('cart/add/', AddToCartView.as_view(), name='add-to-cart'),
@@ -20,6 +27,16 @@ urlpatterns = [
     path('ratings/add/', RatingCreateView.as_view(), name='add-rating'),
     path('products/<int:product_id>/ratings/', ProductRatingListView.as_view(), name='product-ratings'),
     path('products/<int:product_id>/rating-summary/', ProductRatingSummaryView.as_view(), name='product-rating-summary'),
+    path('products/<int:product_id>/recommendations/', ProductRecommendationsView.as_view(), name='product-recommendations'),
     path('cart/update/<int:cart_id>/', UpdateCartQuantityView.as_view(), name='update-cart-quantity'),
     path("forgot-password/", ForgotPasswordAPIView.as_view(), name="forgot-password"),
+    path('reports/sales/', SalesReportView.as_view(), name='report-sales'),
+    path('reports/top-products/', TopProductsReportView.as_view(), name='report-top-products'),
+    path('reports/order-status/', OrderStatusReportView.as_view(), name='report-order-status'),
+    path('reports/print-volume/', PrintVolumeReportView.as_view(), name='report-print-volume'),
+    path('payments/statements/', PaymentStatementView.as_view(), name='payment-statements'),
+    path('payments/statements/<int:statement_id>/', PaymentStatementDetailView.as_view(), name='payment-statement-detail'),
+    path('roster/', RosterView.as_view(), name='roster'),
+    path('pickup-slots/', PickupSlotsView.as_view(), name='pickup-slots'),
+    path('print-queue/', PrintQueueView.as_view(), name='print-queue'),
 ]
@@ -10,11 +10,53 @@ from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import Avg, Count
-import django_filters
-from django_filters.rest_framework import DjangoFilterBackend
 
-from django.contrib.auth.hashers import make_password
 from django.contrib.auth import get_user_model
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import NotAuthenticated, ParseError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+import os
+
+from .media import is_preview, is_private, media_name, resolve_media_path, serve_file
+from .reporting import record_order_created
+from .replicas import ReplicaReadMixin
+from .suggest import suggest
+from .fast_serializers import FastCartSerializer, FastOrderSerializer, FastPrintOrderSerializer, FastProductSerializer
+from .models import OrderStatusHourly, PrintDailyVolume, ProductDailySales
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .archive import archived_order_data
+from .models import ArchivedOrder
+from datetime import timedelta
+from .recommendations import recommended_ids
+from .renderers import StreamingJSONResponse
+import heapq
+from django.db import transaction
+from .inventory import InsufficientStock, availability, commit_stock, hold, release
+from .payments import (
+    DuplicatePayment, StatementFormatError, claim_payment, clean_transaction_id, import_statement, statement_summary,
+)
+from .models import PaymentStatement
+from rest_framework.parsers import MultiPartParser
+from . import bootstrap
+from . import hashing
+import json
+from django.contrib.auth import aauthenticate
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from .roster import RosterFormatError, import_roster, roster_summary
+from .models import Roster
+from . import pickup
+from django.conf import settings
+from .discounts import InvalidCoupon, price_cart, price_cart_data
+from . import printqueue
+from .previews import source_hash_of
 
 
 User = get_user_model()
@@ -47,8 +89,8 @@ class ForgotPasswordAPIView(APIView):
         if serializer.is_valid():
             user = serializer.validated_data["user"]
             new_password = serializer.validated_data["new_password"]
-            user.password = make_password(new_password)
-            user.save()
+            user.password = hashing.make_password(new_password)  # in the hashing pool
+            user.save(update_fields=['password'])
 
             return Response({"message": "Password updated successfully."}, status=status.HTTP_200_OK)
         
@@ -59,6 +101,44 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class LoginView(View):
+    """
+    Same request and responses as CustomTokenObtainPairView, written as an async view: under ASGI
+    the password check awaits the hashing pool instead of holding a worker thread. Also works
+    under WSGI.
+    """
+
+    async def post(self, request):
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return JsonResponse({"detail": "JSON parse error"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            data = request.POST
+        username, password = str(data.get('username') or '').strip(), data.get('password')
+        errors = {field: ["This field is required."] for field, value in (('username', username), ('password', password)) if not value}
+        if password and not isinstance(password, str):
+            errors['password'] = ["Not a valid string."]
+        if errors:
+            return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = await aauthenticate(request, username=username, password=password)
+        busy = getattr(request, 'hashing_busy', None)  # PooledModelBackend fails the login when the pool is full
+        if busy is not None:
+            response = JsonResponse({"detail": str(busy.detail)}, status=busy.status_code)
+            response['Retry-After'] = str(busy.wait)
+            return response
+        if user is None:
+            return JsonResponse({"detail": "No active account found with the given credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            refresh = CustomTokenObtainPairSerializer.get_token(user)
+        except AuthenticationFailed as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        return JsonResponse({"refresh": str(refresh), "access": str(refresh.access_token)})
+
+
 # Logout View
 class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -74,14 +154,13 @@ class CartView(APIView):
     def get(self, request):
         """Retrieve all cart items for the logged-in user along with total price."""
         cart_items = Cart.objects.filter(user=request.user, is_checked_out=False)
-        serializer = CartSerializer(cart_items, many=True, context={'request': request})
-
-        total_cart_price = sum(item.total_price for item in cart_items)  # Calculate total price
+        serializer = FastCartSerializer(cart_items, context={'request': request})
+        try:
+            cart = price_cart_data(serializer.data, request.user, request.query_params.get('coupon', ''))
+        except InvalidCoupon as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({
-            "cart_items": serializer.data,
-            "total_cart_price": total_cart_price
-        }, status=status.HTTP_200_OK)
+        return Response(cart, status=status.HTTP_200_OK)
 
 # Add to Cart View
 class AddToCartView(APIView):
@@ -90,38 +169,54 @@ class AddToCartView(APIView):
     def post(self, request):
         """Add a product to the cart or update its quantity if it already exists."""
         product_id = request.data.get('product_id')
-        quantity = request.data.get('quantity', 1)
+        try:
+            quantity = int(request.data.get('quantity', 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity < 1:
+            return Response({"error": "Invalid quantity"}, status=status.HTTP_400_BAD_REQUEST)
 
         product = get_object_or_404(Product, id=product_id)  # Ensure product exists
 
-        cart_item, created = Cart.objects.get_or_create(
-            user=request.user,
-            product=product,
-            is_checked_out=False,  # Ensure we're modifying an active cart
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            cart_item.quantity += int(quantity)  # Update quantity
-            cart_item.save()
+        # Add to the active cart line if there is one; either way the new total is reserved.
+        try:
+            cart_item = hold(request.user, product, quantity, add=True)
+        except InsufficientStock as exc:
+            return stock_error(exc)
 
         return Response(CartSerializer(cart_item).data, status=status.HTTP_201_CREATED)
 
 
+def stock_error(exc):
+    return Response(
+        {"error": "Not enough stock.", "available": exc.available},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
+def duplicate_payment_error():
+    return Response({"error": "This transaction ID has already been used."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def pickup_slot_error(exc):
+    return Response({"error": str(exc), "pickup_slots": pickup.availability()}, status=status.HTTP_409_CONFLICT)
+
+
 class CheckoutView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         """Creates an order from the cart and clears the cart, including address."""
-        cart_items = Cart.objects.filter(user=request.user, is_checked_out=False)
+        cart_items = Cart.objects.filter(user=request.user, is_checked_out=False).select_related('product')
 
         if not cart_items.exists():
             return Response({"error": "Cart is empty!"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Get payment status and address details
         payment_status = request.data.get("payment_status")
-        transaction_id = request.data.get("transaction_id")
         address_data = request.data.get("order_address")
+        pickup_slot = request.data.get("pickup_slot")
+        coupon = request.data.get("coupon") or ""
 
         # Validate payment status
         valid_payment_choices = [choice[0] for choice in Order.PAYMENT_CHOICES]
@@ -131,67 +226,122 @@ class CheckoutView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        try:
+            transaction_id = clean_transaction_id(request.data.get("transaction_id"))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
         # Validate address data
         if not address_data:
             return Response({"error": "Order address is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Calculate total price
-        total_price = sum(item.total_price for item in cart_items)
-
-        # Create the order
-        order = Order.objects.create(user=request.user, total_price=total_price, payment_status=payment_status,transaction_id=transaction_id if transaction_id else None)
+        # Validate the pickup slot
+        if pickup_slot in (None, "") and getattr(settings, 'PICKUP_SLOT_REQUIRED', False):
+            return Response({"error": "Choose a pickup slot."}, status=status.HTTP_400_BAD_REQUEST)
+        if pickup_slot not in (None, "") and not str(pickup_slot).isdigit():
+            return Response({"error": "Invalid pickup slot."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create the order address
-        OrderAddress.objects.create(order=order, **address_data)
-
-        # Create order items
-        order_items = [
-            OrderItem(order=order, product=item.product, quantity=item.quantity, price=item.total_price)
-            for item in cart_items
-        ]
-        OrderItem.objects.bulk_create(order_items)
-
-        # Mark cart items as checked out
-        cart_items.update(is_checked_out=True)
+        try:
+            with transaction.atomic():
+                # Price the cart with the same rules CartView showed
+                lines, _ = price_cart(cart_items, request.user, str(coupon))
+
+                # Take the items out of stock; nothing is kept if any of them ran out
+                commit_stock(request.user, cart_items)
+
+                # Then a place in the pickup slot, if one was chosen
+                pickup_slot_id = pickup.book(int(pickup_slot)) if pickup_slot not in (None, "") else None
+
+                # Calculate total price
+                total_price = sum(line.total for line in lines)
+                discount = sum(line.discount for line in lines)
+
+                # Create the order
+                order = Order.objects.create(user=request.user, total_price=total_price, discount=discount, payment_status=payment_status,transaction_id=transaction_id, pickup_slot_id=pickup_slot_id)
+                claim_payment(payment_status, transaction_id, total_price, order=order)
+
+                # Create the order address
+                OrderAddress.objects.create(order=order, **address_data)
+
+                # Create order items
+                order_items = [
+                    OrderItem(order=order, product=item.product, quantity=item.quantity, price=line.total)
+                    for item, line in zip(cart_items, lines)
+                ]
+                OrderItem.objects.bulk_create(order_items)
+                record_order_created(order, order_items)
+
+                # Mark cart items as checked out
+                cart_items.update(is_checked_out=True)
+        except InsufficientStock as exc:
+            return stock_error(exc)
+        except DuplicatePayment:
+            return duplicate_payment_error()
+        except pickup.SlotUnavailable as exc:
+            return pickup_slot_error(exc)
+        except InvalidCoupon as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
 
-class ProductFilter(django_filters.FilterSet):
-    category_id = django_filters.BaseInFilter(field_name="category_id", lookup_expr="in")  # Allow multiple values
-
-    class Meta:
-        model = Product
-        fields = ['category_id']
+def wants_stream(request):
+    """?stream=1 on list endpoints returns the same JSON array, written incrementally."""
+    return request.query_params.get('stream') in ('1', 'true')
 
 # Product List View with Multi-Category Filtering
-class ProductListView(generics.ListAPIView):
+class ProductListView(ReplicaReadMixin, generics.ListAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter, OrderingFilter)
-    filterset_class = ProductFilter  # Use the custom filter
     search_fields = ['name', 'category__name']  # Search by product name or category name
     ordering_fields = ['price', 'name']
     ordering = ['name']  # Default ordering
 
-class ProductDetailView(generics.RetrieveAPIView):
+    @property
+    def filter_backends(self):
+        from .filters import ProductFilterBackend  # ?category_id=1,2; django-filter loads here, not at boot
+
+        return (ProductFilterBackend, SearchFilter, OrderingFilter)
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = FastProductSerializer(queryset, context=self.get_serializer_context())
+        if wants_stream(request):
+            return StreamingJSONResponse(serializer.stream())
+        return Response(serializer.data)
+
+class ProductDetailView(ReplicaReadMixin, generics.RetrieveAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     lookup_field = 'id'  # The URL will use 'id' to fetch a product
 
-class ProductRatingListView(generics.ListAPIView):
+class ProductRatingListView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = RatingSerializer
 
     def get_queryset(self):
-        """Get all ratings for a specific product."""
+        """Get all ratings for a specific product, newest first, with their users in the same query."""
         product_id = self.kwargs['product_id']
-        return Rating.objects.filter(product_id=product_id)
+        return (
+            Rating.objects.filter(product_id=product_id)
+            .select_related('user')
+            .only('id', 'product_id', 'rating', 'title', 'description', 'created_at', 'user__id', 'user__username', 'user__email', 'user__full_name')
+            .order_by('-created_at', '-id')
+        )
 
 class RatingCreateView(generics.CreateAPIView):
     serializer_class = RatingSerializer
     permission_classes = [permissions.IsAuthenticated] 
 
-class CategoryListView(generics.ListAPIView):
+    def create(self, request, *args, **kwargs):
+        """201 for a new rating, 200 when the user's earlier rating of the product was updated."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK)
+
+class CategoryListView(ReplicaReadMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
@@ -201,9 +351,21 @@ class PrintOrderCreateView(generics.CreateAPIView):
     serializer_class = PrintOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def create(self, request, *args, **kwargs):
+        try:
+            self.transaction_id = clean_transaction_id(request.data.get("transaction_id"))  # Can be None
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except DuplicatePayment:
+            return duplicate_payment_error()
+
     def perform_create(self, serializer):
-        transaction_id = self.request.data.get("transaction_id", None)  # Get transaction_id (can be None)
+        transaction_id = self.transaction_id
         print_order = serializer.save(user=self.request.user, transaction_id=transaction_id)  # Assign user & transaction_id
+        claim_payment(print_order.payment_status, transaction_id, print_order.total_price, print_order=print_order)
 
         files = self.request.FILES.getlist('files')  # Get multiple files
         for file in files:
@@ -222,6 +384,9 @@ class UserPrintOrderListView(generics.ListAPIView):
         """Retrieve only the print orders of the logged-in user"""
         return PrintOrder.objects.filter(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        return Response(FastPrintOrderSerializer(self.get_queryset(), context=self.get_serializer_context()).data)
+
 
 class CartDeleteView(generics.DestroyAPIView):
     serializer_class = CartSerializer
@@ -236,21 +401,21 @@ class CartDeleteView(generics.DestroyAPIView):
         cart_item = self.get_queryset().filter(id=cart_item_id).first()
 
         if cart_item:
-            cart_item.delete()
+            release(cart_item)
             return Response({"message": "Item removed from cart"}, status=status.HTTP_204_NO_CONTENT)
         
         return Response({"error": "Cart item not found"}, status=status.HTTP_404_NOT_FOUND)
 
-class ProductRatingSummaryView(APIView):
+class ProductRatingSummaryView(ReplicaReadMixin, APIView):
     def get(self, request, product_id):
         """Get the average rating and total number of ratings for a product."""
-        ratings = Rating.objects.filter(product_id=product_id)
-        
-        if not ratings.exists():
+        summary = Rating.objects.filter(product_id=product_id).aggregate(avg=Avg('rating'), total=Count('id'))  # one query
+
+        if not summary['total']:
             return Response({"message": "No ratings found for this product."}, status=status.HTTP_404_NOT_FOUND)
-        
-        avg_rating = ratings.aggregate(Avg('rating'))['rating__avg'] or 0
-        total_ratings = ratings.count()
+
+        avg_rating = summary['avg'] or 0
+        total_ratings = summary['total']
 
         return Response({
             "product_id": product_id,
@@ -258,28 +423,271 @@ class ProductRatingSummaryView(APIView):
             "total_ratings": total_ratings
         })
 
+class ProductAvailabilityView(APIView):
+    """Live availability (stock minus active cart reservations) for ?ids=1,2,3, served from the stock cache."""
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk][:100]
+        except ValueError:
+            return Response({"error": "ids must be a comma-separated list of product ids"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({str(pk): available for pk, available in availability(ids).items()})
+
+class ProductRecommendationsView(ReplicaReadMixin, APIView):
+    """Products frequently bought together with this one, precomputed by build_recommendations."""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, product_id):
+        ids = recommended_ids(product_id)
+        rank = {pk: i for i, pk in enumerate(ids)}
+        products = FastProductSerializer(Product.objects.filter(id__in=ids), context={'request': request}).data
+        return Response(sorted(products, key=lambda product: rank[product['id']]))
+
 class UpdateCartQuantityView(APIView):
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, cart_id):
         try:
-            cart_item = Cart.objects.get(id=cart_id, user=request.user)
+            cart_item = Cart.objects.select_related('product').get(id=cart_id, user=request.user, is_checked_out=False)
         except Cart.DoesNotExist:
             return Response({"error": "Cart item not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        new_quantity = request.data.get('quantity')
-        if new_quantity is None or int(new_quantity) < 1:
+        try:
+            new_quantity = int(request.data.get('quantity'))
+        except (TypeError, ValueError):
+            new_quantity = 0
+        if new_quantity < 1:
             return Response({"error": "Invalid quantity"}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart_item.quantity = int(new_quantity)
-        cart_item.save()
+        try:
+            cart_item = hold(request.user, cart_item.product, new_quantity, cart_item)
+        except InsufficientStock as exc:
+            return stock_error(exc)
         return Response(CartSerializer(cart_item).data, status=status.HTTP_200_OK)
 
 class UserOrdersView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        """Retrieve orders of the authenticated user including address details."""
+        """Retrieve orders of the authenticated user including address details (?include_archived=1 adds old history)."""
         user_orders = Order.objects.filter(user=request.user).order_by('-created_at')
-        serializer = OrderSerializer(user_orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        include_archived = request.query_params.get('include_archived') in ('1', 'true')
+        archived = ArchivedOrder.objects.filter(user=request.user).order_by('-created_at')
+        newest_first = lambda order: parse_datetime(order['created_at'])
+
+        if wants_stream(request):
+            orders = FastOrderSerializer(user_orders).stream()
+            if include_archived:
+                # Both sides are already newest-first, so merging keeps the stream sorted.
+                history = (archived_order_data(order) for order in archived.iterator(chunk_size=1000))
+                orders = heapq.merge(orders, history, key=newest_first, reverse=True)
+            return StreamingJSONResponse(orders)
+
+        data = FastOrderSerializer(user_orders).data
+        if include_archived:
+            data += [archived_order_data(order) for order in archived]
+            data.sort(key=newest_first, reverse=True)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class MediaFileView(APIView):
+    """Serves MEDIA_ROOT; print order uploads are restricted to their owner and staff."""
+    authentication_classes = [JWTAuthentication, SessionAuthentication]  # Session auth covers admin links
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, path):
+        try:
+            full_path = resolve_media_path(path)
+        except SuspiciousFileOperation:
+            raise Http404
+        if not os.path.isfile(full_path):
+            raise Http404
+        path = media_name(full_path)  # /media/product_images/../print_orders/x.pdf is still a print order upload
+
+        if is_private(path):
+            if not request.user.is_authenticated:
+                raise NotAuthenticated
+            if not request.user.is_staff and not self.owns(request.user, path):
+                raise Http404  # Don't reveal that someone else's file exists
+
+        return serve_file(request, path, full_path)
+
+    def owns(self, user, path):
+        if is_preview(path):
+            # Previews are named after the upload's content hash, which identical uploads share
+            uploads = PrintOrderFile.objects.filter(preview_hash=source_hash_of(path))
+        else:
+            uploads = PrintOrderFile.objects.filter(file=path)
+        return uploads.filter(print_order__user=user).exists()
+
+
+class ReportRangeMixin:
+    """Staff-only report views over the rollup tables, filtered by ?start=&end= (YYYY-MM-DD, inclusive)."""
+    permission_classes = [permissions.IsAdminUser]
+    default_days = 30
+
+    def get_range(self, request):
+        end = self.get_date(request, 'end') or timezone.localdate()
+        start = self.get_date(request, 'start') or end - timedelta(days=self.default_days - 1)
+        return start, end
+
+    def get_date(self, request, name):
+        try:
+            return parse_date(request.query_params.get(name, ''))
+        except ValueError:  # well formed but not a real date, e.g. 2024-13-45
+            raise ParseError({"error": f"Invalid {name} date, expected YYYY-MM-DD."})
+
+
+class SalesReportView(ReportRangeMixin, APIView):
+    def get(self, request):
+        """Units sold and revenue per day."""
+        start, end = self.get_range(request)
+        rows = (
+            ProductDailySales.objects.filter(day__range=(start, end))
+            .values('day').annotate(quantity=Sum('quantity'), revenue=Sum('revenue')).order_by('day')
+        )
+        return Response({"start": start, "end": end, "days": list(rows)})
+
+
+class TopProductsReportView(ReportRangeMixin, APIView):
+    def get(self, request):
+        """Best-selling products by units in the date range."""
+        start, end = self.get_range(request)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+        except ValueError:
+            return Response({"error": "Invalid limit"}, status=status.HTTP_400_BAD_REQUEST)
+        rows = (
+            ProductDailySales.objects.filter(day__range=(start, end))
+            .values('product_id', 'product__name')
+            .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'), orders=Sum('orders'))
+            .order_by('-quantity')[:limit]
+        )
+        return Response({"start": start, "end": end, "products": list(rows)})
+
+
+class OrderStatusReportView(ReportRangeMixin, APIView):
+    default_days = 1
+
+    def get(self, request):
+        """Orders entering each status, per hour."""
+        start, end = self.get_range(request)
+        rows = (
+            OrderStatusHourly.objects.filter(hour__date__range=(start, end))
+            .values('hour', 'status', 'count').order_by('hour', 'status')
+        )
+        return Response({"start": start, "end": end, "hours": list(rows)})
+
+
+class PrintVolumeReportView(ReportRangeMixin, APIView):
+    def get(self, request):
+        """Print jobs completed and pages printed per day."""
+        start, end = self.get_range(request)
+        rows = PrintDailyVolume.objects.filter(day__range=(start, end)).values('day', 'jobs', 'pages').order_by('day')
+        return Response({"start": start, "end": end, "days": list(rows)})
+
+
+class ProductSuggestView(APIView):
+    """Type-ahead suggestions served from the in-memory index in api.suggest."""
+    authentication_classes = []  # Public, and skipping JWT decoding keeps it cheap
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 8)), 20))
+        except ValueError:
+            limit = 8
+        return Response(suggest(request.query_params.get('q', ''), limit))
+
+
+class PaymentStatementView(APIView):
+    """Staff upload a bank/UPI statement CSV (`file`, optional `method`) and get the reconciliation summary."""
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def get(self, request):
+        statements = PaymentStatement.objects.order_by('-uploaded_at')[:50]
+        return Response([statement_summary(statement) for statement in statements])
+
+    def post(self, request):
+        uploaded = request.FILES.get('file')
+        if uploaded is None:
+            return Response({"error": "Upload the statement as `file`."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            statement = import_statement(uploaded, request.data.get('method', 'upi'), request.user)
+        except StatementFormatError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(statement_summary(statement), status=status.HTTP_201_CREATED)
+
+
+class PaymentStatementDetailView(APIView):
+    """Summary plus the flagged lines and the unpaid claims for the days the statement covers."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, statement_id):
+        statement = get_object_or_404(PaymentStatement, id=statement_id)
+        return Response(statement_summary(statement, detail=True))
+
+
+class BootstrapView(ReplicaReadMixin, APIView):
+    """
+    The app's startup calls (user-details, categories, products, cart, orders, print-orders)
+    in one authenticated request; ?sections=user,cart,... returns just those.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        sections = request.query_params.get('sections')
+        sections = bootstrap.SECTIONS if not sections else sections.split(',')
+        unknown = set(sections) - set(bootstrap.SECTIONS)
+        if unknown:
+            return Response({"error": f"Unknown sections: {', '.join(sorted(unknown))}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(bootstrap.build(request, sections))
+
+
+class RosterView(APIView):
+    """Staff upload the term's student roster CSV (`file`); listed accounts are verified, now and on registration."""
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def get(self, request):
+        return Response([roster_summary(roster) for roster in Roster.objects.order_by('-uploaded_at')[:50]])
+
+    def post(self, request):
+        uploaded = request.FILES.get('file')
+        if uploaded is None:
+            return Response({"error": "Upload the roster as `file`."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            roster = import_roster(uploaded.file, uploaded.name, request.user)
+        except RosterFormatError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(roster_summary(roster), status=status.HTTP_201_CREATED)
+
+
+class PickupSlotsView(APIView):
+    """Bookable pickup slots with the places left; ?date=YYYY-MM-DD for one day, else all bookable days."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        date = request.query_params.get('date')
+        if date is None:
+            return Response(pickup.availability())
+        try:
+            date = parse_date(date)
+        except ValueError:  # well formed but not a real date, e.g. 2024-13-45
+            date = None
+        if date is None:
+            return Response({"error": "Invalid date."}, status=status.HTTP_400_BAD_REQUEST)
+        if date not in pickup.bookable_dates():
+            return Response([])
+        return Response(pickup.availability([date]))
+
+
+class PrintQueueView(APIView):
+    """Staff view of the print queue: waiting orders in printing order with their estimates."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(printqueue.queue_summary())
@@ -0,0 +1,87 @@
+"""
+Process pools for CPU-heavy work that must not run on request threads (password hashing,
+print previews, print job preparation).
+
+Pools use the spawn start method: forking a threaded server process can copy held locks into
+the child. Each worker sets Django up once before taking tasks, so task functions can live in
+modules that import models. This module itself is imported by the workers before that
+happens, so it must not import models.
+
+A pool whose worker died (killed, out of memory) is broken for good: TaskPool drops it and
+starts a new one, so one crash doesn't fail every later task.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def process_pool(max_workers):
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker, initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'grabpoint.settings'),),
+    )
+
+
+class TaskPool:
+    """A process pool sized by a setting and started on first use; with the setting at 0, tasks run inline."""
+
+    def __init__(self, setting):
+        self.setting = setting
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def size(self):
+        return getattr(settings, self.setting, 0)
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = process_pool(self.size())
+            return self.pool
+
+    def discard(self, pool):
+        """Drop a broken pool, unless another thread already replaced it."""
+        with self.lock:
+            if self.pool is not pool:
+                return
+            self.pool = None
+        logger.error("A %s worker died; starting a new pool.", self.setting)
+        pool.shutdown(wait=False)
+
+    def submit(self, func, *args):
+        """Run `func(*args)` in the pool (or inline without one); returns a Future."""
+        if self.size():
+            pool = self.get_pool()
+            try:
+                future = pool.submit(func, *args)
+            except BrokenProcessPool:
+                self.discard(pool)
+                pool = self.get_pool()
+                future = pool.submit(func, *args)
+
+            def done(future):
+                if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                    self.discard(pool)  # the task's worker died; the task itself is lost
+
+            future.add_done_callback(done)
+            return future
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
@@ -6,6 +6,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Hand media transfers to the front-end server: None (serve from Django), 'nginx' (X-Accel-Redirect)
+# or 'apache' (X-Sendfile). For nginx, MEDIA_ACCEL_REDIRECT_PREFIX must be an `internal` location aliased to MEDIA_ROOT.
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND') or None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
 SECRET_KEY = 'django-insecure-uvwlx&5vs6_-mnwyq-rl)r*qol3n*2lck=35hc%91v*9i!n=rt'
 DEBUG = True
 
@@ -25,12 +30,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework_simplejwt',
-    'django_filters',
+    # django_filters is left out on purpose: api.filters imports it on first use (see profile_startup)
     'api',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # ✅ Must be before CommonMiddleware
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -38,6 +44,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.replicas.ReplicaPinMiddleware',
 ]
 
 # ✅ Use only one CORS setting, do not mix them
@@ -51,6 +58,10 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',  # Same bytes as JSONRenderer, several times faster
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 AUTH_USER_MODEL = 'api.CustomUser'
@@ -86,6 +97,48 @@ DATABASES = {
     }
 }
 
+# A replica of the primary under test (TEST MIRROR), so api.tests can check the read routing
+# without a real one; nothing reads from it unless it is listed in DATABASE_REPLICAS.
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+# Aliases in DATABASES that views using api.replicas.ReplicaReadMixin may read from.
+# Users stay on `default` for REPLICA_PIN_SECONDS after any write they make.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+
+# Delivered/cancelled orders and checked-out cart rows older than this move to the archive tables
+# (python manage.py archive_history).
+ARCHIVE_AFTER_DAYS = 180
+
+# api.compression: responses smaller than this aren't worth compressing. Brotli is used when
+# the client accepts it and the package is installed, gzip otherwise.
+COMPRESSION_MIN_LENGTH = 1024
+BROTLI_QUALITY = 5
+
+# python manage.py housekeeping: open cart lines untouched this long are dropped, and unreferenced
+# media files are only deleted once they are older than the grace period.
+CART_EXPIRY_DAYS = 30
+MEDIA_GC_GRACE_HOURS = 24
+
+# api.inventory: adding to the cart holds stock for this long; checkout that leaves a product at or
+# below LOW_STOCK_THRESHOLD raises a LowStockAlert for staff. Cached availability is at most
+# STOCK_CACHE_SECONDS old (bulk imports bypass the invalidation).
+CART_RESERVATION_MINUTES = 15
+LOW_STOCK_THRESHOLD = 5
+STOCK_CACHE_SECONDS = 30
+
+# GET /api/bootstrap/ caches each user's cart/orders/print orders until they change, and at most this long.
+BOOTSTRAP_CACHE_SECONDS = 300
+
+# api.discounts: each worker recompiles the discount rules when the admin changes them (a version
+# in the shared cache) and, in case that bump is missed, at least every DISCOUNT_RULES_MAX_AGE seconds.
+DISCOUNT_RULES_MAX_AGE = 60
+
+# api.suggest: each worker checks the shared index version at most every this many seconds, so
+# another worker's catalog change can take that long to show up in its suggestions.
+SUGGEST_VERSION_CHECK_SECONDS = 2
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -93,6 +146,60 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# New and upgraded passwords use Argon2id; PBKDF2 hashes are rehashed on the user's next login.
+# Tune PASSWORD_ARGON2 with `python manage.py bench_password_hashers` on the production hardware.
+PASSWORD_HASHERS = [
+    'api.hashing.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_ARGON2 = {'time_cost': 2, 'memory_cost': 19 * 1024, 'parallelism': 1}  # memory_cost in KiB
+
+# api.hashing: logins hash in a pool of this many processes per server process (0 = inline). Up to
+# PASSWORD_HASHING_QUEUE jobs per pool process may wait; further requests wait PASSWORD_HASHING_WAIT
+# seconds for room, then get 503 + Retry-After.
+AUTHENTICATION_BACKENDS = ['api.backends.PooledModelBackend']
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 1))
+PASSWORD_HASHING_QUEUE = 4
+PASSWORD_HASHING_WAIT = 0.5
+PASSWORD_HASHING_RETRY_AFTER = 2
+
+# api.pickup: customers can book slots for today and the next PICKUP_DAYS_AHEAD - 1 days, up to
+# PICKUP_LEAD_MINUTES before the slot starts. Slot availability is cached for PICKUP_CACHE_SECONDS
+# (bookings and cancellations drop it). With PICKUP_SLOT_REQUIRED, checkout must name a slot.
+PICKUP_DAYS_AHEAD = 2
+PICKUP_LEAD_MINUTES = 10
+PICKUP_CACHE_SECONDS = 60
+PICKUP_SLOT_REQUIRED = False
+
+# api.previews: uploaded print files get WebP thumbnails of their first PRINT_PREVIEW_PAGES pages,
+# rendered in a pool of PRINT_PREVIEW_WORKERS processes per server process (0 = inline).
+PRINT_PREVIEW_WORKERS = int(os.environ.get('PRINT_PREVIEW_WORKERS', 1))
+PRINT_PREVIEW_PAGES = 1
+PRINT_PREVIEW_WIDTH = 320
+
+# api.printjobs: confirming a print order builds its print-ready PDF in a pool of PRINT_JOB_WORKERS
+# processes per server process (0 = inline). PRINT_MANUAL_DUPLEX orders double-sided jobs as all
+# fronts, then all backs in reverse, for printers that can't print both sides themselves.
+PRINT_JOB_WORKERS = int(os.environ.get('PRINT_JOB_WORKERS', 1))
+PRINT_MANUAL_DUPLEX = False
+
+# api.printqueue: waiting print orders carry a queue position and ready-time estimate. Until enough
+# orders have been marked printed to learn the real rate, a side takes PRINT_SECONDS_PER_SIDE;
+# longer pauses than PRINT_IDLE_MINUTES between printed orders are idle time, not printing time.
+PRINT_SECONDS_PER_SIDE = 6
+PRINT_IDLE_MINUTES = 20
+
+# profile_startup fails when a fresh process takes longer than this to serve its first request.
+# Pillow and the PDF libraries are imported on first use, so they should not show up in its report.
+STARTUP_BUDGET_MS = 1500
+
+# api.changelists: order changelists with more rows than this show Postgres' estimated count
+# instead of running COUNT(*) on every page.
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
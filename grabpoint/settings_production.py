@@ -0,0 +1,83 @@
+"""
+Production profile: DJANGO_SETTINGS_MODULE=grabpoint.settings_production
+
+Everything environment-specific comes from environment variables so the same
+file works for staging and production. Database connections are either kept
+open per worker thread (CONN_MAX_AGE) or, with DB_POOL=1, shared through a
+psycopg 3 connection pool. Django does not allow both at once.
+
+The cache is shared by every worker: Redis when REDIS_URL is set (needs the redis package),
+otherwise a table in the primary database, created once with `python manage.py createcachetable`.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+
+
+def env_bool(name, default=False):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+DEBUG = env_bool('DJANGO_DEBUG', False)
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)  # noqa: F405
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '*').split(',') if host]
+
+DB_POOL = env_bool('DB_POOL', False)
+DB_STATEMENT_TIMEOUT_MS = env_int('DB_STATEMENT_TIMEOUT_MS', 30000)  # 0 disables the timeout
+
+db_options = {
+    'connect_timeout': env_int('DB_CONNECT_TIMEOUT', 5),
+    # Applied by the server on every new connection, so it costs no extra round-trip.
+    'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}',
+}
+if DB_POOL:
+    db_options['pool'] = {
+        'min_size': env_int('DB_POOL_MIN_SIZE', 2),
+        'max_size': env_int('DB_POOL_MAX_SIZE', 10),
+        'timeout': env_int('DB_POOL_TIMEOUT', 10),  # Seconds to wait for a free connection
+        'max_idle': env_int('DB_POOL_MAX_IDLE', 600),
+    }
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'campus'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Persistent connections are incompatible with pooling; the pool owns connection lifetime then.
+        'CONN_MAX_AGE': 0 if DB_POOL else env_int('DB_CONN_MAX_AGE', 600),
+        # Ping reused connections before handing them out (also applies to pooled connections).
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': db_options,
+    }
+}
+
+# DB_REPLICA_HOSTS=replica1.internal,replica2.internal adds read replicas sharing the primary's credentials.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host.strip(), 'OPTIONS': dict(db_options), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+# Replica pins, the discount/suggest versions and the cached bootstrap sections only work when
+# every worker sees the same cache; a per-process LocMemCache would hide one worker's writes
+# from the others.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL},
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {'MAX_ENTRIES': env_int('CACHE_MAX_ENTRIES', 100000)},
+        },
+    }